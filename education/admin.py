@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Class, ClassBook, Concept, LessonEmbedding, Prompt, Schedule, Book, Lesson, Problem, StudySheet, Template, Tool, Transcript, Notes, Assignment, ProblemSet, Test, Message, ChatSession, AssigmentQuestion
+from .models import CachedAnswer, CachedCompletion, CachedEmbedding, Class, ClassBook, Concept, LessonEmbedding, Prompt, RelatedLesson, Schedule, Book, BookSection, Lesson, LessonJob, Problem, StudySheet, Template, Tool, Transcript, TranscriptPassage, Notes, Assignment, ProblemSet, Test, Message, ChatSession, AssigmentQuestion
 # GPTInstance
 class ScheduleInline(admin.TabularInline):
     model = Schedule
@@ -171,10 +171,64 @@ class MessageAdmin(admin.ModelAdmin):
 
 @admin.register(LessonEmbedding)
 class LessonEmbeddingAdmin(admin.ModelAdmin):
-    list_display = ('lesson', 'created_at', 'updated_at')
+    list_display = ('lesson', 'embedding_model', 'dimensions', 'created_at', 'updated_at')
     list_filter = ('lesson',)
     search_fields = ('lesson__title',)
 
+@admin.register(LessonJob)
+class LessonJobAdmin(admin.ModelAdmin):
+    list_display = ('lesson', 'stage', 'status', 'attempts', 'leased_by', 'updated_at')
+    list_filter = ('status', 'stage')
+    search_fields = ('lesson__title', 'last_error')
+    actions = ['retry_jobs']
+
+    @admin.action(description='Retry selected jobs from their current stage')
+    def retry_jobs(self, request, queryset):
+        from django.utils import timezone
+        updated = queryset.exclude(status=LessonJob.RUNNING).update(status=LessonJob.PENDING, attempts=0, run_after=timezone.now())
+        self.message_user(request, f"{updated} jobs queued again.")
+
+@admin.register(BookSection)
+class BookSectionAdmin(admin.ModelAdmin):
+    list_display = ('title', 'page', 'book')
+    list_filter = ('book',)
+    search_fields = ('title',)
+    readonly_fields = ('vector_data', 'dimensions', 'source_hash')
+
+@admin.register(RelatedLesson)
+class RelatedLessonAdmin(admin.ModelAdmin):
+    list_display = ('lesson', 'related', 'score')
+    list_filter = ('lesson__related_class',)
+    search_fields = ('lesson__title', 'related__title')
+
+@admin.register(TranscriptPassage)
+class TranscriptPassageAdmin(admin.ModelAdmin):
+    list_display = ('transcript', 'position', 'token_count', 'embedding_model')
+    list_filter = ('lesson',)
+    search_fields = ('text',)
+    readonly_fields = ('vector_data', 'dimensions', 'source_hash')
+
+@admin.register(CachedAnswer)
+class CachedAnswerAdmin(admin.ModelAdmin):
+    list_display = ('question', 'lesson', 'related_class', 'super_search', 'hits', 'created_at', 'last_hit_at')
+    list_filter = ('super_search', 'related_class')
+    search_fields = ('question', 'answer')
+    readonly_fields = ('vector_data', 'dimensions', 'hits', 'created_at', 'last_hit_at')
+
+@admin.register(CachedCompletion)
+class CachedCompletionAdmin(admin.ModelAdmin):
+    list_display = ('call_site', 'model', 'key', 'created_at', 'expires_at', 'last_used_at')
+    list_filter = ('call_site', 'model')
+    search_fields = ('key',)
+    readonly_fields = ('key', 'model', 'call_site', 'response', 'created_at', 'expires_at', 'last_used_at')
+
+@admin.register(CachedEmbedding)
+class CachedEmbeddingAdmin(admin.ModelAdmin):
+    list_display = ('model', 'text_hash', 'dimensions', 'created_at', 'last_used_at')
+    list_filter = ('model',)
+    search_fields = ('text_hash',)
+    readonly_fields = ('model', 'text_hash', 'dimensions', 'created_at', 'last_used_at')
+
 @admin.register(AssigmentQuestion)
 class AssigmentQuestionAdmin(admin.ModelAdmin):
     list_display = ('section', 'related_assignment')
@@ -188,7 +242,18 @@ class ConceptAdmin(admin.ModelAdmin):
     list_filter = ('approved', 'related_class', 'related_lesson', 'title')
     search_fields = ('title', 'description', 'notes')
     ordering = ('title',)
-    fields = ('related_class', 'related_lesson', 'title', 'description', 'notes', 'approved')
+    fields = ('related_class', 'related_lesson', 'merged_lessons', 'title', 'description', 'notes', 'approved')
+    filter_horizontal = ('merged_lessons',)
+    actions = ['merge_concepts']
+
+    @admin.action(description='Merge selected concepts into the oldest approved one')
+    def merge_concepts(self, request, queryset):
+        concepts = list(queryset.order_by('-approved', 'id'))
+        if len(concepts) < 2:
+            self.message_user(request, "Select at least two concepts to merge.")
+            return
+        concepts[0].merge(concepts[1:])
+        self.message_user(request, f"{len(concepts) - 1} concepts merged into \"{concepts[0]}\".")
 
 
 
@@ -0,0 +1,276 @@
+import json
+import os
+import queue
+import threading
+import zlib
+
+import PyPDF2
+
+from .chunk_store import ChunkTextWriter, get_chunk_store
+from .embedding_cache import text_hash
+from .federated_search import namespace_catalog
+from .lexical_index import book_index_dir, build_book_lexical_index, retrieval_settings
+from .utils import generate_embeddings
+from .vector_store import get_vector_store
+
+
+def iter_pdf_pages(pdf_path):
+    """Yields the extracted text of each page, one page in memory at a time."""
+    with open(pdf_path, "rb") as file:
+        reader = PyPDF2.PdfReader(file)
+        for page in reader.pages:
+            yield page.extract_text() or ""
+
+
+def iter_paragraphs(pages):
+    """Yields the same paragraphs as splitting the concatenated pages on newlines, carrying partial lines across pages."""
+    carry = ""
+    for page_text in pages:
+        lines = (carry + page_text).split('\n')
+        carry = lines.pop()
+        yield from lines
+    yield carry
+
+
+def iter_chunks(paragraphs, min_words=310, max_words=1200, use_separators=True, context_window=100):
+    """Streaming equivalent of chunk_text_advanced, yields the same chunks from an iterable of paragraphs."""
+    from .utils import add_context_window
+
+    if not use_separators:
+        # Without separators the whole text is one paragraph, so it cannot be streamed
+        paragraphs = [' '.join(word for paragraph in paragraphs for word in paragraph.split())]
+
+    current_chunk = []
+    current_word_count = 0
+    words = []
+    for paragraph in paragraphs:
+        words = paragraph.split()
+        for word in words:
+            current_chunk.append(word)
+            current_word_count += 1
+
+            if current_word_count >= min_words:
+                if current_word_count + len(words) > max_words:
+                    excess_words = (current_word_count + len(words)) - max_words
+                    final_chunk = current_chunk[:-excess_words]
+                else:
+                    final_chunk = current_chunk[:]
+                yield ' '.join(add_context_window(final_chunk, words, context_window))
+                current_chunk = []
+                current_word_count = 0
+
+    if current_word_count >= min_words:
+        yield ' '.join(add_context_window(current_chunk, words, context_window))
+
+
+def chunk_id(text):
+    """Deterministic chunk id: the first 32 hex digits of the sha256 of the normalized chunk text."""
+    return text_hash(text)[:32]
+
+
+def iter_content_defined_chunks(paragraphs, min_words=310, max_words=1200, context_window=100, boundary_divisor=64):
+    """
+    Content-defined variant of iter_chunks. Past min_words, a chunk ends after the first word where the crc32 of
+    the last three words is divisible by boundary_divisor, or at max_words. Boundaries depend only on nearby text,
+    so an edit changes the chunks around it while the rest of the book keeps its chunks, and their ids.
+    Each chunk is prefixed with the last context_window words of the previous one, and the tail of the book is kept.
+    """
+    previous_tail = []
+    current = []
+    for paragraph in paragraphs:
+        for word in paragraph.split():
+            current.append(word)
+            if len(current) >= max_words or (len(current) >= min_words and zlib.crc32(' '.join(current[-3:]).encode('utf-8')) % boundary_divisor == 0):
+                yield ' '.join(previous_tail + current)
+                previous_tail = current[-context_window:] if context_window else []
+                current = []
+    if current:
+        yield ' '.join(previous_tail + current)
+
+
+class IndexingCheckpoint:
+    """
+    Records which chunks of a book have been acknowledged by the vector store.
+
+    The file starts with a line describing the source (PDF size and modification time, chunking parameters and
+    model) followed by one line of chunk ids per acknowledged batch, so acknowledging only appends. A changed
+    file or configuration starts the upload over instead of resuming it.
+    """
+
+    def __init__(self, path, source):
+        self.path = path
+        self.source = source
+        self.acknowledged = set()
+        self._lock = threading.Lock()
+        try:
+            with open(path, encoding='utf-8') as f:
+                lines = f.read().splitlines()
+            if lines and json.loads(lines[0]) == source:
+                for line in lines[1:]:
+                    self.acknowledged.update(json.loads(line))
+        except (FileNotFoundError, ValueError):
+            self.acknowledged = set()
+        if not self.acknowledged:
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(json.dumps(source) + "\n")
+
+    def acknowledge(self, chunk_ids):
+        with self._lock:
+            self.acknowledged.update(chunk_ids)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(list(chunk_ids)) + "\n")
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def read_manifest(directory):
+    """Returns the manifest of the last completed upload of a book, or None."""
+    try:
+        with open(os.path.join(directory, 'manifest.json'), encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def index_book(pdf_path, namespace, min_words=310, max_words=1200, use_separators=True, context_window=100,
+               model="text-embedding-3-large", batch_size=100, embed_workers=2, queue_size=4, full=False, boundaries=None):
+    """
+    Streams a PDF into the vector store: pages -> chunks -> embedding batches -> acknowledged upserts.
+
+    The stages are joined by bounded queues, so at most a few batches of vectors are in memory whatever the
+    size of the book. Chunk ids are content hashes, so re-indexing a book diffs the new chunks against the ids
+    of its last completed upload: only new chunks are embedded and upserted and only removed ones are deleted,
+    unless full is set or the embedding model changed. With boundaries='content' (settings.BOOK_RETRIEVAL
+    ['CHUNK_BOUNDARIES'] by default) chunks are cut by iter_content_defined_chunks, so an erratum only re-embeds
+    the chunks around it; 'count' keeps the chunk_text_advanced boundaries, where any edit shifts every later
+    chunk. Every acknowledged batch is checkpointed, and chunks acknowledged by an interrupted run of the same
+    file are skipped. Chunk texts go to the book's local chunk store rather than vector metadata. Returns counts
+    of the chunks in the book, embedded and deleted.
+    """
+    boundaries = boundaries or retrieval_settings()['CHUNK_BOUNDARIES']
+    directory = book_index_dir(namespace)
+    os.makedirs(directory, exist_ok=True)
+    stat = os.stat(pdf_path)
+    checkpoint = IndexingCheckpoint(os.path.join(directory, 'upload_checkpoint.jsonl'), {
+        "size": stat.st_size, "mtime": stat.st_mtime_ns, "min_words": min_words, "max_words": max_words,
+        "use_separators": use_separators, "context_window": context_window, "model": model, "full": full, "boundaries": boundaries,
+    })
+    manifest = read_manifest(directory)
+    previous_store = get_chunk_store(namespace)
+    previous_ids = set()
+    if previous_store is not None:
+        previous_ids = set(previous_store.ids)
+    reusable_ids = previous_ids if manifest and manifest.get('model') == model and not full else set()
+
+    store = get_vector_store()
+    embed_queue = queue.Queue(maxsize=queue_size)
+    upsert_queue = queue.Queue(maxsize=queue_size)
+    failed = threading.Event()
+    errors = []
+
+    def embed_worker():
+        while True:
+            batch = embed_queue.get()
+            if batch is None:
+                return
+            if failed.is_set():
+                continue
+            ids, texts = batch
+            try:
+                vectors = generate_embeddings(texts, model=model, max_workers=1)
+                upsert_queue.put((ids, vectors))
+            except Exception as e:
+                errors.append(e)
+                failed.set()
+
+    def upsert_worker():
+        while True:
+            batch = upsert_queue.get()
+            if batch is None:
+                return
+            # Batches embedded before a failure are still upserted, so a resumed run does not pay for them again
+            ids, vectors = batch
+            try:
+                # Chunk texts live in the local chunk store, the vectors only carry ids
+                upsert_data = [(item_id, vector, {}) for item_id, vector in zip(ids, vectors)]
+                upserted = store.upsert(namespace, upsert_data)
+                if upserted != len(upsert_data):
+                    raise RuntimeError(f"Vector store acknowledged {upserted} of {len(upsert_data)} vectors")
+                checkpoint.acknowledge(ids)
+            except Exception as e:
+                errors.append(e)
+                failed.set()
+
+    embed_threads = [threading.Thread(target=embed_worker, daemon=True) for _ in range(embed_workers)]
+    upsert_thread = threading.Thread(target=upsert_worker, daemon=True)
+    for thread in embed_threads + [upsert_thread]:
+        thread.start()
+
+    seen_ids = set()
+    embedded = 0
+    chunk_writer = ChunkTextWriter(directory)
+    completed = False
+    try:
+        batch_ids, batch_texts = [], []
+        paragraphs = iter_paragraphs(iter_pdf_pages(pdf_path))
+        if boundaries == 'content':
+            chunk_texts = iter_content_defined_chunks(paragraphs, min_words, max_words, context_window)
+        else:
+            chunk_texts = iter_chunks(paragraphs, min_words, max_words, use_separators, context_window)
+        for text in chunk_texts:
+            if failed.is_set():
+                break
+            item_id = chunk_id(text)
+            if item_id in seen_ids:  # Repeated text, e.g. a running header, is stored once
+                continue
+            seen_ids.add(item_id)
+            chunk_writer.add(item_id, text)
+            if item_id in reusable_ids or item_id in checkpoint.acknowledged:
+                continue
+            batch_ids.append(item_id)
+            batch_texts.append(text)
+            if len(batch_ids) == batch_size:
+                embed_queue.put((batch_ids, batch_texts))
+                embedded += len(batch_ids)
+                batch_ids, batch_texts = [], []
+        if batch_ids and not failed.is_set():
+            embed_queue.put((batch_ids, batch_texts))
+            embedded += len(batch_ids)
+        completed = not failed.is_set()
+    finally:
+        for _ in embed_threads:
+            embed_queue.put(None)
+        for thread in embed_threads:
+            thread.join()
+        upsert_queue.put(None)
+        upsert_thread.join()
+        completed = completed and not errors
+        if not completed:
+            chunk_writer.abort()
+
+    if errors:
+        raise errors[0]
+
+    # Chunks gone from the book are deleted before the new chunk texts replace the old ones: if the delete fails,
+    # the previous chunk store still lists them and the next run deletes them again
+    removed_ids = previous_ids - seen_ids
+    try:
+        if removed_ids:
+            store.delete(namespace, sorted(removed_ids))
+    except Exception:
+        chunk_writer.abort()
+        raise
+    chunk_writer.close()
+    store.build(namespace)
+
+    build_book_lexical_index(namespace, iter(get_chunk_store(namespace)))
+    with open(os.path.join(directory, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump({"model": model, "chunks": len(seen_ids), "min_words": min_words, "max_words": max_words,
+                   "use_separators": use_separators, "context_window": context_window, "boundaries": boundaries}, f)
+    namespace_catalog.invalidate()
+    checkpoint.clear()
+    return {"chunks": len(seen_ids), "embedded": embedded, "deleted": len(removed_ids)}
@@ -0,0 +1,107 @@
+import json
+import mmap
+import os
+import threading
+import zlib
+
+import numpy as np
+
+from .lexical_index import book_index_dir
+
+
+class ChunkTextWriter:
+    """
+    Writes the chunk texts of a book as individually zlib-compressed records in chunks.zdat, with the byte offset
+    of every record in chunk_offsets.npy and the chunk ids in the same order in chunk_ids.json.
+    The files are written under temporary names and swapped in by close(), so readers never see a partial store
+    and an aborted upload keeps the previous one.
+    """
+
+    def __init__(self, directory, level=6):
+        self.directory = directory
+        self.level = level
+        os.makedirs(directory, exist_ok=True)
+        self._data = open(os.path.join(directory, 'chunks.zdat.tmp'), 'wb')
+        self._ids = []
+        self._offsets = [0]
+
+    def add(self, chunk_id, text):
+        record = zlib.compress(text.encode('utf-8'), self.level)
+        self._data.write(record)
+        self._ids.append(str(chunk_id))
+        self._offsets.append(self._offsets[-1] + len(record))
+
+    def close(self):
+        self._data.close()
+        np.save(os.path.join(self.directory, 'chunk_offsets.tmp.npy'), np.asarray(self._offsets, dtype=np.int64))
+        with open(os.path.join(self.directory, 'chunk_ids.json.tmp'), 'w', encoding='utf-8') as f:
+            json.dump(self._ids, f)
+        os.replace(os.path.join(self.directory, 'chunks.zdat.tmp'), os.path.join(self.directory, 'chunks.zdat'))
+        os.replace(os.path.join(self.directory, 'chunk_offsets.tmp.npy'), os.path.join(self.directory, 'chunk_offsets.npy'))
+        # The ids are replaced last, their modification time is what readers use to notice a new store
+        os.replace(os.path.join(self.directory, 'chunk_ids.json.tmp'), os.path.join(self.directory, 'chunk_ids.json'))
+
+    def abort(self):
+        """Discards everything written so far and keeps the previous store."""
+        self._data.close()
+        os.remove(os.path.join(self.directory, 'chunks.zdat.tmp'))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class ChunkTextStore:
+    """Read side of a book's chunk texts, the data file and offsets are memory-mapped and records are decompressed on demand."""
+
+    def __init__(self, directory):
+        with open(os.path.join(directory, 'chunk_ids.json'), encoding='utf-8') as f:
+            self.ids = json.load(f)
+        self._rows = {chunk_id: row for row, chunk_id in enumerate(self.ids)}
+        self._offsets = np.load(os.path.join(directory, 'chunk_offsets.npy'), mmap_mode='r')
+        with open(os.path.join(directory, 'chunks.zdat'), 'rb') as f:
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b''
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _text(self, row):
+        return zlib.decompress(self._data[int(self._offsets[row]):int(self._offsets[row + 1])]).decode('utf-8')
+
+    def get(self, chunk_id):
+        """Returns the text of a chunk, or None if the book has no such chunk."""
+        row = self._rows.get(str(chunk_id))
+        return None if row is None else self._text(row)
+
+    def get_many(self, chunk_ids):
+        """Returns {chunk id: text} for the ids present in the store."""
+        return {chunk_id: self._text(self._rows[chunk_id]) for chunk_id in map(str, chunk_ids) if chunk_id in self._rows}
+
+    def __iter__(self):
+        """Yields (chunk id, text) pairs in storage order."""
+        for row, chunk_id in enumerate(self.ids):
+            yield chunk_id, self._text(row)
+
+
+_loaded = {}
+_loaded_lock = threading.Lock()
+
+
+def get_chunk_store(namespace):
+    """Returns the chunk text store of a book, or None if the book was uploaded with its text in vector metadata."""
+    directory = book_index_dir(namespace)
+    try:
+        modified = os.stat(os.path.join(directory, 'chunk_ids.json')).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    with _loaded_lock:
+        cached = _loaded.get(namespace)
+        if cached is None or cached[0] != modified:
+            cached = (modified, ChunkTextStore(directory))
+            _loaded[namespace] = cached
+    return cached[1]
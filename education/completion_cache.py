@@ -0,0 +1,144 @@
+import datetime
+import hashlib
+import json
+import threading
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.utils import timezone
+
+
+def _jsonable(value):
+    """Turns SDK objects (e.g. assistant messages kept in a tool calling context) into plain data for hashing."""
+    if hasattr(value, 'model_dump'):
+        return value.model_dump(exclude_none=True)
+    if isinstance(value, dict):
+        return {key: _jsonable(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(item) for item in value]
+    return value
+
+
+def completion_key(params):
+    """sha256 of the request parameters that determine a completion: model, messages, response_format, tools and tool_choice."""
+    relevant = {name: _jsonable(params.get(name)) for name in ('model', 'messages', 'response_format', 'tools', 'tool_choice')}
+    return hashlib.sha256(json.dumps(relevant, sort_keys=True, ensure_ascii=False, default=str).encode('utf-8')).hexdigest()
+
+
+class CompletionCache:
+    """
+    Exact prompt/response cache for chat completions, stored in the CachedCompletion table.
+
+    It is off in web requests, where regenerating has to produce a new answer: the batch commands and the lesson
+    workers switch it on for their process with enable(), unless settings.COMPLETION_CACHE['ENABLED'] already did.
+
+    Entries are keyed by completion_key and expire after the TTL of the call site that wrote them
+    (settings.COMPLETION_CACHE['TTLS'], DEFAULT_TTL otherwise). Every few writes the expired entries are deleted
+    and the table is trimmed back to max_entries rows, least recently used first.
+    """
+
+    EVICTION_CHECK_INTERVAL = 50
+
+    def __init__(self, max_entries=20000, default_ttl=30 * 24 * 3600, ttls=None, enabled=False):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.ttls = ttls or {}
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._writes_since_eviction = 0
+        self._counters = {'hits': 0, 'misses': 0, 'writes': 0, 'evictions': 0}
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def enable(self, enabled=True):
+        """Turns the cache on (or off) for every completion of this process."""
+        self.enabled = enabled
+
+    def ttl(self, call_site):
+        return self.ttls.get(call_site, self.default_ttl)
+
+    def get(self, params):
+        """Returns the cached assistant message of these request parameters as a dict, or None on a miss."""
+        if not self.enabled:
+            return None
+        from .models import CachedCompletion
+        now = timezone.now()
+        try:
+            row = CachedCompletion.objects.filter(key=completion_key(params), expires_at__gt=now).values_list('id', 'response').first()
+            if row is not None:
+                CachedCompletion.objects.filter(id=row[0]).update(last_used_at=now)
+        except DatabaseError as e:
+            print(f"Completion cache lookup failed: {e}")
+            row = None
+        if row is None:
+            self._count('misses')
+            return None
+        self._count('hits')
+        return row[1]
+
+    def set(self, params, call_site, message):
+        """Stores the assistant message (a dict) returned for these request parameters."""
+        if not self.enabled:
+            return
+        from .models import CachedCompletion
+        now = timezone.now()
+        try:
+            CachedCompletion.objects.update_or_create(
+                key=completion_key(params),
+                defaults={'model': params.get('model', ''), 'call_site': call_site, 'response': message, 'last_used_at': now,
+                          'expires_at': now + datetime.timedelta(seconds=self.ttl(call_site))},
+            )
+        except DatabaseError as e:
+            print(f"Completion cache write failed: {e}")
+            return
+        self._count('writes')
+
+        with self._lock:
+            self._writes_since_eviction += 1
+            should_evict = self._writes_since_eviction >= self.EVICTION_CHECK_INTERVAL
+            if should_evict:
+                self._writes_since_eviction = 0
+        if should_evict:
+            self.evict()
+
+    def evict(self):
+        """Deletes expired entries and the least recently used ones above max_entries, returns how many were removed."""
+        from .models import CachedCompletion
+        try:
+            removed, _ = CachedCompletion.objects.filter(expires_at__lte=timezone.now()).delete()
+            excess = CachedCompletion.objects.count() - self.max_entries
+            if excess > 0:
+                stale_ids = list(CachedCompletion.objects.order_by('last_used_at').values_list('id', flat=True)[:excess])
+                removed += CachedCompletion.objects.filter(id__in=stale_ids).delete()[0]
+        except DatabaseError as e:
+            print(f"Completion cache eviction failed: {e}")
+            return 0
+        self._count('evictions', removed)
+        return removed
+
+    def clear(self, call_site=None):
+        """Deletes every entry, or only the entries written by one call site."""
+        from .models import CachedCompletion
+        entries = CachedCompletion.objects.all()
+        if call_site:
+            entries = entries.filter(call_site=call_site)
+        entries.delete()
+
+    def stats(self):
+        """Returns the hit/miss counters of this process plus the hit rate."""
+        with self._lock:
+            stats = dict(self._counters)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+
+_cache_settings = getattr(settings, 'COMPLETION_CACHE', {})
+completion_cache = CompletionCache(
+    max_entries=_cache_settings.get('MAX_ENTRIES', 20000),
+    default_ttl=_cache_settings.get('DEFAULT_TTL', 30 * 24 * 3600),
+    ttls=_cache_settings.get('TTLS', {}),
+    enabled=_cache_settings.get('ENABLED', False),
+)
@@ -0,0 +1,139 @@
+import re
+
+import numpy as np
+from django.conf import settings
+
+from .embedding_cache import text_hash
+from .vector_index import matrix_from_rows, normalize_rows
+
+
+def concept_dedupe_settings():
+    """Returns settings.CONCEPT_DEDUPE with defaults filled in."""
+    config = {
+        'THRESHOLD': 0.97,
+        'BLOCK_ROWS': 1024,
+        'SCOPE': 'class',
+        'ON_CREATE': True,
+    }
+    config.update(getattr(settings, 'CONCEPT_DEDUPE', {}))
+    return config
+
+
+_DELIMITERS = re.compile(r'^(\\\[|\\\(|\$\$|\$)+|(\\\]|\\\)|\$\$|\$)+$')
+_SPACING = re.compile(r'\\(left|right|displaystyle|quad|qquad)(?![a-zA-Z])|\\[,;:! ]')
+_SINGLE_GROUP = re.compile(r'([_^])\{(\\?\w)\}')
+_FRACTIONS = re.compile(r'\\[dt]frac(?![a-zA-Z])')
+
+
+def normalize_latex(text):
+    """
+    Canonical form of a concept description for exact duplicate detection: math delimiters, spacing commands,
+    \\left/\\right and whitespace are dropped, \\dfrac and \\tfrac become \\frac and x^{2} becomes x^2.
+    """
+    text = (text or '').strip()
+    previous = None
+    while previous != text:
+        previous = text
+        text = _DELIMITERS.sub('', text).strip().rstrip('.,;')
+    text = _SPACING.sub('', text)
+    text = _FRACTIONS.sub(r'\\frac', text)
+    text = _SINGLE_GROUP.sub(r'\1\2', text)
+    return ''.join(text.split())
+
+
+def concept_key(description):
+    """sha256 of the normalized description, concepts sharing it are exact duplicates."""
+    return text_hash(normalize_latex(description))
+
+
+class UnionFind:
+    """Disjoint sets over arbitrary hashable items, with path halving."""
+
+    def __init__(self):
+        self._parent = {}
+
+    def find(self, item):
+        self._parent.setdefault(item, item)
+        while self._parent[item] != item:
+            self._parent[item] = self._parent[self._parent[item]]
+            item = self._parent[item]
+        return item
+
+    def union(self, a, b):
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a != root_b:
+            # The smaller id becomes the root, so groups are rooted at their oldest concept
+            self._parent[max(root_a, root_b)] = min(root_a, root_b)
+
+    def groups(self):
+        """Returns the sets with more than one item as sorted lists."""
+        members = {}
+        for item in self._parent:
+            members.setdefault(self.find(item), []).append(item)
+        return [sorted(group) for group in members.values() if len(group) > 1]
+
+
+def similar_pairs(ids, matrix, threshold, block_rows=1024):
+    """
+    Yields (id, other id, score) for every pair of rows with cosine similarity >= threshold, each pair once.
+    The normalized matrix is multiplied against itself block_rows rows at a time and only the upper triangle is kept.
+    """
+    ids = np.asarray(ids, dtype=np.int64)
+    matrix = normalize_rows(matrix)
+    for start in range(0, len(ids), block_rows):
+        block = matrix[start:start + block_rows] @ matrix.T
+        rows, columns = np.nonzero(block >= threshold)
+        keep = columns > rows + start
+        for row, column in zip(rows[keep], columns[keep]):
+            yield int(ids[row + start]), int(ids[column]), float(block[row, column])
+
+
+def find_duplicate_groups(concepts, threshold=None, block_rows=None):
+    """
+    Groups duplicate concepts of one queryset: exact duplicates share the hash of their normalized description,
+    near duplicates are embedded concepts whose cosine similarity reaches threshold, and groups are closed
+    transitively with union-find. Returns lists of concept ids, oldest first.
+    """
+    config = concept_dedupe_settings()
+    threshold = config['THRESHOLD'] if threshold is None else threshold
+    block_rows = block_rows or config['BLOCK_ROWS']
+
+    groups = UnionFind()
+    first_with_key = {}
+    for concept_id, description in concepts.values_list('id', 'description').order_by('id'):
+        groups.find(concept_id)
+        key = concept_key(description)
+        if key in first_with_key:
+            groups.union(first_with_key[key], concept_id)
+        else:
+            first_with_key[key] = concept_id
+
+    ids, matrix = matrix_from_rows(concepts.filter(embedding_data__isnull=False).values_list('id', 'embedding_data').order_by('id'), 'concept')
+    if ids:
+        for concept_id, other_id, _ in similar_pairs(ids, matrix, threshold, block_rows):
+            groups.union(concept_id, other_id)
+    return groups.groups()
+
+
+def dedupe_concepts(concepts, threshold=None, merge=False):
+    """
+    Finds the duplicate groups of a queryset of concepts, per class unless settings.CONCEPT_DEDUPE['SCOPE'] is
+    'global'. With merge set every group is merged into its canonical concept. Returns the groups as lists of
+    Concept objects, canonical concept first.
+    """
+    from .models import Concept
+
+    if concept_dedupe_settings()['SCOPE'] == 'global':
+        scopes = [concepts]
+    else:
+        class_ids = concepts.values_list('related_class_id', flat=True).distinct()
+        scopes = [concepts.filter(related_class_id=class_id) if class_id is not None else concepts.filter(related_class__isnull=True) for class_id in class_ids]
+
+    result = []
+    for scope in scopes:
+        for group_ids in find_duplicate_groups(scope, threshold=threshold):
+            group = list(Concept.objects.filter(id__in=group_ids).order_by('-approved', 'id'))
+            if merge:
+                group[0].merge(group[1:])
+            result.append(group)
+    return result
@@ -0,0 +1,146 @@
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+from django.conf import settings
+from django.db import DatabaseError
+from django.utils import timezone
+
+
+def normalize_text(text):
+    """Normalizes text before hashing so whitespace and unicode form differences share a cache entry."""
+    return " ".join(unicodedata.normalize('NFC', text).split())
+
+
+def text_hash(text):
+    """Returns the sha256 hex digest of the normalized text."""
+    return hashlib.sha256(normalize_text(text).encode('utf-8')).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Two tier cache for embeddings keyed by (model, sha256 of the normalized text).
+
+    The first tier is an in-process LRU of float32 arrays, the second is the CachedEmbedding table,
+    which is trimmed back to max_entries rows (least recently used first) every few writes.
+    """
+
+    EVICTION_CHECK_INTERVAL = 100
+
+    def __init__(self, memory_entries=1024, max_entries=50000, enabled=True):
+        self.memory_entries = memory_entries
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes_since_eviction = 0
+        self._counters = {'memory_hits': 0, 'persistent_hits': 0, 'misses': 0, 'writes': 0, 'evictions': 0}
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def _remember(self, key, vector):
+        with self._lock:
+            self._memory[key] = vector
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def get(self, text, model):
+        """Returns the cached embedding as a float32 array, or None on a miss."""
+        if not self.enabled:
+            return None
+        key = (model, text_hash(text))
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self._counters['memory_hits'] += 1
+                return vector
+
+        from .models import CachedEmbedding
+        try:
+            row = CachedEmbedding.objects.filter(model=model, text_hash=key[1]).values_list('id', 'vector_data').first()
+            if row is not None:
+                CachedEmbedding.objects.filter(id=row[0]).update(last_used_at=timezone.now())
+        except DatabaseError as e:
+            print(f"Embedding cache lookup failed: {e}")
+            row = None
+
+        if row is None:
+            self._count('misses')
+            return None
+        vector = np.frombuffer(row[1], dtype='<f4')
+        self._remember(key, vector)
+        self._count('persistent_hits')
+        return vector
+
+    def set(self, text, model, vector):
+        """Stores an embedding in both tiers."""
+        if not self.enabled:
+            return
+        key = (model, text_hash(text))
+        vector = np.asarray(vector, dtype='<f4')
+        self._remember(key, vector)
+
+        from .models import CachedEmbedding
+        try:
+            CachedEmbedding.objects.update_or_create(
+                model=model, text_hash=key[1],
+                defaults={'vector_data': vector.tobytes(), 'dimensions': vector.size, 'last_used_at': timezone.now()},
+            )
+        except DatabaseError as e:
+            print(f"Embedding cache write failed: {e}")
+            return
+        self._count('writes')
+
+        with self._lock:
+            self._writes_since_eviction += 1
+            should_evict = self._writes_since_eviction >= self.EVICTION_CHECK_INTERVAL
+            if should_evict:
+                self._writes_since_eviction = 0
+        if should_evict:
+            self.evict()
+
+    def evict(self):
+        """Deletes the least recently used persistent entries above max_entries, returns how many were removed."""
+        from .models import CachedEmbedding
+        try:
+            excess = CachedEmbedding.objects.count() - self.max_entries
+            if excess <= 0:
+                return 0
+            stale_ids = list(CachedEmbedding.objects.order_by('last_used_at').values_list('id', flat=True)[:excess])
+            removed, _ = CachedEmbedding.objects.filter(id__in=stale_ids).delete()
+        except DatabaseError as e:
+            print(f"Embedding cache eviction failed: {e}")
+            return 0
+        self._count('evictions', removed)
+        return removed
+
+    def clear(self, persistent=False):
+        """Empties the in-process tier, and the persistent tier as well if asked to."""
+        with self._lock:
+            self._memory.clear()
+        if persistent:
+            from .models import CachedEmbedding
+            CachedEmbedding.objects.all().delete()
+
+    def stats(self):
+        """Returns the hit/miss counters of this process plus the hit rate."""
+        with self._lock:
+            stats = dict(self._counters)
+            stats['memory_entries'] = len(self._memory)
+        lookups = stats['memory_hits'] + stats['persistent_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['memory_hits'] + stats['persistent_hits']) / lookups if lookups else 0.0
+        return stats
+
+
+_cache_settings = getattr(settings, 'EMBEDDING_CACHE', {})
+embedding_cache = EmbeddingCache(
+    memory_entries=_cache_settings.get('MEMORY_ENTRIES', 1024),
+    max_entries=_cache_settings.get('MAX_ENTRIES', 50000),
+    enabled=_cache_settings.get('ENABLED', True),
+)
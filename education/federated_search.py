@@ -0,0 +1,133 @@
+import concurrent.futures
+import heapq
+import threading
+import time
+
+from .lexical_index import retrieval_settings
+from .vector_store import get_vector_store
+
+
+class NamespaceCatalog:
+    """TTL cache of the vector store namespaces, so searching every book does not list them on each query."""
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self._namespaces = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self):
+        with self._lock:
+            if self._namespaces is None or time.monotonic() - self._loaded_at > self.ttl:
+                self._namespaces = get_vector_store().namespaces()
+                self._loaded_at = time.monotonic()
+            return list(self._namespaces)
+
+    def invalidate(self):
+        """Forces the next get() to list the namespaces again, called after a book is uploaded."""
+        with self._lock:
+            self._namespaces = None
+
+
+def merge_by_rank(result_lists, top_k=5, k=60):
+    """
+    Merges the ranked results of several namespaces by reciprocal rank: each result scores 1 / (k + its rank in its
+    namespace), ties going to the better namespace score. The scores of different books (BM25 above all) are not
+    comparable, their ranks are. The merged score replaces the original one, which is kept as namespace_score.
+    """
+    merged = (dict(result, score=1.0 / (k + rank + 1), namespace_score=result['score'])
+              for results in result_lists for rank, result in enumerate(results))
+    return heapq.nlargest(top_k, merged, key=lambda x: (x['score'], x['namespace_score']))
+
+
+class FederatedSearch:
+    """
+    Fans a query out to every namespace on a long-lived worker pool and merges the hits into one top-k list.
+
+    At most max_workers namespace calls are in flight at once, across every query of the process, so a call is only
+    submitted when a worker is free to start it right away. Each call gets timeout seconds from when it started;
+    calls that time out or fail are left out of the merge, so one slow book cannot stall the query. A timed out call
+    keeps its slot until it returns, and a namespace that cannot get a slot within timeout seconds of the query
+    start is skipped, which keeps calls from queueing behind abandoned ones.
+    The namespaces' lists are merged by rank (merge_by_rank with rrf_k), unless the query asks for merge='score'
+    because its scores share one scale, like the cosine scores of a vector-only search.
+    """
+
+    def __init__(self, query_namespace, catalog, max_workers=10, timeout=5.0, rrf_k=60):
+        self.query_namespace = query_namespace
+        self.catalog = catalog
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.rrf_k = rrf_k
+        self._executor = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_workers)
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='federated-search')
+        return self._executor
+
+    def _query(self, started, namespace, *args, **kwargs):
+        started[namespace] = time.monotonic()
+        try:
+            return self.query_namespace(*args, **kwargs)
+        finally:
+            self._slots.release()
+
+    def _submit(self, namespaces, deadline, started, query_vector, top_k, query_options):
+        futures = {}
+        for namespace in namespaces:
+            if not self._slots.acquire(timeout=max(0.0, deadline - time.monotonic())):
+                print(f"Search of namespace {namespace} skipped, no search worker was free")
+                continue
+            started[namespace] = time.monotonic()  # Until the call starts, its timeout runs from its submission
+            try:
+                future = self.executor.submit(self._query, started, namespace, query_vector, top_k, namespace, **query_options)
+            except Exception:
+                self._slots.release()
+                raise
+            # A call cancelled before it started never reaches _query, so its slot is given back here
+            future.add_done_callback(lambda future: future.cancelled() and self._slots.release())
+            futures[future] = namespace
+        return futures
+
+    def search(self, query_vector, top_k=5, namespaces=None, merge='rank', **query_options):
+        """Returns up to top_k results across namespaces, best first, each tagged with its namespace."""
+        namespaces = self.catalog.get() if namespaces is None else namespaces
+        started = {}
+        futures = self._submit(namespaces, time.monotonic() + self.timeout, started, query_vector, top_k, query_options)
+
+        pending = set(futures)
+        while pending:
+            now = time.monotonic()
+            deadlines = {future: started[futures[future]] + self.timeout for future in pending}
+            for future in [future for future in pending if not future.done() and deadlines[future] <= now]:
+                future.cancel()
+                print(f"Search of namespace {futures[future]} timed out after {self.timeout}s")
+                pending.discard(future)
+                del futures[future]
+            pending = {future for future in pending if not future.done()}
+            if pending:
+                concurrent.futures.wait(pending, timeout=max(0.0, min(deadlines[future] for future in pending) - now),
+                                        return_when=concurrent.futures.FIRST_COMPLETED)
+
+        result_lists = []
+        for future, namespace in futures.items():
+            try:
+                results = future.result()
+            except Exception as e:
+                print(f"Search of namespace {namespace} failed: {e}")
+                continue
+            result_lists.append([dict(result, namespace=namespace) for result in results])
+
+        if merge == 'score':
+            return heapq.nlargest(top_k, (result for results in result_lists for result in results), key=lambda x: x['score'])
+        return merge_by_rank(result_lists, top_k=top_k, k=self.rrf_k)
+
+
+_config = retrieval_settings()
+namespace_catalog = NamespaceCatalog(ttl=_config['NAMESPACE_CATALOG_TTL'])
@@ -0,0 +1,156 @@
+import datetime
+import os
+import socket
+import threading
+import uuid
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+
+def job_queue_settings():
+    """Returns settings.JOB_QUEUE with defaults filled in."""
+    config = {
+        'ENABLED': True,
+        'LEASE_SECONDS': 900,
+        'MAX_ATTEMPTS': 3,
+        'RETRY_DELAY': 60,
+        'POLL_INTERVAL': 2.0,
+    }
+    config.update(getattr(settings, 'JOB_QUEUE', {}))
+    return config
+
+
+## Pipeline stages, each one can run again on a lesson it already processed without redoing the work
+
+def summarize_stage(lesson):
+    for transcript in lesson.transcripts.filter(Q(summarized__isnull=True) | Q(summarized='')).exclude(content__isnull=True).exclude(content=''):
+        transcript.summarize()
+
+
+def analyze_stage(lesson):
+    if not lesson.analyzed:
+        lesson.generate_analysis()
+        # generate_analysis leaves analyzed off when some fields still failed, retry the stage with backoff then.
+        # A lesson missing its lecture or student transcript cannot be analyzed yet and is not an error.
+        lesson.refresh_from_db()
+        sources = set(lesson.transcripts.values_list('source', flat=True))
+        if not lesson.analyzed and {'Lecture', 'Student'} <= sources:
+            raise RuntimeError(f"Analysis of lesson {lesson.pk} is incomplete")
+
+
+def embed_stage(lesson):
+    lesson.embed()
+    for transcript in lesson.transcripts.filter(source='Lecture'):
+        transcript.index_passages()
+
+
+def concepts_stage(lesson):
+    from .models import Concept
+    from .utils import create_concepts_from_lesson
+
+    if not Concept.for_lesson(lesson).exists():
+        create_concepts_from_lesson(lesson)
+
+
+STAGE_FUNCTIONS = {
+    'summarize': summarize_stage,
+    'analyze': analyze_stage,
+    'embed': embed_stage,
+    'concepts': concepts_stage,
+}
+
+
+def worker_name():
+    """A name unique to this worker thread, recorded in the lease of the job it runs."""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def claim_job(worker, lease_seconds=None):
+    """
+    Leases the oldest runnable job to worker and returns it, or None if there is nothing to run.
+
+    Pending jobs and running jobs whose lease expired (their worker died) are runnable, except while another
+    job of the same lesson holds a live lease. The claim is a conditional update on the state the job was read in,
+    so when two workers race for a job only one of them updates a row.
+    """
+    from .models import LessonJob
+
+    lease_seconds = lease_seconds or job_queue_settings()['LEASE_SECONDS']
+    now = timezone.now()
+    runnable = Q(status=LessonJob.PENDING) | Q(status=LessonJob.RUNNING, lease_expires_at__lt=now)
+    busy_lesson = LessonJob.objects.filter(lesson=OuterRef('lesson'), status=LessonJob.RUNNING, lease_expires_at__gte=now).exclude(pk=OuterRef('pk'))
+    candidates = (LessonJob.objects.filter(runnable, run_after__lte=now).filter(~Exists(busy_lesson))
+                  .order_by('run_after', 'created_at').values_list('pk', flat=True)[:10])
+    for job_id in candidates:
+        claimed = LessonJob.objects.filter(runnable, pk=job_id).update(
+            status=LessonJob.RUNNING, leased_by=worker,
+            lease_expires_at=now + datetime.timedelta(seconds=lease_seconds), updated_at=now,
+        )
+        if claimed:
+            return LessonJob.objects.select_related('lesson').get(pk=job_id)
+    return None
+
+
+def run_job(job, worker):
+    """
+    Runs the remaining stages of a claimed job. Each finished stage is recorded and the lease renewed, as long as
+    the worker still holds it. A failing stage is retried after RETRY_DELAY * attempts seconds, up to MAX_ATTEMPTS
+    times, then the job is marked failed. Returns the final status of the job.
+    """
+    from .models import LessonJob
+
+    config = job_queue_settings()
+    held = LessonJob.objects.filter(pk=job.pk, leased_by=worker, status=LessonJob.RUNNING)
+    stages = LessonJob.STAGES[LessonJob.STAGES.index(job.stage):]
+    for position, stage in enumerate(stages):
+        try:
+            STAGE_FUNCTIONS[stage](job.lesson)
+        except Exception as e:
+            print(f"Error in stage {stage} of lesson job {job.pk}: {e}")
+            attempts = job.attempts + 1
+            if attempts >= config['MAX_ATTEMPTS']:
+                held.update(status=LessonJob.FAILED, attempts=attempts, last_error=str(e), leased_by=None, lease_expires_at=None, updated_at=timezone.now())
+                return LessonJob.FAILED
+            held.update(status=LessonJob.PENDING, attempts=attempts, last_error=str(e), leased_by=None, lease_expires_at=None,
+                        run_after=timezone.now() + datetime.timedelta(seconds=config['RETRY_DELAY'] * attempts), updated_at=timezone.now())
+            return LessonJob.PENDING
+
+        next_stages = stages[position + 1:]
+        now = timezone.now()
+        if not next_stages:
+            held.update(status=LessonJob.DONE, last_error=None, leased_by=None, lease_expires_at=None, updated_at=now)
+            return LessonJob.DONE
+        job.stage, job.attempts = next_stages[0], 0
+        if not held.update(stage=job.stage, attempts=0, lease_expires_at=now + datetime.timedelta(seconds=config['LEASE_SECONDS']), updated_at=now):
+            print(f"Lesson job {job.pk} lost its lease, leaving it to its new worker")
+            return LessonJob.RUNNING
+
+
+def work(stop=None, once=False, poll_interval=None):
+    """
+    Worker loop: claims and runs jobs until stop is set, or until the queue is empty when once is set.
+    Returns how many jobs it ran.
+    """
+    stop = stop or threading.Event()
+    poll_interval = poll_interval or job_queue_settings()['POLL_INTERVAL']
+    worker = worker_name()
+    ran = 0
+    while not stop.is_set():
+        close_old_connections()
+        try:
+            job = claim_job(worker)
+        except Exception as e:
+            print(f"Error claiming a lesson job: {e}")
+            job = None
+        if job is None:
+            if once:
+                break
+            stop.wait(poll_interval)
+            continue
+        run_job(job, worker)
+        ran += 1
+    close_old_connections()
+    return ran
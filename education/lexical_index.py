@@ -0,0 +1,182 @@
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+
+import numpy as np
+from django.conf import settings
+
+
+TOKEN_PATTERN = re.compile(r"\\[A-Za-z]+|\w+|[^\w\s.,;:!?'\"()\[\]{}]")
+
+
+def tokenize(text):
+    """Lowercased word tokens plus LaTeX commands and single math symbols, so formulas stay searchable."""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def is_symbolic_token(token):
+    return bool(
+        token.startswith('\\')
+        or not token[0].isalnum() and token[0] != '_'
+        or '_' in token
+        or any(c.isdigit() for c in token)
+        or len(token) == 1
+    )
+
+
+def symbol_ratio(query):
+    """Share of query tokens that are symbols, identifiers, numbers or single-letter variables."""
+    tokens = tokenize(query)
+    if not tokens:
+        return 0.0
+    return sum(is_symbolic_token(t) for t in tokens) / len(tokens)
+
+
+def retrieval_settings():
+    """Returns settings.BOOK_RETRIEVAL with defaults filled in."""
+    config = {
+        'MODE': 'hybrid',
+        'RRF_K': 60,
+        'CANDIDATES': 20,
+        'LEXICAL_ONLY_SYMBOL_RATIO': 0.5,
+        'INDEX_ROOT': os.path.join(settings.MEDIA_ROOT, 'book_indexes'),
+        'NAMESPACE_CATALOG_TTL': 300,
+        'SEARCH_WORKERS': 10,
+        'NAMESPACE_TIMEOUT': 5.0,
+        'CHUNK_BOUNDARIES': 'content',
+    }
+    config.update(getattr(settings, 'BOOK_RETRIEVAL', {}))
+    return config
+
+
+class BM25Index:
+    """
+    Okapi BM25 over the chunks of one book.
+
+    Postings are kept in CSR form: for term t, doc_rows[offsets[t]:offsets[t + 1]] are the chunks containing it
+    and term_freqs the matching counts, so scoring a query only touches the postings of its own terms.
+    """
+
+    def __init__(self, ids, vocabulary, offsets, doc_rows, term_freqs, doc_lengths, k1=1.2, b=0.75):
+        self.ids = ids
+        self.vocabulary = vocabulary
+        self.offsets = offsets
+        self.doc_rows = doc_rows
+        self.term_freqs = term_freqs
+        self.doc_lengths = doc_lengths
+        self.k1 = k1
+        self.b = b
+        self.average_length = float(doc_lengths.mean()) if len(doc_lengths) else 0.0
+
+    @classmethod
+    def build(cls, chunks):
+        """Builds the index from (id, text) pairs."""
+        ids, postings, doc_lengths = [], {}, []
+        for row, (chunk_id, text) in enumerate(chunks):
+            tokens = tokenize(text)
+            ids.append(str(chunk_id))
+            doc_lengths.append(len(tokens))
+            for term, count in Counter(tokens).items():
+                postings.setdefault(term, []).append((row, count))
+
+        vocabulary = {term: position for position, term in enumerate(sorted(postings))}
+        offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        doc_rows, term_freqs = [], []
+        for term, position in vocabulary.items():
+            rows = postings[term]
+            offsets[position + 1] = offsets[position] + len(rows)
+            doc_rows.extend(row for row, _ in rows)
+            term_freqs.extend(count for _, count in rows)
+        return cls(ids, vocabulary, offsets, np.asarray(doc_rows, dtype=np.int32),
+                   np.asarray(term_freqs, dtype=np.float32), np.asarray(doc_lengths, dtype=np.float32))
+
+    def search(self, query, top_k=5):
+        """Returns up to top_k (row, score) pairs with a positive score, best first."""
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        for term in set(tokenize(query)):
+            position = self.vocabulary.get(term)
+            if position is None:
+                continue
+            start, end = self.offsets[position], self.offsets[position + 1]
+            rows, freqs = self.doc_rows[start:end], self.term_freqs[start:end]
+            idf = math.log(1 + (len(self.ids) - (end - start) + 0.5) / ((end - start) + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[rows] / self.average_length)
+            scores[rows] += idf * freqs * (self.k1 + 1) / (freqs + norm)
+        candidates = np.flatnonzero(scores)
+        if not len(candidates):
+            return []
+        best = candidates[np.argsort(-scores[candidates], kind='stable')[:top_k]]
+        return [(int(row), float(scores[row])) for row in best]
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        np.savez(os.path.join(directory, 'bm25.npz'), offsets=self.offsets, doc_rows=self.doc_rows,
+                 term_freqs=self.term_freqs, doc_lengths=self.doc_lengths)
+        with open(os.path.join(directory, 'bm25.json'), 'w', encoding='utf-8') as f:
+            json.dump({"ids": self.ids, "vocabulary": self.vocabulary}, f)
+
+    @classmethod
+    def load(cls, directory):
+        arrays = np.load(os.path.join(directory, 'bm25.npz'))
+        with open(os.path.join(directory, 'bm25.json'), encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(data['ids'], data['vocabulary'], arrays['offsets'], arrays['doc_rows'],
+                   arrays['term_freqs'], arrays['doc_lengths'])
+
+
+def book_index_dir(namespace):
+    return os.path.join(retrieval_settings()['INDEX_ROOT'], namespace)
+
+
+_loaded = {}
+_loaded_lock = threading.Lock()
+
+
+def build_book_lexical_index(namespace, chunks):
+    """Builds and stores the BM25 index of a book from (id, text) pairs."""
+    index = BM25Index.build(chunks)
+    index.save(book_index_dir(namespace))
+    with _loaded_lock:
+        _loaded.pop(namespace, None)
+    return index
+
+
+def get_book_lexical_index(namespace):
+    """Returns the stored BM25 index of a book, or None if the book was uploaded before lexical indexing."""
+    path = os.path.join(book_index_dir(namespace), 'bm25.json')
+    try:
+        modified = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    with _loaded_lock:
+        cached = _loaded.get(namespace)
+        if cached is None or cached[0] != modified:
+            cached = (modified, BM25Index.load(book_index_dir(namespace)))
+            _loaded[namespace] = cached
+    return cached[1]
+
+
+def lexical_search(namespace, query, top_k=5):
+    """BM25 search over a book, returns result dicts like single_namespace_query, or None without an index."""
+    from .chunk_store import get_chunk_store
+
+    index = get_book_lexical_index(namespace)
+    chunk_store = get_chunk_store(namespace)
+    if index is None or chunk_store is None:
+        return None
+    hits = [(index.ids[row], score) for row, score in index.search(query, top_k)]
+    texts = chunk_store.get_many(chunk_id for chunk_id, _ in hits)
+    return [{"id": chunk_id, "text": texts.get(chunk_id), "score": score} for chunk_id, score in hits]
+
+
+def reciprocal_rank_fusion(result_lists, top_k=5, k=60):
+    """Fuses ranked result lists by summing 1 / (k + rank) per id, the fused score replaces the original one."""
+    fused = {}
+    for results in result_lists:
+        for rank, result in enumerate(results):
+            entry = fused.setdefault(result['id'], dict(result, score=0.0))
+            entry['score'] += 1.0 / (k + rank + 1)
+    return sorted(fused.values(), key=lambda x: x['score'], reverse=True)[:top_k]
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from education.models import RelatedLesson
+
+
+class Command(BaseCommand):
+    help = 'Recompute the lesson similarity graph used for related lesson suggestions.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--neighbors', type=int, help='Related lessons kept per lesson, settings.LESSON_GRAPH["NEIGHBORS"] by default.')
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS('Building lesson similarity graph...'))
+        edges = RelatedLesson.rebuild_graph(neighbors=options['neighbors'])
+        self.stdout.write(self.style.SUCCESS(f'{edges} related lesson edges written.'))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from education.concept_dedupe import concept_key, dedupe_concepts
+from education.models import Concept
+
+
+class Command(BaseCommand):
+    help = 'Find duplicate concepts (same normalized LaTeX or near-identical embeddings) and optionally merge them.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--class', dest='class_slug', help='Only look at the concepts of the class with this slug.')
+        parser.add_argument('--threshold', type=float, help='Cosine similarity from which two concepts are duplicates, settings.CONCEPT_DEDUPE["THRESHOLD"] by default.')
+        parser.add_argument('--merge', action='store_true', help='Merge every group into its canonical concept instead of only listing the suggestions.')
+
+    def handle(self, *args, **options):
+        concepts = Concept.objects.all()
+        if options['class_slug']:
+            concepts = concepts.filter(related_class__slug=options['class_slug'])
+
+        # Concepts saved before normalized_hash existed get it here, so creation-time dedupe can find them
+        missing = list(concepts.filter(normalized_hash__isnull=True).only('id', 'description'))
+        for concept in missing:
+            concept.normalized_hash = concept_key(concept.description)
+        Concept.objects.bulk_update(missing, ['normalized_hash'], batch_size=500)
+
+        groups = dedupe_concepts(concepts, threshold=options['threshold'], merge=options['merge'])
+        for group in groups:
+            canonical, duplicates = group[0], group[1:]
+            self.stdout.write(f'[{canonical.id}] {canonical.description[:80]}')
+            for duplicate in duplicates:
+                self.stdout.write(f'    <- [{duplicate.id}] {duplicate.description[:80]}')
+        removed = sum(len(group) - 1 for group in groups)
+        if options['merge']:
+            self.stdout.write(self.style.SUCCESS(f'{removed} duplicate concepts merged into {len(groups)} concepts.'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'{len(groups)} duplicate groups found, --merge would remove {removed} concepts.'))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from education.models import Book
+
+
+class Command(BaseCommand):
+    help = 'Embed the table of contents entries of books so lessons can be matched to a chapter without a chat completion.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Re-embed the sections even if the table of contents did not change.')
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS('Embedding book sections...'))
+        embedded = 0
+        for book in Book.objects.exclude(index_contents__isnull=True):
+            try:
+                embedded += book.embed_sections(force=options['force'])
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f'Error embedding the sections of {book}: {e}'))
+        self.stdout.write(self.style.SUCCESS(f'{embedded} book sections embedded.'))
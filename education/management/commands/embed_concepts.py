@@ -1,16 +1,14 @@
 from django.core.management.base import BaseCommand
-from education.models import Concept,Class,Lesson
-from education.utils import create_concepts_from_lesson
-from tqdm import tqdm
+from education.models import Concept
 
 class Command(BaseCommand):
     help = 'Embed concepts for concepts in the database.'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Re-embed concepts that already have an embedding.')
+
     def handle(self, *args, **options):
         self.stdout.write(self.style.SUCCESS('Embedding concepts...'))
-        concepts = Concept.objects.all()
-        for c in tqdm(concepts, desc="Processing Concepts"):
-            c.embed()
-            c.save()
-        self.stdout.write(self.style.SUCCESS('Concepts embedded successfully.'))
-
+        concepts = Concept.objects.all() if options['force'] else Concept.objects.filter(embedding_data__isnull=True)
+        embedded = Concept.embed_many(list(concepts), force_update=options['force'])
+        self.stdout.write(self.style.SUCCESS(f'{embedded} concepts embedded successfully.'))
@@ -0,0 +1,59 @@
+import numpy as np
+from django.core.management.base import BaseCommand
+from education.models import Concept, LessonEmbedding
+from education.vector_index import EmbeddingCompression, VectorIndex
+
+
+class Command(BaseCommand):
+    help = 'Report recall@k of compressed embedding indexes against the full precision baseline.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', choices=['lessons', 'concepts'], default='concepts', help='Which embeddings to evaluate.')
+        parser.add_argument('--k', type=int, default=10, help='Number of neighbours compared per query.')
+        parser.add_argument('--queries', type=int, default=200, help='Number of stored vectors sampled as queries.')
+        parser.add_argument('--dimensions', type=int, nargs='+', default=[256, 512, 1024], help='Truncated dimensions to evaluate.')
+        parser.add_argument('--rescore-factor', type=int, default=4, help='Candidates kept per result before exact rescoring.')
+
+    def handle(self, *args, **options):
+        if options['source'] == 'lessons':
+            rows = LessonEmbedding.objects.filter(vector_data__isnull=False).values_list('lesson_id', 'vector_data')
+        else:
+            rows = Concept.objects.filter(embedding_data__isnull=False).values_list('id', 'embedding_data')
+        vectors = {item_id: np.frombuffer(data, dtype='<f4') for item_id, data in rows if data}
+        full_dimensions = max((v.size for v in vectors.values()), default=0)
+        vectors = {item_id: v for item_id, v in vectors.items() if v.size == full_dimensions}
+        k = options['k']
+        if len(vectors) <= k:
+            self.stdout.write(self.style.ERROR(f'Need more than {k} embedded {options["source"]}, found {len(vectors)}.'))
+            return
+
+        ids = list(vectors)
+        matrix = np.vstack([vectors[i] for i in ids])
+        rng = np.random.default_rng(0)
+        query_ids = [ids[i] for i in rng.choice(len(ids), size=min(options['queries'], len(ids)), replace=False)]
+        queries = [vectors[i] for i in query_ids]
+
+        def neighbours(index):
+            # Ask for one extra result so the query itself can be left out
+            results = index.search_many(queries, top_k=k + 1)
+            return [[item_id for item_id, _ in found if item_id != query_id][:k] for query_id, found in zip(query_ids, results)]
+
+        baseline_index = VectorIndex(ids, matrix)
+        baseline = neighbours(baseline_index)
+
+        def recall(found):
+            return float(np.mean([len(set(a) & set(b)) / k for a, b in zip(found, baseline)]))
+
+        self.stdout.write(f'{len(ids)} {options["source"]} with {full_dimensions} dimensions, {len(queries)} queries, recall@{k}')
+        self.stdout.write(f'{"dims":>6} {"int8":>5} {"bytes/vec":>10} {"ratio":>7} {"first pass":>11} {"rescored":>9}')
+        self.stdout.write(f'{full_dimensions:>6} {"no":>5} {baseline_index.nbytes // len(ids):>10} {1.0:>7.1f} {1.0:>11.3f} {1.0:>9.3f}')
+        for dimensions in options['dimensions']:
+            for quantize in (False, True):
+                compression = EmbeddingCompression(dimensions=dimensions, quantize=quantize, rescore_factor=options['rescore_factor'])
+                first_pass = VectorIndex(ids, matrix, compression=compression)
+                rescored = VectorIndex(ids, matrix, compression=compression, fetch_vectors=lambda wanted: {i: vectors[i] for i in wanted})
+                per_vector = first_pass.nbytes / len(ids)
+                self.stdout.write(
+                    f'{min(dimensions, full_dimensions):>6} {"yes" if quantize else "no":>5} {per_vector:>10.0f} '
+                    f'{baseline_index.nbytes / first_pass.nbytes:>7.1f} {recall(neighbours(first_pass)):>11.3f} {recall(neighbours(rescored)):>9.3f}'
+                )
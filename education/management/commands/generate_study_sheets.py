@@ -3,12 +3,18 @@ from django.core.management.base import BaseCommand
 from django.conf import settings
 from education.models import Class, Lesson, StudySheet, Template
 from education.views import generate_study_guide_content, compile_latex_to_pdf
+from education.completion_cache import completion_cache
 from django.core.files.base import ContentFile
 
 class Command(BaseCommand):
     help = 'Generate study sheets for all classes, processing lessons in batches of four'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--no-cache', action='store_true', help='Send every prompt to the API instead of replaying cached completions.')
+
     def handle(self, *args, **options):
+        if not options['no_cache']:
+            completion_cache.enable()
         classes = Class.objects.all()
 
         for class_instance in classes:
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from education.models import Transcript
+
+
+class Command(BaseCommand):
+    help = 'Split lecture transcripts into embedded passages for chat retrieval.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--class', dest='class_slug', help='Only index the transcripts of the class with this slug.')
+        parser.add_argument('--force', action='store_true', help='Re-embed the passages even if the transcript did not change.')
+
+    def handle(self, *args, **options):
+        transcripts = Transcript.objects.filter(source='Lecture').exclude(content__isnull=True).exclude(content='')
+        if options['class_slug']:
+            transcripts = transcripts.filter(related_lesson__related_class__slug=options['class_slug'])
+        self.stdout.write(self.style.SUCCESS('Indexing lecture transcripts...'))
+        embedded = 0
+        for transcript in transcripts.iterator():
+            try:
+                embedded += transcript.index_passages(force=options['force'])
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f'Error indexing {transcript}: {e}'))
+        self.stdout.write(self.style.SUCCESS(f'{embedded} transcript passages embedded.'))
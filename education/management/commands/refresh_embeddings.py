@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from education.models import Lesson, LessonEmbedding
+
+
+class Command(BaseCommand):
+    help = 'Re-embed lessons whose lecture summary or embedding model changed since they were embedded.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--class', dest='class_slug', help='Only refresh the lessons of the class with this slug.')
+        parser.add_argument('--force', action='store_true', help='Re-embed every lesson with a summarized lecture transcript.')
+
+    def handle(self, *args, **options):
+        lessons = Lesson.objects.all()
+        if options['class_slug']:
+            lessons = lessons.filter(related_class__slug=options['class_slug'])
+        self.stdout.write(self.style.SUCCESS('Refreshing lesson embeddings...'))
+        embedded = LessonEmbedding.refresh_embeddings(lessons, force=options['force'])
+        self.stdout.write(self.style.SUCCESS(f'{embedded} lesson embeddings refreshed.'))
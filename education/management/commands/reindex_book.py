@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.text import slugify
+from education.models import Book
+from education.utils import upload_book_to_index
+from education.vector_store import get_vector_store
+
+
+class Command(BaseCommand):
+    help = 'Re-index books in the vector store, embedding only chunks that changed since their last upload.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('slugs', nargs='*', help='Slugs of the books to re-index, every book with a PDF if omitted.')
+        parser.add_argument('--full', action='store_true', help='Re-embed every chunk instead of diffing against the last upload.')
+        parser.add_argument('--reset', action='store_true', help='Delete the book namespace first, for books uploaded before content-hash chunk ids.')
+
+    def handle(self, *args, **options):
+        books = Book.objects.exclude(pdf='')
+        if options['slugs']:
+            books = books.filter(slug__in=options['slugs'])
+            missing = set(options['slugs']) - set(books.values_list('slug', flat=True))
+            if missing:
+                raise CommandError(f'No book with slug: {", ".join(sorted(missing))}')
+
+        for book in books:
+            namespace = (book.slug or slugify(book.title)).lower()
+            self.stdout.write(f'Re-indexing {book.title} ({namespace})...')
+            if options['reset']:
+                get_vector_store().delete_namespace(namespace)
+            try:
+                upload_book_to_index(book.pdf.path, namespace, full=options['full'] or options['reset'])
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f'Failed to re-index {book.title}: {e}'))
+                continue
+            Book.objects.filter(id=book.id).update(embedded=True)
+        self.stdout.write(self.style.SUCCESS('Re-indexing finished.'))
@@ -0,0 +1,39 @@
+import threading
+
+from django.core.management.base import BaseCommand
+from education.completion_cache import completion_cache
+from education.jobs import work
+
+
+class Command(BaseCommand):
+    help = 'Run background workers that process queued lesson jobs (summaries, analysis, embeddings and concepts).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=1, help='Worker threads in this process, run more processes to scale further.')
+        parser.add_argument('--once', action='store_true', help='Exit once the queue is empty instead of polling for new jobs.')
+        parser.add_argument('--poll-interval', type=float, help='Seconds between polls of an empty queue, settings.JOB_QUEUE["POLL_INTERVAL"] by default.')
+        parser.add_argument('--no-cache', action='store_true', help='Send every prompt to the API instead of replaying cached completions.')
+
+    def handle(self, *args, **options):
+        if not options['no_cache']:
+            completion_cache.enable()
+        stop = threading.Event()
+        counts = []
+
+        def run():
+            counts.append(work(stop=stop, once=options['once'], poll_interval=options['poll_interval']))
+
+        threads = [threading.Thread(target=run, name=f'lesson-worker-{i}') for i in range(options['workers'])]
+        self.stdout.write(self.style.SUCCESS(f'Starting {len(threads)} lesson workers...'))
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(timeout=1)
+        except KeyboardInterrupt:
+            self.stdout.write('Stopping after the current jobs...')
+            stop.set()
+            for thread in threads:
+                thread.join()
+        self.stdout.write(self.style.SUCCESS(f'{sum(counts)} lesson jobs processed.'))
@@ -3,12 +3,18 @@ from django.core.management.base import BaseCommand
 from django.utils.text import slugify
 from education.models import Lesson  # Update with your actual app name
 from education.utils import interact_with_gpt
+from education.completion_cache import completion_cache
 from tqdm import tqdm
 
 class Command(BaseCommand):
     help = 'Update lesson titles and slugs based on the summarized lecture transcript'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--no-cache', action='store_true', help='Send every prompt to the API instead of replaying cached completions.')
+
     def handle(self, *args, **options):
+        if not options['no_cache']:
+            completion_cache.enable()
         lessons = Lesson.objects.all()
         total_lessons = lessons.count()
         
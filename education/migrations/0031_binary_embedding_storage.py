@@ -0,0 +1,87 @@
+import json
+
+import numpy as np
+from django.db import migrations, models
+
+
+def _to_bytes(vector):
+    if isinstance(vector, str):
+        vector = json.loads(vector)
+    if not vector:
+        return None, None
+    return np.asarray(vector, dtype='<f4').tobytes(), len(vector)
+
+
+def json_to_binary(apps, schema_editor):
+    LessonEmbedding = apps.get_model('education', 'LessonEmbedding')
+    Concept = apps.get_model('education', 'Concept')
+
+    for embedding in LessonEmbedding.objects.exclude(vector__isnull=True).iterator():
+        embedding.vector_data, embedding.dimensions = _to_bytes(embedding.vector)
+        embedding.save(update_fields=['vector_data', 'dimensions'])
+
+    for concept in Concept.objects.exclude(embedding__isnull=True).iterator():
+        concept.embedding_data, concept.embedding_dimensions = _to_bytes(concept.embedding)
+        concept.save(update_fields=['embedding_data', 'embedding_dimensions'])
+
+
+def binary_to_json(apps, schema_editor):
+    LessonEmbedding = apps.get_model('education', 'LessonEmbedding')
+    Concept = apps.get_model('education', 'Concept')
+
+    for embedding in LessonEmbedding.objects.exclude(vector_data__isnull=True).iterator():
+        embedding.vector = np.frombuffer(embedding.vector_data, dtype='<f4').tolist()
+        embedding.save(update_fields=['vector'])
+
+    for concept in Concept.objects.exclude(embedding_data__isnull=True).iterator():
+        concept.embedding = np.frombuffer(concept.embedding_data, dtype='<f4').tolist()
+        concept.save(update_fields=['embedding'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('education', '0030_classbook'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lessonembedding',
+            name='vector_data',
+            field=models.BinaryField(blank=True, help_text='Raw little-endian float32 bytes of the embedding.', null=True),
+        ),
+        migrations.AddField(
+            model_name='lessonembedding',
+            name='dimensions',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='lessonembedding',
+            name='embedding_model',
+            field=models.CharField(default='text-embedding-3-large', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='concept',
+            name='embedding_data',
+            field=models.BinaryField(blank=True, help_text='Raw little-endian float32 bytes of the embedding.', null=True),
+        ),
+        migrations.AddField(
+            model_name='concept',
+            name='embedding_dimensions',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='concept',
+            name='embedding_model',
+            field=models.CharField(default='text-embedding-3-large', max_length=100),
+        ),
+        migrations.RunPython(json_to_binary, binary_to_json),
+        migrations.RemoveField(
+            model_name='lessonembedding',
+            name='vector',
+        ),
+        migrations.RemoveField(
+            model_name='concept',
+            name='embedding',
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.8 on 2026-10-18 08:07
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('education', '0031_binary_embedding_storage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CachedEmbedding',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=100)),
+                ('text_hash', models.CharField(help_text='sha256 of the normalized input text.', max_length=64)),
+                ('vector_data', models.BinaryField(help_text='Raw little-endian float32 bytes of the embedding.')),
+                ('dimensions', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+            options={
+                'unique_together': {('model', 'text_hash')},
+            },
+        ),
+    ]
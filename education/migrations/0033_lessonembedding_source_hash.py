@@ -0,0 +1,18 @@
+# Generated by Django 4.2.8 on 2026-10-18 08:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('education', '0032_cachedembedding'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lessonembedding',
+            name='source_hash',
+            field=models.CharField(blank=True, help_text='sha256 of the normalized lecture summary the vector was computed from.', max_length=64, null=True),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.8 on 2026-10-18 08:23
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('education', '0033_lessonembedding_source_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TranscriptPassage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField()),
+                ('text', models.TextField()),
+                ('token_count', models.PositiveIntegerField(default=0)),
+                ('vector_data', models.BinaryField(blank=True, help_text='Raw little-endian float32 bytes of the embedding.', null=True)),
+                ('dimensions', models.PositiveIntegerField(blank=True, null=True)),
+                ('embedding_model', models.CharField(default='text-embedding-3-large', max_length=100)),
+                ('source_hash', models.CharField(help_text='sha256 of the normalized transcript content the passage was cut from.', max_length=64)),
+                ('lesson', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='passages', to='education.lesson')),
+                ('transcript', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='passages', to='education.transcript')),
+            ],
+            options={
+                'ordering': ['transcript', 'position'],
+                'unique_together': {('transcript', 'position')},
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.8 on 2026-10-18 08:25
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('education', '0034_transcriptpassage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedLesson',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('lesson', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_links', to='education.lesson')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='education.lesson')),
+            ],
+            options={
+                'ordering': ['lesson', '-score'],
+                'indexes': [models.Index(fields=['lesson', '-score'], name='related_lesson_score_idx')],
+                'unique_together': {('lesson', 'related')},
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.8 on 2026-10-18 08:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('education', '0035_relatedlesson'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='concept',
+            name='merged_lessons',
+            field=models.ManyToManyField(blank=True, help_text='Other lessons whose duplicate of this concept was merged into it.', related_name='merged_concepts', to='education.lesson'),
+        ),
+        migrations.AddField(
+            model_name='concept',
+            name='normalized_hash',
+            field=models.CharField(blank=True, db_index=True, help_text='sha256 of the normalized LaTeX description, see education.concept_dedupe.', max_length=64, null=True),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.8 on 2026-10-18 08:27
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('education', '0036_concept_dedupe'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookSection',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField()),
+                ('title', models.CharField(max_length=255)),
+                ('page', models.IntegerField(blank=True, null=True)),
+                ('vector_data', models.BinaryField(blank=True, help_text='Raw little-endian float32 bytes of the embedding.', null=True)),
+                ('dimensions', models.PositiveIntegerField(blank=True, null=True)),
+                ('embedding_model', models.CharField(default='text-embedding-3-large', max_length=100)),
+                ('source_hash', models.CharField(help_text='sha256 of the table of contents entries the section was built from.', max_length=64)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sections', to='education.book')),
+            ],
+            options={
+                'ordering': ['book', 'position'],
+                'unique_together': {('book', 'position')},
+            },
+        ),
+    ]
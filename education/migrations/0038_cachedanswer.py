@@ -0,0 +1,35 @@
+# Generated by Django 4.2.8 on 2026-10-18 08:29
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('education', '0037_booksection'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CachedAnswer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('super_search', models.BooleanField(default=False)),
+                ('question', models.TextField()),
+                ('vector_data', models.BinaryField(blank=True, help_text='Raw little-endian float32 bytes of the question embedding.', null=True)),
+                ('dimensions', models.PositiveIntegerField(blank=True, null=True)),
+                ('embedding_model', models.CharField(default='text-embedding-3-large', max_length=100)),
+                ('answer', models.TextField()),
+                ('sources', models.JSONField(blank=True, default=dict, help_text='Ids of the lessons suggested with the answer.')),
+                ('hits', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_hit_at', models.DateTimeField(blank=True, null=True)),
+                ('lesson', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='cached_answers', to='education.lesson')),
+                ('related_class', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='cached_answers', to='education.class')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['lesson', 'related_class', 'super_search'], name='cached_answer_scope_idx')],
+            },
+        ),
+    ]
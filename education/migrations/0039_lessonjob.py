@@ -0,0 +1,35 @@
+# Generated by Django 4.2.8 on 2026-10-18 08:32
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('education', '0038_cachedanswer'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LessonJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stage', models.CharField(choices=[('summarize', 'Summarize'), ('analyze', 'Analyze'), ('embed', 'Embed'), ('concepts', 'Concepts')], default='summarize', max_length=20)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], db_index=True, default='pending', max_length=10)),
+                ('attempts', models.PositiveIntegerField(default=0, help_text='Failed attempts at the current stage.')),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now, help_text='The job is not claimed before this time, used to back off retries.')),
+                ('leased_by', models.CharField(blank=True, max_length=100, null=True)),
+                ('lease_expires_at', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('lesson', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='jobs', to='education.lesson')),
+            ],
+            options={
+                'ordering': ['created_at'],
+                'indexes': [models.Index(fields=['status', 'run_after'], name='lesson_job_claim_idx')],
+            },
+        ),
+    ]
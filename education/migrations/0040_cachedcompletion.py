@@ -0,0 +1,27 @@
+# Generated by Django 4.2.8 on 2026-10-18 08:34
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('education', '0039_lessonjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CachedCompletion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(help_text='sha256 of the model, messages, response_format and tools of the request.', max_length=64, unique=True)),
+                ('model', models.CharField(max_length=100)),
+                ('call_site', models.CharField(db_index=True, max_length=100)),
+                ('response', models.JSONField(help_text='The assistant message returned for the request.')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+                ('last_used_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.8 on 2026-10-18 08:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('education', '0041_indexversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='indexversion',
+            name='scope',
+            field=models.CharField(default='*', help_text="repr of the scope, '*' for the whole registry.", max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='indexversion',
+            name='name',
+            field=models.CharField(max_length=50),
+        ),
+        migrations.AlterUniqueTogether(
+            name='indexversion',
+            unique_together={('name', 'scope')},
+        ),
+    ]
@@ -1,15 +1,25 @@
+import concurrent.futures
+import datetime
 import os
 import re
 from typing import List
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, Exists, Min, OuterRef, Q, Subquery
+from django.utils import timezone
 from django.utils.text import slugify
 from PyPDF2 import PdfReader
 import pdfplumber
 from tqdm import tqdm
-from .utils import extract_toc_text, extract_toc_until_page, find_first_toc_page, parse_toc, upload_book_to_index,generate_chat_completion, generate_embedding, cosine_similarity
+from .utils import extract_the_most_likely_title, extract_toc_text, extract_toc_until_page, find_first_toc_page, parse_index_contents, parse_toc, upload_book_to_index,generate_chat_completion, generate_structured_completion, generate_embedding, generate_embeddings, count_embedding_tokens, split_passages, vector_from_bytes, vector_to_bytes, MODELS
+from .embedding_cache import text_hash
+from .jobs import job_queue_settings
+from .concept_dedupe import concept_dedupe_settings, concept_key
+from .vector_index import answer_indexes, best_lesson_per_class, get_class_lesson_index, invalidate_book_section_index, invalidate_lesson_passage_index, knn_graph, lesson_graph_settings, lesson_similarities, match_concepts, matrix_from_rows, top_k_columns, search_book_sections, search_lesson_passages, remove_concept_vector, remove_lesson_vector, update_concept_vector, update_lesson_vector
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 
 
 # Enum choices for later use
@@ -43,7 +53,29 @@ class LessonEmbedding(models.Model):
     lesson = models.OneToOneField('Lesson', on_delete=models.CASCADE, related_name='embedding')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
-    vector = models.JSONField(null = True, blank = True)
+    vector_data = models.BinaryField(null=True, blank=True, help_text="Raw little-endian float32 bytes of the embedding.")
+    dimensions = models.PositiveIntegerField(null=True, blank=True)
+    embedding_model = models.CharField(max_length=100, default=MODELS['text-embedding'])
+    source_hash = models.CharField(max_length=64, null=True, blank=True, help_text="sha256 of the normalized lecture summary the vector was computed from.")
+
+    @property
+    def vector(self):
+        """The embedding as a read-only float32 NumPy array, or None if the lesson is not embedded yet."""
+        return vector_from_bytes(self.vector_data)
+
+    @vector.setter
+    def vector(self, value):
+        if value is None:
+            self.vector_data = None
+            self.dimensions = None
+        else:
+            self.vector_data = vector_to_bytes(value)
+            self.dimensions = len(value)
+
+    @staticmethod
+    def is_stale(source_hash, embedding_model, summary):
+        """True if a vector computed from source_hash with embedding_model no longer matches the summary and current model."""
+        return source_hash != text_hash(summary) or embedding_model != MODELS['text-embedding']
 
     def update_embedding(self):
         """Generates or updates the embedding for the lesson's lecture transcript."""
@@ -51,11 +83,188 @@ class LessonEmbedding(models.Model):
         if lecture_transcript:
             if not lecture_transcript.summarized:
                 lecture_transcript.summarize()
-            self.vector = generate_embedding(lecture_transcript.summarized)
+            self.embedding_model = MODELS['text-embedding']
+            self.vector = generate_embedding(lecture_transcript.summarized, model=self.embedding_model)
+            self.source_hash = text_hash(lecture_transcript.summarized)
             # print(f"Updated embedding for {self.lesson.title}")
             # print(self.vector)
             self.save()
-    
+
+    @classmethod
+    def refresh_embeddings(cls, lessons=None, force=False):
+        """
+        Re-embeds the lessons whose lecture summary or embedding model changed, with batched requests.
+        Lessons whose first lecture transcript is not summarized yet are skipped.
+        Returns how many lessons were embedded.
+        """
+        lessons = Lesson.objects.all() if lessons is None else lessons
+        first_lectures = dict(
+            Transcript.objects.filter(related_lesson__in=lessons, source='Lecture')
+            .order_by('-id').values_list('related_lesson_id', 'summarized')
+        )  # Ordered so the first lecture transcript of a lesson wins, as in update_embedding
+        summaries = {lesson_id: summary for lesson_id, summary in first_lectures.items() if summary}
+        existing = {e.lesson_id: e for e in cls.objects.filter(lesson_id__in=summaries).defer('vector_data')}
+        stale = [
+            lesson_id for lesson_id, summary in summaries.items()
+            if force or lesson_id not in existing or cls.is_stale(existing[lesson_id].source_hash, existing[lesson_id].embedding_model, summary)
+        ]
+        if not stale:
+            return 0
+
+        model = MODELS['text-embedding']
+        vectors = generate_embeddings([summaries[lesson_id] for lesson_id in stale], model=model)
+        to_create, to_update = [], []
+        for lesson_id, vector in zip(stale, vectors):
+            embedding = existing.get(lesson_id) or cls(lesson_id=lesson_id)
+            embedding.vector = vector
+            embedding.embedding_model = model
+            embedding.source_hash = text_hash(summaries[lesson_id])
+            embedding.updated_at = timezone.now()
+            (to_update if embedding.pk else to_create).append(embedding)
+        cls.objects.bulk_create(to_create, batch_size=500)
+        cls.objects.bulk_update(to_update, ['vector_data', 'dimensions', 'embedding_model', 'source_hash', 'updated_at'], batch_size=500)
+
+        class_ids = dict(Lesson.objects.filter(id__in=stale).values_list('id', 'related_class_id'))
+        for embedding in to_create + to_update:  # bulk writes do not send post_save
+            update_lesson_vector(embedding.lesson_id, class_ids.get(embedding.lesson_id), embedding.vector)
+        if lesson_graph_settings()['INCREMENTAL']:
+            for embedding in to_create + to_update:
+                RelatedLesson.update_lesson(embedding.lesson_id, embedding.vector)
+        return len(stale)
+
+
+class RelatedLesson(models.Model):
+    """An edge of the precomputed lesson similarity graph: one of the lessons closest to `lesson`, from any class."""
+    lesson = models.ForeignKey('Lesson', related_name='related_links', on_delete=models.CASCADE)
+    related = models.ForeignKey('Lesson', related_name='+', on_delete=models.CASCADE)
+    score = models.FloatField()
+
+    class Meta:
+        ordering = ['lesson', '-score']
+        unique_together = ('lesson', 'related')
+        indexes = [models.Index(fields=['lesson', '-score'], name='related_lesson_score_idx')]
+
+    def __str__(self):
+        return f"{self.lesson_id} -> {self.related_id} ({self.score:.3f})"
+
+    @classmethod
+    def rebuild_graph(cls, neighbors=None):
+        """
+        Recomputes the whole graph from the stored lesson embeddings with one blocked matrix multiply and
+        replaces the table in a transaction. Returns how many edges were written.
+        """
+        config = lesson_graph_settings()
+        neighbors = neighbors or config['NEIGHBORS']
+        ids, matrix = matrix_from_rows(LessonEmbedding.objects.filter(vector_data__isnull=False).values_list('lesson_id', 'vector_data'), 'lesson')
+        links = []
+        if ids:
+            related_ids, scores = knn_graph(ids, matrix, k=neighbors, block_rows=config['BLOCK_ROWS'])
+            for lesson_id, row_ids, row_scores in zip(ids, related_ids.tolist(), scores.tolist()):
+                links.extend(cls(lesson_id=lesson_id, related_id=related_id, score=score) for related_id, score in zip(row_ids, row_scores))
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create(links, batch_size=1000)
+        return len(links)
+
+    @classmethod
+    def update_lesson(cls, lesson_id, vector, neighbors=None):
+        """
+        Incrementally updates the graph for a new or re-embedded lesson: its own edges are replaced by its closest
+        lessons, and it is added to the edges of the lessons it is now closer to than their weakest neighbor.
+        Lessons that lose their edge to a re-embedded lesson keep one neighbor less until the next rebuild_graph.
+        """
+        neighbors = neighbors or lesson_graph_settings()['NEIGHBORS']
+        with transaction.atomic():
+            cls.objects.filter(Q(lesson_id=lesson_id) | Q(related_id=lesson_id)).delete()
+            if vector is None or not len(vector):
+                return
+            ids, scores = lesson_similarities(lesson_id, vector)
+            if not len(ids):
+                return
+            order = top_k_columns(scores.reshape(1, -1), neighbors)[0]
+            links = [cls(lesson_id=lesson_id, related_id=int(ids[j]), score=float(scores[j])) for j in order]
+
+            current = {
+                row['lesson_id']: (row['edges'], row['weakest'])
+                for row in cls.objects.filter(lesson_id__in=ids.tolist()).values('lesson_id').annotate(edges=Count('id'), weakest=Min('score'))
+            }
+            full = []
+            for other_id, score in zip(ids.tolist(), scores.tolist()):
+                edges, weakest = current.get(other_id, (0, None))
+                if edges < neighbors:
+                    links.append(cls(lesson_id=other_id, related_id=lesson_id, score=score))
+                elif score > weakest:
+                    links.append(cls(lesson_id=other_id, related_id=lesson_id, score=score))
+                    full.append(other_id)
+            cls.objects.bulk_create(links, batch_size=1000)
+
+            # Lessons that were already full drop their weakest edge to make room
+            weakest_edges = {}
+            for edge_id, other_id, score in cls.objects.filter(lesson_id__in=full).exclude(related_id=lesson_id).values_list('id', 'lesson_id', 'score'):
+                if other_id not in weakest_edges or score < weakest_edges[other_id][1]:
+                    weakest_edges[other_id] = (edge_id, score)
+            cls.objects.filter(id__in=[edge_id for edge_id, _ in weakest_edges.values()]).delete()
+
+
+@receiver(post_save, sender=LessonEmbedding)
+def sync_lesson_index_on_save(sender, instance, **kwargs):
+    """Pushes the saved vector into the cached lesson index of its class and into the lesson similarity graph."""
+    class_id = Lesson.objects.filter(id=instance.lesson_id).values_list('related_class_id', flat=True).first()
+    update_lesson_vector(instance.lesson_id, class_id, instance.vector)
+    if lesson_graph_settings()['INCREMENTAL']:
+        try:
+            RelatedLesson.update_lesson(instance.lesson_id, instance.vector)
+        except Exception as e:
+            print(f"Error updating the lesson similarity graph: {e}")
+
+
+@receiver(post_delete, sender=LessonEmbedding)
+def sync_lesson_index_on_delete(sender, instance, **kwargs):
+    """Drops the deleted vector from the cached lesson indexes and its edges from the lesson similarity graph."""
+    class_id = Lesson.objects.filter(id=instance.lesson_id).values_list('related_class_id', flat=True).first()
+    remove_lesson_vector(instance.lesson_id, class_id)
+    RelatedLesson.objects.filter(Q(lesson_id=instance.lesson_id) | Q(related_id=instance.lesson_id)).delete()
+
+class CachedEmbedding(models.Model):
+    """Persistent tier of the embedding cache, see education.embedding_cache."""
+    model = models.CharField(max_length=100)
+    text_hash = models.CharField(max_length=64, help_text="sha256 of the normalized input text.")
+    vector_data = models.BinaryField(help_text="Raw little-endian float32 bytes of the embedding.")
+    dimensions = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        unique_together = ('model', 'text_hash')
+
+    def __str__(self):
+        return f"{self.model}:{self.text_hash[:12]}"
+
+class IndexVersion(models.Model):
+    """Change counter of one scope of a named in-memory vector index registry, lets other processes notice the changes, see education.vector_index.IndexRegistry."""
+    name = models.CharField(max_length=50)
+    scope = models.CharField(max_length=100, default='*', help_text="repr of the scope, '*' for the whole registry.")
+    version = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('name', 'scope')
+
+    def __str__(self):
+        return f"{self.name}[{self.scope}] v{self.version}"
+
+class CachedCompletion(models.Model):
+    """Exact prompt/response cache of chat completions, see education.completion_cache."""
+    key = models.CharField(max_length=64, unique=True, help_text="sha256 of the model, messages, response_format and tools of the request.")
+    model = models.CharField(max_length=100)
+    call_site = models.CharField(max_length=100, db_index=True)
+    response = models.JSONField(help_text="The assistant message returned for the request.")
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+    last_used_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"{self.call_site}:{self.key[:12]}"
+
 class Class(models.Model):
     name = models.CharField(max_length=255)
     subject = models.CharField(max_length=255)
@@ -69,21 +278,18 @@ class Class(models.Model):
         self.slug = slugify(self.name)  # Slugify the name
         super().save(*args, **kwargs)
     
-    def find_most_similar_lesson(self, query_text:str):
-        """Returns the most similar lesson within this class based on embeddings."""
-        query_vector = generate_embedding(query_text)
-        highest_similarity = -1
-        most_similar_lesson = None
-
-        for lesson in self.lessons.all():
-            if hasattr(lesson, 'embedding'):
-                lesson_vector = lesson.embedding.vector
-                similarity = cosine_similarity(query_vector, lesson_vector)
-                if similarity > highest_similarity:
-                    highest_similarity = similarity
-                    most_similar_lesson = lesson
-
-        return most_similar_lesson
+    def find_most_similar_lesson(self, query_text:str, query_vector=None):
+        """Returns the most similar lesson within this class based on embeddings, query_vector skips embedding the text."""
+        index = get_class_lesson_index(self.id)
+        if not len(index):
+            return None
+        if query_vector is None:
+            query_vector = generate_embedding(query_text)
+        matches = index.search(query_vector, top_k=1)
+        if not matches:
+            return None
+        lesson_id, _ = matches[0]
+        return self.lessons.filter(id=lesson_id).first()
 
 
 class Schedule(models.Model):
@@ -158,12 +364,17 @@ class Book(models.Model):
                 self.page_count = 0
 
     def embed_and_upload(self):
-        """Embed the book text and upload the embeddings to Pinecone."""
+        """Embed the book text and upload the embeddings to the vector store.
+        A failed upload leaves the book unembedded, and the next save resumes it from the last acknowledged batch."""
         if not self.embedded:
             pdf_path = self.pdf.path  # Adjust based on your actual storage settings
             book_name_slug = self.slug or slugify(self.title)
             # input(f'DEBUG: Uploading book to index this is the path {pdf_path}')
-            upload_book_to_index(pdf_path, book_name_slug)
+            try:
+                upload_book_to_index(pdf_path, book_name_slug)
+            except Exception as e:
+                print(f"Error uploading book {book_name_slug} to the vector store: {e}")
+                return
             self.embedded = True
             self.save()
 
@@ -184,10 +395,79 @@ class Book(models.Model):
         self.embed_and_upload()
         
         super().save(*args, **kwargs)
+        try:
+            self.embed_sections()
+        except Exception as e:
+            print(f"Error embedding the table of contents of {self}: {e}")
+
+    def embed_sections(self, force=False):
+        """
+        Embeds the table of contents entries of the book as BookSection rows, in one batch, so lessons can be
+        matched to a chapter locally. Does nothing when the sections were built from the current index_contents.
+        Returns how many sections were embedded.
+        """
+        entries = parse_index_contents(self.index_contents)
+        source_hash = text_hash(repr(entries))
+        if not entries or (not force and self.sections.filter(source_hash=source_hash).exists()):
+            return 0
+        model = MODELS['text-embedding']
+        vectors = generate_embeddings([title for title, _ in entries], model=model)
+        sections = []
+        for position, ((title, page), vector) in enumerate(zip(entries, vectors)):
+            section = BookSection(book=self, position=position, title=title[:255], page=page, embedding_model=model, source_hash=source_hash)
+            section.vector = vector
+            sections.append(section)
+        with transaction.atomic():
+            self.sections.all().delete()
+            BookSection.objects.bulk_create(sections, batch_size=500)
+        invalidate_book_section_index(self.id)
+        return len(sections)
 
     def __str__(self):
         return self.title if self.title else "Unnamed Book"
 
+
+class BookSection(models.Model):
+    """A table of contents entry of a book with the embedding of its title, used to place lessons in the book."""
+    book = models.ForeignKey(Book, related_name='sections', on_delete=models.CASCADE)
+    position = models.PositiveIntegerField()
+    title = models.CharField(max_length=255)
+    page = models.IntegerField(null=True, blank=True)
+    vector_data = models.BinaryField(null=True, blank=True, help_text="Raw little-endian float32 bytes of the embedding.")
+    dimensions = models.PositiveIntegerField(null=True, blank=True)
+    embedding_model = models.CharField(max_length=100, default=MODELS['text-embedding'])
+    source_hash = models.CharField(max_length=64, help_text="sha256 of the table of contents entries the section was built from.")
+
+    class Meta:
+        ordering = ['book', 'position']
+        unique_together = ('book', 'position')
+
+    @property
+    def vector(self):
+        return vector_from_bytes(self.vector_data)
+
+    @vector.setter
+    def vector(self, value):
+        if value is None:
+            self.vector_data = None
+            self.dimensions = None
+        else:
+            self.vector_data = vector_to_bytes(value)
+            self.dimensions = len(value)
+
+    def __str__(self):
+        return f"{self.book} - {self.title} (p. {self.page})"
+
+def lesson_analysis_settings():
+    """Returns settings.LESSON_ANALYSIS with defaults filled in."""
+    config = {
+        'MODE': 'per_field',
+        'WORKERS': 4,
+    }
+    config.update(getattr(settings, 'LESSON_ANALYSIS', {}))
+    return config
+
+
 class Lesson(models.Model):
     title = models.CharField(max_length=255, null=True, blank=True)
     related_class = models.ForeignKey(Class, related_name='lessons', on_delete=models.CASCADE)
@@ -215,8 +495,52 @@ class Lesson(models.Model):
                 lecture_transcript.summarize()
             return lecture_transcript.summarized
         return "no summary available"
+    ANALYSIS_PROMPTS = {
+        "interdisciplinary_connections": ("Examine the following transcript for connections to other disciplines or fields of study:\nTranscript: {lecture}", ['lecture']),
+        "real_world_applications": ("Identify and describe real-world applications or examples of concepts discussed in the following transcript summary:\nTranscript: {lecture}", ['lecture']),
+        "creative_synthesis_of_ideas": ("Encourage a creative synthesis of the ideas discussed in the following transcript:\nTranscript: {lecture}", ['lecture']),
+        "detail_level_comparison": ("Compare the level of detail between the lecture's content and the student's summary. Please be logical and thorough in your comparison.\nStudent's Transcript: {student}\nLecture's Transcript: {lecture}", ['student', 'lecture']),
+        "accuracy_of_information": ("Evaluate the accuracy of the information in the student's summary compared to the lecture's transcript.\nStudent's Transcript: {student}\nLecture's Transcript: {lecture}", ['student', 'lecture']),
+        "direct_concept_comparison": ("Directly compare the concepts and topics covered in the lecture transcript with those mentioned in the student's summary.\nStudent's Transcript: {student}\nLecture's Transcript: {lecture}", ['student', 'lecture']),
+        "strengths_in_students_understanding": ("Analyze the student's summary to identify strengths in their understanding given the lecture.\nStudent's Summary: {student}", ['student']),
+        "understanding_gaps": ("Based on the lecture transcript and the student's summary, identify any themes the student may have misunderstood or is not applying correctly or missing completely.\nStudent's Transcript: {student}\nLecture's Transcript: {lecture}", ['student', 'lecture']),
+        "comparison_of_key_concepts": ("Identify and compare key concepts mentioned in both the lecture transcript and the student's summary.\nStudent's Transcript: {student}\nLecture's Transcript: {lecture}", ['student', 'lecture']),
+    }
+
+    def generate_structured_analysis(self, fields, lecture_summary, student_summary):
+        """
+        Asks for several analysis fields in one JSON-schema-constrained completion, sending each summary once.
+        Returns {field: text} for the fields of the reply that are non-empty strings, the caller prompts the rest on their own.
+        """
+        schema = {
+            "type": "object",
+            "properties": {field: {"type": "string"} for field in fields},
+            "required": list(fields),
+            "additionalProperties": False,
+        }
+        instructions = "\n".join(f"- {field}: {self.ANALYSIS_PROMPTS[field][0].splitlines()[0]}" for field in fields)
+        prompt = (
+            "Analyze the lecture transcript summary and the student's summary below. Reply with a JSON object with one "
+            f"detailed answer per field:\n{instructions}\n"
+            f"Lecture's Transcript: {lecture_summary}\nStudent's Transcript: {student_summary}"
+        )
+        try:
+            reply = generate_structured_completion(prompt, schema, name="lesson_analysis", use_gpt4=False)
+        except Exception as e:
+            print(f"Error generating the structured analysis for lesson {self.title}: {e}")
+            return {}
+        return {field: reply[field].strip() for field in fields if isinstance(reply.get(field), str) and reply[field].strip()}
+
     def generate_analysis(self):
-        """Generates an analysis for the lesson if both student and lecture transcripts exist and are summarized."""
+        """
+        Generates an analysis for the lesson if both student and lecture transcripts exist and are summarized.
+
+        With settings.LESSON_ANALYSIS['MODE'] = 'structured' the missing fields are first requested together in
+        one structured completion, and only fields it left out or got wrong are prompted individually.
+        The individual prompts are independent, so they run concurrently on WORKERS threads. Each field is written
+        as soon as its completion arrives; fields whose prompt failed, after the retries of the shared OpenAI client,
+        leave the lesson unanalyzed, and the next run only asks for those.
+        """
         lecture_transcript = self.transcripts.filter(source='Lecture').first()
         student_transcript = self.transcripts.filter(source='Student').first()
 
@@ -228,42 +552,149 @@ class Lesson(models.Model):
                 student_transcript.summarize()
 
         if lecture_transcript and student_transcript and lecture_transcript.summarized and student_transcript.summarized:
-            prompts = {
-                "interdisciplinary_connections": ("Examine the following transcript for connections to other disciplines or fields of study:\nTranscript: {lecture}", ['lecture']),
-                "real_world_applications": ("Identify and describe real-world applications or examples of concepts discussed in the following transcript summary:\nTranscript: {lecture}", ['lecture']),
-                "creative_synthesis_of_ideas": ("Encourage a creative synthesis of the ideas discussed in the following transcript:\nTranscript: {lecture}", ['lecture']),
-                "detail_level_comparison": ("Compare the level of detail between the lecture's content and the student's summary. Please be logical and thorough in your comparison.\nStudent's Transcript: {student}\nLecture's Transcript: {lecture}", ['student', 'lecture']),
-                "accuracy_of_information": ("Evaluate the accuracy of the information in the student's summary compared to the lecture's transcript.\nStudent's Transcript: {student}\nLecture's Transcript: {lecture}", ['student', 'lecture']),
-                "direct_concept_comparison": ("Directly compare the concepts and topics covered in the lecture transcript with those mentioned in the student's summary.\nStudent's Transcript: {student}\nLecture's Transcript: {lecture}", ['student', 'lecture']),
-                "strengths_in_students_understanding": ("Analyze the student's summary to identify strengths in their understanding given the lecture.\nStudent's Summary: {student}", ['student']),
-                "understanding_gaps": ("Based on the lecture transcript and the student's summary, identify any themes the student may have misunderstood or is not applying correctly or missing completely.\nStudent's Transcript: {student}\nLecture's Transcript: {lecture}", ['student', 'lecture']),
-                "comparison_of_key_concepts": ("Identify and compare key concepts mentioned in both the lecture transcript and the student's summary.\nStudent's Transcript: {student}\nLecture's Transcript: {lecture}", ['student', 'lecture']),
-            }
-
-            for field, (prompt_template, required_transcripts) in tqdm(prompts.items(), desc="Generating Analysis for Lesson"):
-                prompt = prompt_template.format(
+            config = lesson_analysis_settings()
+            prompts = {}
+            for field, (prompt_template, required_transcripts) in self.ANALYSIS_PROMPTS.items():
+                if getattr(self, field):
+                    continue  # Written by an earlier, partially failed run
+                prompts[field] = prompt_template.format(
                     lecture=lecture_transcript.summarized if 'lecture' in required_transcripts else "",
                     student=student_transcript.summarized if 'student' in required_transcripts else ""
                 )
-                setattr(self, field, generate_chat_completion(prompt, use_gpt4=False))
-            
+
+            if config['MODE'] == 'structured' and len(prompts) > 1:
+                structured = self.generate_structured_analysis(list(prompts), lecture_transcript.summarized, student_transcript.summarized)
+                for field, value in structured.items():
+                    setattr(self, field, value)
+                    del prompts[field]
+                if structured and self.pk:
+                    Lesson.objects.filter(pk=self.pk).update(**structured)
+
+            def complete(prompt):
+                return generate_chat_completion(prompt, use_gpt4=False)
+
+            failed = []
+            with concurrent.futures.ThreadPoolExecutor(max_workers=config['WORKERS']) as executor:
+                futures = {executor.submit(complete, prompt): field for field, prompt in prompts.items()}
+                for future in tqdm(concurrent.futures.as_completed(futures), total=len(futures), desc="Generating Analysis for Lesson"):
+                    field = futures[future]
+                    try:
+                        value = future.result()
+                    except Exception as e:
+                        print(f"Error generating {field} for lesson {self.title}: {e}")
+                        failed.append(field)
+                        continue
+                    setattr(self, field, value)
+                    if self.pk:
+                        Lesson.objects.filter(pk=self.pk).update(**{field: value})
+
+            if failed:
+                return
             self.analyzed = True
-            self.save()
+            if self.pk:
+                Lesson.objects.filter(pk=self.pk).update(analyzed=True)
+
+    @classmethod
+    def most_similar_per_class(cls, query_text, query_vector=None):
+        """Returns the most similar lesson of every class, best first, embedding the query once and scoring all lessons in one pass."""
+        if query_vector is None:
+            query_vector = generate_embedding(query_text)
+        matches = best_lesson_per_class(query_vector)
+        lessons = cls.objects.select_related('related_class').in_bulk([lesson_id for _, lesson_id, _ in matches])
+        return [lessons[lesson_id] for _, lesson_id, _ in matches if lesson_id in lessons]
 
     def embed(self):
-        """Ensures this lesson has an up-to-date embedding."""
-        embedding, created = LessonEmbedding.objects.get_or_create(lesson=self, defaults={'lesson': self})
-        if created:
-            embedding.update_embedding()
+        """Ensures this lesson has an up-to-date embedding, reading its state in one query and embedding only when stale."""
+        lecture = Transcript.objects.filter(related_lesson=OuterRef('pk'), source='Lecture').order_by('id')
+        state = Lesson.objects.filter(id=self.id).annotate(
+            has_lecture=Exists(lecture),
+            lecture_summary=Subquery(lecture.values('summarized')[:1]),
+        ).values('has_lecture', 'lecture_summary', 'embedding__id', 'embedding__source_hash', 'embedding__embedding_model').first()
+        if not state or not state['has_lecture']:
+            return
+        if state['embedding__id'] and state['lecture_summary'] and not LessonEmbedding.is_stale(
+                state['embedding__source_hash'], state['embedding__embedding_model'], state['lecture_summary']):
+            return
+        embedding = LessonEmbedding.objects.filter(id=state['embedding__id']).first() or LessonEmbedding(lesson=self)
+        embedding.update_embedding()
+
+    def match_chapter(self, book, lecture_summary=None):
+        """
+        Finds the book section this lesson covers by cosine similarity between the lesson embedding and the
+        book's embedded table of contents. When the best section scores below MIN_SCORE, or is not MIN_MARGIN
+        ahead of the runner-up (settings.BOOK_SECTIONS), the chat model picks from the whole table of contents
+        instead. Returns (title, page), or (None, None) if nothing matched.
+        """
+        config = getattr(settings, 'BOOK_SECTIONS', {})
+        embedding = LessonEmbedding.objects.filter(lesson=self).first()
+        query_vector = embedding.vector if embedding is not None else None
+        lecture_summary = lecture_summary or self.get_lecture_summary()
+        if query_vector is None and lecture_summary:
+            query_vector = generate_embedding(lecture_summary)
+
+        if query_vector is not None:
+            matches = search_book_sections(book.id, query_vector, top_k=2)
+            if matches:
+                best_score = matches[0][1]
+                margin = best_score - matches[1][1] if len(matches) > 1 else best_score
+                if best_score >= config.get('MIN_SCORE', 0.3) and margin >= config.get('MIN_MARGIN', 0.02):
+                    section = BookSection.objects.get(id=matches[0][0])
+                    return section.title, section.page
+
+        if not config.get('LLM_FALLBACK', True) or not book.index_contents or not lecture_summary:
+            return None, None
+        match = extract_the_most_likely_title(book_index=book.index_contents, lesson_summary=lecture_summary)
+        if not match:
+            return None, None
+        title, page = match
+        try:
+            page = int(page)
+        except (TypeError, ValueError):
+            page = None
+        return title, page
+
+    def relevant_passages(self, query_text, query_vector=None, token_budget=None):
+        """
+        Returns the lecture transcript passages most similar to the query, best first, keeping as many as fit in
+        token_budget tokens (settings.TRANSCRIPT_PASSAGES['TOKEN_BUDGET'] by default).
+        """
+        config = getattr(settings, 'TRANSCRIPT_PASSAGES', {})
+        token_budget = token_budget or config.get('TOKEN_BUDGET', 1200)
+        if query_vector is None:
+            query_vector = generate_embedding(query_text)
+        matches = search_lesson_passages(self.id, query_vector, top_k=config.get('TOP_K', 8))
+        if not matches:
+            return []
+        passages = TranscriptPassage.objects.only('text', 'token_count').in_bulk([passage_id for passage_id, _ in matches])
+        selected, used = [], 0
+        for passage_id, _ in matches:
+            passage = passages.get(passage_id)
+            if passage is None or used + passage.token_count > token_budget:
+                continue
+            selected.append(passage.text)
+            used += passage.token_count
+        return selected
+
+    def related_lessons(self, limit=5):
+        """The closest lessons of any class from the precomputed similarity graph, one indexed query and no embedding call."""
+        return [link.related for link in self.related_links.select_related('related__related_class')[:limit]]
+
+    def get_relevant_context(self, query_text, query_vector=None):
+        """The best lecture passages for the query joined for a prompt, or the lecture summary if the lesson has no passages."""
+        passages = self.relevant_passages(query_text, query_vector=query_vector)
+        if not passages:
+            return self.get_lecture_summary()
+        return "\n...\n".join(passages)
 
     def __str__(self):
         return f"{self.title or 'Unnamed Lesson'} - {self.related_class.name}"
     
     def save(self, *args, **kwargs):
+        """Saves the lesson. Without the job queue an existing lesson is analyzed and embedded here, with it the LessonJob queued by process_lesson does that."""
         self.slug = slugify(self.title)
-        if not self.analyzed and self.id:
-            self.generate_analysis()
-        if self.id:
+        if self.id and not job_queue_settings()['ENABLED']:
+            if not self.analyzed:
+                self.generate_analysis()
             self.embed()
         super().save(*args, **kwargs)
 
@@ -286,26 +717,128 @@ class Concept(models.Model):
     description = models.TextField()
     notes = models.TextField(null=True, blank=True)
     approved = models.BooleanField(default=False)
-
-    embedding = models.JSONField(null=True, blank=True)
+    merged_lessons = models.ManyToManyField(Lesson, related_name='merged_concepts', blank=True, help_text="Other lessons whose duplicate of this concept was merged into it.")
+    normalized_hash = models.CharField(max_length=64, null=True, blank=True, db_index=True, help_text="sha256 of the normalized LaTeX description, see education.concept_dedupe.")
+
+    embedding_data = models.BinaryField(null=True, blank=True, help_text="Raw little-endian float32 bytes of the embedding.")
+    embedding_dimensions = models.PositiveIntegerField(null=True, blank=True)
+    embedding_model = models.CharField(max_length=100, default=MODELS['text-embedding'])
+
+    @property
+    def embedding(self):
+        """The embedding as a read-only float32 NumPy array, or None if the concept is not embedded yet."""
+        return vector_from_bytes(self.embedding_data)
+
+    @embedding.setter
+    def embedding(self, value):
+        if value is None:
+            self.embedding_data = None
+            self.embedding_dimensions = None
+        else:
+            self.embedding_data = vector_to_bytes(value)
+            self.embedding_dimensions = len(value)
 
     def embed(self, force_update=False):
         """Generates the embedding for the concept"""
-        if (self.description and not self.embedding) or (self.description and force_update):
+        if (self.description and self.embedding_data is None) or (self.description and force_update):
             try:
-                self.embedding = generate_embedding(self.description)
+                self.embedding = generate_embedding(self.description, model=self.embedding_model)
             except Exception as e:
                 raise ValidationError(f"Error generating embedding: {str(e)}")
 
+    @classmethod
+    def embed_many(cls, concepts, force_update=False):
+        """Embeds several concepts with batched requests and saves them in bulk, returns how many were embedded."""
+        to_embed = [c for c in concepts if c.description and (force_update or c.embedding_data is None)]
+        if not to_embed:
+            return 0
+        embeddings = generate_embeddings([c.description for c in to_embed], model=to_embed[0].embedding_model)
+        for concept, embedding in zip(to_embed, embeddings):
+            concept.embedding = embedding
+        cls.objects.bulk_update(to_embed, ['embedding_data', 'embedding_dimensions'], batch_size=500)
+        for concept in to_embed:  # bulk_update does not send post_save
+            update_concept_vector(concept.id, concept.related_class_id, concept.embedding)
+        return len(to_embed)
+
+    @classmethod
+    def for_lesson(cls, lesson):
+        """Concepts of a lesson, including the ones merged into a duplicate from another lesson."""
+        return cls.objects.filter(Q(related_lesson=lesson) | Q(merged_lessons=lesson)).distinct()
+
+    def merge(self, duplicates):
+        """
+        Merges duplicate concepts into this one: their lessons are kept in merged_lessons, notes are appended,
+        the concept stays approved if any of them was, and the duplicates are deleted.
+        """
+        duplicates = [d for d in duplicates if d.pk != self.pk]
+        if not duplicates:
+            return
+        with transaction.atomic():
+            lesson_ids = {d.related_lesson_id for d in duplicates}
+            lesson_ids.update(Concept.merged_lessons.through.objects.filter(concept_id__in=[d.pk for d in duplicates]).values_list('lesson_id', flat=True))
+            lesson_ids.discard(None)
+            lesson_ids.discard(self.related_lesson_id)
+            self.merged_lessons.add(*lesson_ids)
+            notes = [self.notes] + [d.notes for d in duplicates]
+            self.notes = "\n\n".join(dict.fromkeys(n.strip() for n in notes if n and n.strip())) or None
+            self.approved = self.approved or any(d.approved for d in duplicates)
+            Concept.objects.filter(pk=self.pk).update(notes=self.notes, approved=self.approved)
+            Concept.objects.filter(pk__in=[d.pk for d in duplicates]).delete()
+
+    @classmethod
+    def create_deduplicated(cls, **fields):
+        """
+        Creates a concept unless its class already has a duplicate of it, see settings.CONCEPT_DEDUPE.
+        An exact duplicate (same normalized LaTeX) is found by hash before anything is embedded, a near duplicate
+        by the cosine similarity of the new embedding. Returns (concept, created), the existing concept when it was a duplicate.
+        """
+        concept = cls(**fields)
+        config = concept_dedupe_settings()
+        if not config['ON_CREATE']:
+            concept.save()
+            return concept, True
+        class_id = None if config['SCOPE'] == 'global' else concept.related_class_id
+        candidates = cls.objects.filter(normalized_hash=concept_key(concept.description))
+        if class_id is not None:
+            candidates = candidates.filter(related_class_id=class_id)
+        existing = candidates.order_by('-approved', 'id').first()
+        if existing is None:
+            concept.save()
+            if concept.embedding_data is None:
+                return concept, True
+            for match_id, score in match_concepts([concept.embedding], class_id=class_id, top_k=2)[0]:
+                if match_id != concept.pk and score >= config['THRESHOLD']:
+                    existing = cls.objects.get(pk=match_id)
+                    break
+            else:
+                return concept, True
+        if concept.pk:
+            existing.merge([concept])
+        elif concept.related_lesson_id not in (None, existing.related_lesson_id):
+            existing.merged_lessons.add(concept.related_lesson_id)
+        return existing, False
+
     def __str__(self):
         return self.title
     
     def save(self, *args, **kwargs):
+        self.normalized_hash = concept_key(self.description)
         # Call embed to generate or update embedding before saving
-        if not self.embedding:
+        if self.embedding_data is None:
             self.embed()
         super().save(*args, **kwargs)
 
+@receiver(post_save, sender=Concept)
+def sync_concept_index_on_save(sender, instance, **kwargs):
+    """Pushes the saved embedding into the cached concept indexes."""
+    update_concept_vector(instance.id, instance.related_class_id, instance.embedding)
+
+
+@receiver(post_delete, sender=Concept)
+def sync_concept_index_on_delete(sender, instance, **kwargs):
+    """Drops the deleted concept from the cached concept indexes."""
+    remove_concept_vector(instance.id, instance.related_class_id)
+
 class Problem(models.Model):
     title = models.CharField(max_length=255, null=True, blank=True)
     description = models.TextField()
@@ -362,6 +895,71 @@ class Transcript(models.Model):
             self.summarized = generate_chat_completion(prompt, use_gpt4=True)
             self.save()
 
+    def index_passages(self, force=False):
+        """
+        Splits the transcript into overlapping passages and embeds them in batches for chat retrieval.
+        Does nothing when the passages were already built from the current content. Returns how many passages were embedded.
+        """
+        if not self.content:
+            return 0
+        content_hash = text_hash(self.content)
+        if not force and self.passages.filter(source_hash=content_hash).exists():
+            return 0
+        config = getattr(settings, 'TRANSCRIPT_PASSAGES', {})
+        texts = split_passages(self.content, words=config.get('WORDS', 200), overlap=config.get('OVERLAP', 50))
+        model = MODELS['text-embedding']
+        vectors = generate_embeddings(texts, model=model)
+        passages = []
+        for position, (text, vector) in enumerate(zip(texts, vectors)):
+            passage = TranscriptPassage(transcript=self, lesson_id=self.related_lesson_id, position=position, text=text,
+                                        token_count=count_embedding_tokens(text), embedding_model=model, source_hash=content_hash)
+            passage.vector = vector
+            passages.append(passage)
+        with transaction.atomic():
+            self.passages.all().delete()
+            TranscriptPassage.objects.bulk_create(passages, batch_size=500)
+        invalidate_lesson_passage_index(self.related_lesson_id)
+        return len(passages)
+
+
+class TranscriptPassage(models.Model):
+    """An overlapping window of a lecture transcript, embedded so chat can quote the exact part of the lecture."""
+    transcript = models.ForeignKey(Transcript, related_name='passages', on_delete=models.CASCADE)
+    lesson = models.ForeignKey(Lesson, related_name='passages', on_delete=models.CASCADE)
+    position = models.PositiveIntegerField()
+    text = models.TextField()
+    token_count = models.PositiveIntegerField(default=0)
+    vector_data = models.BinaryField(null=True, blank=True, help_text="Raw little-endian float32 bytes of the embedding.")
+    dimensions = models.PositiveIntegerField(null=True, blank=True)
+    embedding_model = models.CharField(max_length=100, default=MODELS['text-embedding'])
+    source_hash = models.CharField(max_length=64, help_text="sha256 of the normalized transcript content the passage was cut from.")
+
+    class Meta:
+        ordering = ['transcript', 'position']
+        unique_together = ('transcript', 'position')
+
+    @property
+    def vector(self):
+        return vector_from_bytes(self.vector_data)
+
+    @vector.setter
+    def vector(self, value):
+        if value is None:
+            self.vector_data = None
+            self.dimensions = None
+        else:
+            self.vector_data = vector_to_bytes(value)
+            self.dimensions = len(value)
+
+    def __str__(self):
+        return f"{self.transcript} #{self.position}"
+
+
+@receiver(post_delete, sender=TranscriptPassage)
+def sync_passage_index_on_delete(sender, instance, **kwargs):
+    """Drops the cached passage index of the lesson, deletes come in bulk when a transcript is re-indexed."""
+    invalidate_lesson_passage_index(instance.lesson_id)
+
 class Notes(models.Model):
     name= models.CharField(max_length=255, null=True, blank=True)
     file = models.FileField(upload_to='notes/')
@@ -518,6 +1116,59 @@ class ClassBook(models.Model):
 #         # Placeholder for tool execution method
 #         pass
 
+class LessonJob(models.Model):
+    """
+    Background processing of a lesson, run by the run_workers command (see education.jobs).
+
+    A job walks the lesson through STAGES in order and records the next stage to run, so a job picked up again
+    after a crash or a failed attempt resumes where it stopped. Workers claim jobs with a conditional update
+    that sets a lease, which lets several workers share the table without running a job twice.
+    """
+    STAGES = ['summarize', 'analyze', 'embed', 'concepts']
+    PENDING, RUNNING, DONE, FAILED = 'pending', 'running', 'done', 'failed'
+    STATUS_CHOICES = [(PENDING, 'Pending'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed')]
+
+    lesson = models.ForeignKey(Lesson, related_name='jobs', on_delete=models.CASCADE)
+    stage = models.CharField(max_length=20, choices=[(stage, stage.title()) for stage in STAGES], default=STAGES[0])
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING, db_index=True)
+    attempts = models.PositiveIntegerField(default=0, help_text="Failed attempts at the current stage.")
+    run_after = models.DateTimeField(default=timezone.now, help_text="The job is not claimed before this time, used to back off retries.")
+    leased_by = models.CharField(max_length=100, null=True, blank=True)
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [models.Index(fields=['status', 'run_after'], name='lesson_job_claim_idx')]
+
+    def __str__(self):
+        return f"{self.lesson} - {self.stage} ({self.status})"
+
+    @classmethod
+    def enqueue(cls, lesson):
+        """Queues the lesson for processing, reusing its pending job if it already has one."""
+        job = cls.objects.filter(lesson=lesson, status=cls.PENDING).first()
+        if job is not None:
+            if job.stage != cls.STAGES[0]:
+                # New material arrived since the job started its earlier stages, so it starts over
+                cls.objects.filter(pk=job.pk, status=cls.PENDING).update(stage=cls.STAGES[0], attempts=0, updated_at=timezone.now())
+            return job
+        return cls.objects.create(lesson=lesson)
+
+    def as_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'stage': self.stage,
+            'stages': self.STAGES,
+            'attempts': self.attempts,
+            'last_error': self.last_error,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+        }
+
+
 class ChatSession(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='education_chat_sessions', help_text="The user associated with this education chat session.")
     created_at = models.DateTimeField(auto_now_add=True)
@@ -526,6 +1177,132 @@ class ChatSession(models.Model):
         return f"Chat Session {self.id} - User {self.user.username}"
 
 
+def answer_cache_settings():
+    """Returns settings.ANSWER_CACHE with defaults filled in."""
+    config = {
+        'ENABLED': False,
+        'THRESHOLD': 0.95,
+        'TTL': 7 * 24 * 3600,
+        'MAX_ENTRIES_PER_SCOPE': 500,
+        'LOOKUP_CANDIDATES': 5,
+    }
+    config.update(getattr(settings, 'ANSWER_CACHE', {}))
+    return config
+
+
+class CachedAnswer(models.Model):
+    """
+    A first-turn chat answer about a lesson or a class, kept with the embedding of its question so that
+    near-identical questions in the same scope are answered without retrieval or a completion.
+    Entries expire after settings.ANSWER_CACHE['TTL'] seconds and are dropped when the lesson's transcripts change.
+    """
+    lesson = models.ForeignKey(Lesson, related_name='cached_answers', on_delete=models.CASCADE, null=True, blank=True)
+    related_class = models.ForeignKey(Class, related_name='cached_answers', on_delete=models.CASCADE, null=True, blank=True)
+    super_search = models.BooleanField(default=False)
+    question = models.TextField()
+    vector_data = models.BinaryField(null=True, blank=True, help_text="Raw little-endian float32 bytes of the question embedding.")
+    dimensions = models.PositiveIntegerField(null=True, blank=True)
+    embedding_model = models.CharField(max_length=100, default=MODELS['text-embedding'])
+    answer = models.TextField()
+    sources = models.JSONField(default=dict, blank=True, help_text="Ids of the lessons suggested with the answer.")
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_hit_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['lesson', 'related_class', 'super_search'], name='cached_answer_scope_idx')]
+
+    @property
+    def vector(self):
+        return vector_from_bytes(self.vector_data)
+
+    @vector.setter
+    def vector(self, value):
+        if value is None:
+            self.vector_data = None
+            self.dimensions = None
+        else:
+            self.vector_data = vector_to_bytes(value)
+            self.dimensions = len(value)
+
+    def __str__(self):
+        return f"{self.lesson or self.related_class}: {self.question[:50]}"
+
+    @property
+    def scope(self):
+        return (self.lesson_id, self.related_class_id, self.super_search)
+
+    def is_expired(self):
+        return (timezone.now() - self.created_at).total_seconds() > answer_cache_settings()['TTL']
+
+    @classmethod
+    def lookup(cls, question_vector, lesson=None, related_class=None, super_search=False):
+        """
+        Returns the unexpired cached answer of the scope whose question is the most similar to question_vector, if it
+        reaches THRESHOLD. The LOOKUP_CANDIDATES closest questions are tried in order, so an entry deleted by another
+        process or expired does not hide a valid one behind it. Expired entries met on the way are deleted.
+        """
+        config = answer_cache_settings()
+        scope = (getattr(lesson, 'id', None), getattr(related_class, 'id', None), super_search)
+        matches = [(entry_id, score) for entry_id, score in answer_indexes.get(scope).search(question_vector, top_k=config['LOOKUP_CANDIDATES'])
+                   if score >= config['THRESHOLD']]
+        if not matches:
+            return None
+        entries = cls.objects.in_bulk([entry_id for entry_id, _ in matches])
+        for entry_id, _ in matches:
+            entry = entries.get(entry_id)
+            if entry is None:
+                continue
+            if entry.is_expired():
+                entry.delete()
+                continue
+            cls.objects.filter(id=entry.id).update(hits=models.F('hits') + 1, last_hit_at=timezone.now())
+            return entry
+        return None
+
+    @classmethod
+    def store(cls, question, question_vector, answer, lesson=None, related_class=None, super_search=False, sources=None):
+        """Caches an answer, then drops the expired entries of its scope and the least recently used ones beyond MAX_ENTRIES_PER_SCOPE."""
+        config = answer_cache_settings()
+        entry = cls(lesson=lesson, related_class=related_class, super_search=super_search, question=question, answer=answer, sources=sources or {})
+        entry.vector = question_vector
+        entry.save()
+
+        in_scope = cls.objects.filter(lesson=lesson, related_class=related_class, super_search=super_search)
+        expired = in_scope.filter(created_at__lt=timezone.now() - datetime.timedelta(seconds=config['TTL']))
+        overflow = in_scope.order_by(models.F('last_hit_at').desc(nulls_last=True), '-created_at').values_list('id', flat=True)[config['MAX_ENTRIES_PER_SCOPE']:]
+        cls.objects.filter(Q(id__in=expired.values_list('id', flat=True)) | Q(id__in=list(overflow))).delete()
+        return entry
+
+    @classmethod
+    def invalidate_lesson(cls, lesson_id):
+        """Drops the cached answers about a lesson and the class-wide ones of its class."""
+        stale = Q(lesson_id=lesson_id)
+        class_id = Lesson.objects.filter(id=lesson_id).values_list('related_class_id', flat=True).first()
+        if class_id is not None:
+            stale |= Q(lesson__isnull=True, related_class_id=class_id)
+        cls.objects.filter(stale).delete()
+
+
+@receiver(post_save, sender=CachedAnswer)
+def sync_answer_index_on_save(sender, instance, **kwargs):
+    """Pushes the question embedding into the cached index of its scope."""
+    answer_indexes.update(instance.id, {instance.scope}, instance.vector)
+
+
+@receiver(post_delete, sender=CachedAnswer)
+def sync_answer_index_on_delete(sender, instance, **kwargs):
+    """Drops the deleted entry from the cached answer indexes."""
+    answer_indexes.remove(instance.id, {instance.scope})
+
+
+@receiver(post_save, sender=Transcript)
+@receiver(post_delete, sender=Transcript)
+def invalidate_answers_on_transcript_change(sender, instance, **kwargs):
+    """Answers built from a lesson's old transcripts are no longer served once they change."""
+    CachedAnswer.invalidate_lesson(instance.related_lesson_id)
+
+
 class Message(models.Model):
     session = models.ForeignKey(ChatSession, on_delete=models.CASCADE, related_name='messages', null=True, blank=True)
     text = models.TextField()
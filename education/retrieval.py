@@ -0,0 +1,145 @@
+import concurrent.futures
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from .utils import generate_embedding, get_all_namespaces, lexical_only_query, query_pinecone
+
+
+def chat_retrieval_settings():
+    """Returns settings.CHAT_RETRIEVAL with defaults filled in."""
+    config = {
+        'WORKERS': 8,
+        'BOOK_TIMEOUT': 8.0,
+        'LESSON_TIMEOUT': 5.0,
+    }
+    config.update(getattr(settings, 'CHAT_RETRIEVAL', {}))
+    return config
+
+
+class RetrievalResult:
+    """What the chat retrieval step found: the best book passage, the best lesson with its most relevant lecture passages, and how long each leg took in ms."""
+
+    def __init__(self):
+        self.query_vector = None
+        self.book_text = None
+        self.lesson = None
+        self.lesson_context = None
+        self.timings = {}
+        self.errors = {}
+
+    def __repr__(self):
+        return f"RetrievalResult(book={self.book_text is not None}, lesson={self.lesson}, timings={self.timings})"
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = concurrent.futures.ThreadPoolExecutor(max_workers=chat_retrieval_settings()['WORKERS'], thread_name_prefix='chat-retrieval')
+    return _executor
+
+
+def _timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    try:
+        return function(*args, **kwargs), (time.perf_counter() - start) * 1000
+    finally:
+        close_old_connections()  # Worker threads outlive the request, so do not keep their connections open
+
+
+def _wait_for_vector(query_vector, embedding):
+    if query_vector is not None:
+        return query_vector
+    return embedding.result()[0]
+
+
+def _search_book(query_text, namespace, query_vector, embedding):
+    try:
+        query_vector = _wait_for_vector(query_vector, embedding)
+    except Exception:
+        # Without a vector the books can still be searched by keywords
+        results = lexical_only_query(query_text, 5, [namespace] if namespace else get_all_namespaces())
+        return results[0]['text'] if results else None
+    return query_pinecone(query_text, namespace=namespace, query_vector=query_vector)
+
+
+def _find_lesson(lesson_class, query_text, query_vector, embedding):
+    query_vector = _wait_for_vector(query_vector, embedding)
+    lesson = lesson_class.find_most_similar_lesson(query_text, query_vector=query_vector)
+    if lesson is None:
+        return None, None
+    return lesson, lesson.get_relevant_context(query_text, query_vector=query_vector)
+
+
+def retrieve_chat_context(query_text, book_namespace=None, search_all_books=False, lesson_class=None, query_vector=None):
+    """
+    Runs the book and lesson searches concurrently with the embedding of the question, which is computed once
+    (or taken from query_vector when the caller already has it) and awaited by each leg only when it needs it.
+
+    The book leg searches book_namespace, or every book when search_all_books is set, by keywords only if the
+    embedding failed; the lesson leg looks for the closest lesson of lesson_class and the passages of its lecture
+    closest to the question. A leg that fails or misses its timeout from settings.CHAT_RETRIEVAL leaves its result
+    as None and records the error, the other leg is unaffected.
+    """
+    result = RetrievalResult()
+    start = time.perf_counter()
+    embedding = None
+    if query_vector is None:
+        embedding = _get_executor().submit(_timed, generate_embedding, query_text)
+    else:
+        result.query_vector = query_vector
+        result.timings['embedding'] = 0.0
+
+    config = chat_retrieval_settings()
+    legs = {}
+    # The embedding was submitted first, so a leg waiting for it never holds back its execution
+    if book_namespace or search_all_books:
+        legs['book'] = (_get_executor().submit(_timed, _search_book, query_text, book_namespace, query_vector, embedding), config['BOOK_TIMEOUT'])
+    if lesson_class is not None:
+        legs['lesson'] = (_get_executor().submit(_timed, _find_lesson, lesson_class, query_text, query_vector, embedding), config['LESSON_TIMEOUT'])
+
+    legs_started = time.perf_counter()
+    for name, (future, timeout) in legs.items():
+        # Both legs started together, so each waits only for what is left of its own timeout
+        remaining = max(0.0, timeout - (time.perf_counter() - legs_started))
+        try:
+            value, elapsed = future.result(timeout=remaining)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            print(f"Chat retrieval {name} search timed out after {timeout}s")
+            result.errors[name] = 'timeout'
+            result.timings[name] = round(timeout * 1000, 1)
+            continue
+        except Exception as e:
+            print(f"Error in chat retrieval {name} search", e)
+            result.errors[name] = str(e)
+            continue
+        result.timings[name] = round(elapsed, 1)
+        if name == 'book':
+            result.book_text = value
+        else:
+            result.lesson, result.lesson_context = value
+
+    if embedding is not None:
+        # The vector is handed back to the caller too, but not waited for past the longest leg timeout
+        longest = max((timeout for _, timeout in legs.values()), default=None)
+        remaining = None if longest is None else max(0.0, longest - (time.perf_counter() - legs_started))
+        try:
+            result.query_vector, elapsed = embedding.result(timeout=remaining)
+            result.timings['embedding'] = round(elapsed, 1)
+        except concurrent.futures.TimeoutError:
+            print("Chat question embedding timed out")
+            result.errors['embedding'] = 'timeout'
+        except Exception as e:
+            print("Error embedding chat question", e)
+            result.errors['embedding'] = str(e)
+    result.timings['total'] = round((time.perf_counter() - start) * 1000, 1)
+    return result
@@ -37,6 +37,7 @@ urlpatterns = [
     path('class/<slug:class_slug>/formula-sheet/generate-combined/<int:template_id>/', views.generate_combined_formula_sheet, name='generate_combined_formula_sheet'),
     
     path('lesson/<slug:lesson_slug>/', views.lesson_dashboard, name='lesson_dashboard'),
+    path('lesson/<slug:lesson_slug>/status/', views.lesson_job_status, name='lesson_job_status'),
     path('lesson/<slug:lesson_slug>/add-transcriptions/', views.add_transcriptions_view, name='add_transcriptions'),
 
     path('delete_concept/<int:concept_id>/', views.delete_concept, name='delete_concept'),
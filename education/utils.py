@@ -1,3 +1,4 @@
+import ast
 import PyPDF2
 import os
 from dotenv import load_dotenv
@@ -6,12 +7,12 @@ import json
 import subprocess
 import fitz  # PyMuPDF
 import re
-from pinecone import Pinecone
 from tqdm import tqdm
+import tiktoken
 import itertools
 import numpy as np
 import concurrent.futures
-from functools import partial
+import functools
 import tempfile
 import shutil
 from django.core.files.uploadedfile import InMemoryUploadedFile
@@ -22,6 +23,13 @@ import pytesseract
 from pdf2image import convert_from_path
 from PIL import Image, ImageDraw
 from PyPDF2 import PdfReader, PdfWriter
+from webPerson.llm_client import get_client
+from .completion_cache import completion_cache
+from .embedding_cache import embedding_cache
+from .vector_store import get_vector_store
+from .chunk_store import get_chunk_store
+from .federated_search import FederatedSearch, merge_by_rank, namespace_catalog
+from .lexical_index import lexical_search, reciprocal_rank_fusion, retrieval_settings, symbol_ratio
 
 
 
@@ -43,14 +51,27 @@ load_dotenv()
 
 openai_key = os.getenv("OPENAI_API_KEY")
 # openai.api_key = 'your-api-key'
-client = openai.Client()
+client = get_client()
 
-## Pinecone API
-pc_api_key = os.getenv("PINECONE_API_KEY")
-pc_index_name = "websiteindex"
-pc = Pinecone(api_key=pc_api_key)
-pc_index = pc.Index(pc_index_name)
-## Pinecone API
+
+def create_chat_completion(call_site, use_cache=True, **params):
+    """
+    client.chat.completions.create through the completion cache, returns the assistant message.
+    call_site selects the TTL of the entry (settings.COMPLETION_CACHE['TTLS']), use_cache=False always calls the API.
+    """
+    if use_cache:
+        cached = completion_cache.get(params)
+        if cached is not None:
+            return openai.types.chat.ChatCompletionMessage.model_validate(cached)
+    message = client.chat.completions.create(**params).choices[0].message
+    if use_cache:
+        completion_cache.set(params, call_site, message.model_dump(mode='json'))
+    return message
+
+## Vector store
+# Book chunk vectors live in Pinecone or in the local on-disk index, see settings.VECTOR_STORE.
+# Neither backend is opened until the first query or upload.
+## Vector store
 
 
 def extract_toc_text(pdf_path, start_page=0, end_page=5):
@@ -122,6 +143,32 @@ def parse_toc(raw_text):
     return toc_dict
 
 
+def parse_index_contents(index_contents):
+    """
+    Returns the (title, page) entries of Book.index_contents, which holds the parsed ToC either as a dict
+    or as the str() of one. Pages that are not numbers are returned as None.
+    """
+    toc = index_contents
+    if isinstance(toc, str):
+        try:
+            toc = json.loads(toc)
+        except ValueError:
+            try:
+                toc = ast.literal_eval(toc)
+            except (ValueError, SyntaxError) as e:
+                print(f"Error parsing book index contents: {e}")
+                return []
+    if not isinstance(toc, dict):
+        return []
+    entries = []
+    for title, page in toc.items():
+        try:
+            page = int(str(page).strip())
+        except ValueError:
+            page = None
+        entries.append((str(title).strip(), page))
+    return entries
+
 
 def extract_text_from_pdf(file_path):
     """
@@ -253,7 +300,7 @@ def run_python_code(code, filename="script.py"):
     return output
 
 
-def query_openai_with_tools(query, context=None, model="gpt-4o-mini", force_tool=None, tools_list=[]):
+def query_openai_with_tools(query, context=None, model="gpt-4o-mini", force_tool=None, tools_list=[], use_cache=True):
     """
     Send a query to OpenAI's API with optional function calls using the updated client object.
 
@@ -261,6 +308,7 @@ def query_openai_with_tools(query, context=None, model="gpt-4o-mini", force_tool
     :param context: List of previous messages in the conversation for context.
     :param force_tool: Optionally force a specific tool call.
     :param tools_list: List of tool schemas to be used by the API.
+    :param use_cache: Whether to answer identical requests from the completion cache.
     :return: The response from the OpenAI API and the new context.
     """
     # Default context if none provided
@@ -284,10 +332,9 @@ def query_openai_with_tools(query, context=None, model="gpt-4o-mini", force_tool
     
     # Calling the API using the client object
     # print('api_call_params:', api_call_params)
-    response = client.chat.completions.create(**api_call_params)
+    response_message = create_chat_completion('tools', use_cache=use_cache, **api_call_params)
     
     # Extracting and handling tool calls if they exist
-    response_message = response.choices[0].message
     # print('response_message:', response_message)
     # sample response_message: ChatCompletionMessage(content="Hello! I'm just a computer program, so I don't have feelings, but I'm here and ready to help you with anything you need. How can I assist you today?", role='assistant', function_call=None, tool_calls=None)
     new_context = context + [response_message]  # Update context with the assistant's reply
@@ -311,11 +358,11 @@ def query_openai_with_tools(query, context=None, model="gpt-4o-mini", force_tool
             })
         
         # Make another API call to continue the conversation with the updated context
-        second_response = client.chat.completions.create(
+        final_response = create_chat_completion(
+            'tools', use_cache=use_cache,
             model=model,
             messages=new_context,  # Avoid initiating new tool calls
         )
-        final_response = second_response.choices[0].message
         new_context += [final_response]  # Update the context with the final response
     else:
         # If no tool calls, use the first response as the final response
@@ -360,19 +407,118 @@ def query_openai_with_tools(query, context=None, model="gpt-4o-mini", force_tool
 ## embending
 
 ##A key note for this fucntion is that we will be feeding it both mathematical text as well as the text from the pdf file, not sure if fourmulas will carry meaning in the text-embedding-3-large model
-def generate_embedding(text, model="text-embedding-3-large"):
+def generate_embedding(text, model="text-embedding-3-large", use_cache=True):
     """
     Generate an embedding for the given text using the specified model.
     :param text: The input text to embed.
     :param model: The name of the model to use for embedding.
+    :param use_cache: Look the text up in the embedding cache first and store new embeddings in it.
     :return: The embedding vector for the input text.
     """
+    if use_cache:
+        cached = embedding_cache.get(text, model)
+        if cached is not None:
+            return cached.tolist()
+
     response = client.embeddings.create(
         input=text,
         model=model
     )
 
-    return response.data[0].embedding
+    embedding = response.data[0].embedding
+    if use_cache:
+        embedding_cache.set(text, model, embedding)
+    return embedding
+
+EMBEDDING_BATCH_MAX_TOKENS = 250000  # The API caps a single embeddings request at 300k tokens
+EMBEDDING_BATCH_MAX_INPUTS = 2048
+
+@functools.lru_cache(maxsize=None)
+def _embedding_encoding():
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        print(f"Falling back to approximate token counts: {e}")
+        return None
+
+def count_embedding_tokens(text):
+    """Counts the tokens of an embedding input, approximating with 3 characters per token if tiktoken is unavailable."""
+    encoding = _embedding_encoding()
+    if encoding is None:
+        return len(text) // 3 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+def pack_embedding_batches(texts, max_tokens=EMBEDDING_BATCH_MAX_TOKENS, max_inputs=EMBEDDING_BATCH_MAX_INPUTS):
+    """Groups the positions of texts into consecutive batches that stay under the per-request token and input limits."""
+    batches = []
+    current, current_tokens = [], 0
+    for i, text in enumerate(texts):
+        tokens = count_embedding_tokens(text)
+        if current and (current_tokens + tokens > max_tokens or len(current) >= max_inputs):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(i)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+def _embed_batch(texts, model):
+    response = client.embeddings.create(input=texts, model=model)
+    return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+def generate_embeddings(texts, model="text-embedding-3-large", max_workers=4, use_cache=True):
+    """
+    Generate embeddings for many texts with as few requests as possible.
+    Cached and repeated texts are only embedded once, the rest are packed into token bounded batches
+    that run max_workers at a time; transient failures are retried by the shared client.
+    :param texts: The input texts to embed.
+    :param model: The name of the model to use for embedding.
+    :return: A list of embedding vectors in the same order as texts.
+    """
+    texts = list(texts)
+    results = [None] * len(texts)
+    pending = {}  # text -> positions waiting for its embedding
+    for i, text in enumerate(texts):
+        cached = embedding_cache.get(text, model) if use_cache else None
+        if cached is not None:
+            results[i] = cached.tolist()
+        else:
+            pending.setdefault(text, []).append(i)
+
+    unique_texts = list(pending)
+    batches = pack_embedding_batches(unique_texts)
+    errors = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(_embed_batch, [unique_texts[i] for i in batch], model): batch for batch in batches}
+        for future in tqdm(concurrent.futures.as_completed(futures), total=len(futures), desc="Embedding batches", disable=len(futures) < 2):
+            batch = futures[future]
+            try:
+                embeddings = future.result()
+            except Exception as e:
+                print(f"Embedding batch of {len(batch)} inputs failed: {e}")
+                errors.append(e)
+                continue
+            for i, embedding in zip(batch, embeddings):
+                text = unique_texts[i]
+                if use_cache:
+                    embedding_cache.set(text, model, embedding)
+                for position in pending[text]:
+                    results[position] = embedding
+
+    if errors:
+        raise errors[0]
+    return results
+
+def vector_to_bytes(vector):
+    """Packs a vector as raw little-endian float32 bytes for storage in a BinaryField."""
+    return np.asarray(vector, dtype='<f4').tobytes()
+
+def vector_from_bytes(data):
+    """Returns a read-only float32 view over bytes written by vector_to_bytes, without copying them."""
+    if data is None:
+        return None
+    return np.frombuffer(data, dtype='<f4')
 
 ## embending
 
@@ -418,6 +564,17 @@ def chunk_text_advanced(text, min_words=310, max_words=1200, use_separators=True
 
     return chunks
 
+def split_passages(text, words=200, overlap=50):
+    """Splits text into passages of up to `words` words, each starting `words - overlap` words after the previous one."""
+    tokens = text.split()
+    step = max(1, words - overlap)
+    passages = []
+    for start in range(0, len(tokens), step):
+        passages.append(' '.join(tokens[start:start + words]))
+        if start + words >= len(tokens):
+            break
+    return passages
+
 def add_context_window(chunk, remaining_words, context_window):
     """Add context window words to the beginning and end of the chunk."""
     start_context = max(0, len(chunk) - context_window)
@@ -430,13 +587,9 @@ def embed_book_text(pdf_path, min_words=310, max_words=1200, use_separators=True
     text = extract_text_from_pdf(pdf_path)  # Extract text from the PDF
     chunks = chunk_text_advanced(text, min_words=min_words, max_words=max_words, use_separators=use_separators, context_window=context_window)
     
-    vectors = []
-    for i, chunk in enumerate(tqdm(chunks, desc="Generating embeddings")):
-        embedding = generate_embedding(chunk, model=model)
-        # Append the embedding with an ID and include the chunk text as metadata
-        vectors.append({"id": str(i + 1), "vector": embedding, "text": chunk})
-
-    return vectors
+    embeddings = generate_embeddings(chunks, model=model)
+    # Pair each embedding with an ID and include the chunk text as metadata
+    return [{"id": str(i + 1), "vector": embedding, "text": chunk} for i, (chunk, embedding) in enumerate(zip(chunks, embeddings))]
 
 
 
@@ -453,27 +606,18 @@ def chunks(iterable, batch_size=100):
         yield chunk
         chunk = tuple(itertools.islice(it, batch_size))
 
-def upload_book_to_index(pdf_path, book_name_slug):
-    """Upload the text from a PDF book to the Pinecone index asynchronously."""
-    vector_embeddings = embed_book_text(pdf_path)  # Assuming this returns a list of {"id": "1", "values": [0.1, ...]}
+def upload_book_to_index(pdf_path, book_name_slug, full=False):
+    """Stream the text from a PDF book into the configured vector store, embedding only chunks it does not have yet."""
+    from .book_indexing import index_book
+    stats = index_book(pdf_path, book_name_slug.lower(), full=full)
+    print(f"Book embeddings uploaded to the vector store ({stats['chunks']} chunks, {stats['embedded']} embedded, {stats['deleted']} deleted).")
 
-    # Chunk embeddings and upsert them in parallel
-    pc_parallel = Pinecone(api_key=pc_api_key, pool_threads=30)
-    index_parallel = pc_parallel.Index(pc_index_name)
-    
-    for embeddings_chunk in chunks(vector_embeddings, batch_size=100):
-        # Prepare upsert data including metadata
-        upsert_data = [(item['id'], item['vector'], {"text": item['text']}) for item in embeddings_chunk]
-        index_parallel.upsert(vectors=upsert_data, async_req=True, namespace=book_name_slug.lower())
-
-    print("Book embeddings with metadata uploaded to Pinecone index.")
-
-def get_all_namespaces():
-    """Get all the namespaces in the Pinecone index.
+def get_all_namespaces(fresh=False):
+    """Get all the namespaces in the vector store, from the cached catalog unless fresh is set.
     Returns a list of stings representing the namespaces."""
-    index_stats = pc_index.describe_index_stats()
-    namespaces_dict = index_stats['namespaces']
-    return list(namespaces_dict.keys())
+    if fresh:
+        namespace_catalog.invalidate()
+    return namespace_catalog.get()
 
 @DeprecationWarning
 def query_pineconeOLD(query, embed=True, top_k=5, return_top=True, model="text-embedding-3-large", namespace=None):
@@ -509,7 +653,7 @@ def query_pineconeOLD(query, embed=True, top_k=5, return_top=True, model="text-e
 
     # Query Pinecone with metadata inclusion and optional namespace
     
-    results = pc_index.query(**query_options)
+    results = get_vector_store('pinecone').index.query(**query_options)
     # print('DEBUG: results:', results)
 
     # Extract the IDs, scores, and text from the top results
@@ -527,51 +671,84 @@ def query_pineconeOLD(query, embed=True, top_k=5, return_top=True, model="text-e
         # Return all top_k results
         return sorted_results
     
-def query_pinecone(query, embed=True, top_k=5, return_top=True, model="text-embedding-3-large", namespace=None):
+def query_pinecone(query, embed=True, top_k=5, return_top=True, model="text-embedding-3-large", namespace=None, mode=None, query_vector=None):
     """
-    Query Pinecone index with either a text string or a vector, specifying an optional namespace.
+    Query the vector store with either a text string or a vector, specifying an optional namespace.
     If no namespace is provided, queries all namespaces in parallel and returns the top result across all.
+    Text queries use settings.BOOK_RETRIEVAL['MODE'] unless mode is given: 'vector', 'lexical' (BM25 only) or
+    'hybrid' (vector and BM25 hits fused by reciprocal rank). In hybrid mode, queries made mostly of symbols and
+    identifiers are answered from BM25 alone when it has hits, which skips the embedding call.
+    In lexical mode a query without any BM25 hit falls back to a plain vector search rather than returning nothing.
+    A text query can pass its precomputed query_vector so it is not embedded again.
     """
     if embed:
+        mode = mode or retrieval_settings()['MODE']
+        if mode == 'lexical' or (mode == 'hybrid' and symbol_ratio(query) >= retrieval_settings()['LEXICAL_ONLY_SYMBOL_RATIO']):
+            results = lexical_only_query(query, top_k, [namespace] if namespace else get_all_namespaces())
+            if results:
+                return results[0]['text'] if return_top else results
+            if mode == 'lexical':
+                mode = 'vector'
         # Generate an embedding if the input is text
-        query_vector = generate_embedding(query, model=model)
+        if query_vector is None:
+            query_vector = generate_embedding(query, model=model)
+        query_text = query
     else:
         # Assume the input is already a vector
         query_vector = query
+        query_text = None
+        mode = 'vector'
 
     if namespace:
-        return single_namespace_query(query_vector, top_k, namespace) if not return_top else single_namespace_query(query_vector, top_k, namespace)[0]['text']
+        results = single_namespace_query(query_vector, top_k, namespace, query_text=query_text, mode=mode)
+        return results if not return_top else results[0]['text']
     else:
-        return query_all_namespaces(query_vector, top_k)
-
-def single_namespace_query(query_vector, top_k, namespace):
-    """Query a single namespace and return the results."""
-    query_options = {
-        "vector": query_vector,
-        "top_k": top_k,
-        "include_metadata": True,
-        "namespace": namespace
-    }
-    results = pc_index.query(**query_options)
-    matches = results['matches']
-    return [{"text": match["metadata"]["text"], "score": float(match["score"])} for match in matches]
-
-def query_all_namespaces(query_vector, top_k):
-    """Query all namespaces in parallel and return the top result."""
-    namespaces = get_all_namespaces()
-    with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
-        # Prepare partial function to query each namespace
-        func = partial(single_namespace_query, query_vector, top_k)
-        # Map function across all namespaces
-        futures = {executor.submit(func, namespace=ns): ns for ns in namespaces}
-        all_results = []
+        return query_all_namespaces(query_vector, top_k, query_text=query_text, mode=mode, return_top=return_top)
 
-        for future in concurrent.futures.as_completed(futures):
-            all_results.extend(future.result())
+def lexical_only_query(query_text, top_k, namespaces):
+    """BM25 search across books merged by rank, returns an empty list when no book has a lexical index or a hit."""
+    result_lists = [[dict(result, namespace=namespace) for result in lexical_search(namespace, query_text, top_k) or []] for namespace in namespaces]
+    return merge_by_rank(result_lists, top_k=top_k, k=retrieval_settings()['RRF_K'])
 
-    # Aggregate and sort results from all namespaces
-    all_results.sort(key=lambda x: x['score'], reverse=True)
-    return all_results[0]['text'] if all_results else None
+def single_namespace_query(query_vector, top_k, namespace, query_text=None, mode='vector'):
+    """
+    Query a single namespace and return the results, fused with the book's BM25 hits in hybrid mode.
+    Hybrid results always carry reciprocal rank scores, also for books without a BM25 index or hit, where the
+    vector hits are fused alone, so every book of a query returns scores on the same scale.
+    """
+    config = retrieval_settings()
+    hybrid = bool(query_text) and mode == 'hybrid'
+    lexical_results = lexical_search(namespace, query_text, config['CANDIDATES']) if hybrid else None
+
+    # Books with a local chunk store keep only ids in the vector index, older uploads carry the text as metadata
+    chunk_store = get_chunk_store(namespace)
+    matches = get_vector_store().query(namespace, query_vector, top_k=config['CANDIDATES'] if lexical_results else top_k, include_metadata=chunk_store is None)
+    vector_results = [{"id": match["id"], "text": match["metadata"].get("text"), "score": match["score"]} for match in matches]
+    results = reciprocal_rank_fusion([vector_results, lexical_results or []], top_k=top_k, k=config['RRF_K']) if hybrid else vector_results[:top_k]
+    if chunk_store is not None:
+        texts = chunk_store.get_many(result["id"] for result in results if result["text"] is None)
+        for result in results:
+            result["text"] = result["text"] or texts.get(result["id"])
+    return [result for result in results if result["text"] is not None]
+
+federated_search = FederatedSearch(
+    single_namespace_query,
+    namespace_catalog,
+    max_workers=retrieval_settings()['SEARCH_WORKERS'],
+    timeout=retrieval_settings()['NAMESPACE_TIMEOUT'],
+    rrf_k=retrieval_settings()['RRF_K'],
+)
+
+def query_all_namespaces(query_vector, top_k, query_text=None, mode='vector', return_top=True):
+    """
+    Query all namespaces in parallel and return the top result, or the top_k results tagged with their namespace.
+    Books are merged by rank, except in vector mode where every book returns cosine scores of the same model.
+    """
+    merge = 'score' if mode == 'vector' or not query_text else 'rank'
+    results = federated_search.search(query_vector, top_k, merge=merge, query_text=query_text, mode=mode)
+    if return_top:
+        return results[0]['text'] if results else None
+    return results
 
 
 
@@ -611,7 +788,36 @@ def generate_chat_completionOLD(user_question, use_gpt4=False):
     )
     return completion.choices[0].message.content
 
-def generate_chat_completion(user_question, use_gpt4=True):
+def generate_structured_completion(user_question, schema, name="response", use_gpt4=False, use_cache=True):
+    """
+    Generates a chat completion constrained to a JSON schema (OpenAI structured outputs) and returns it parsed.
+
+    Args:
+    user_question (str): The prompt.
+    schema (dict): The JSON schema of the reply, every property required and no additional properties.
+    name (str): Name of the schema sent to the API.
+    use_gpt4 (bool): Whether to use GPT-4 model or not (defaults to False).
+    use_cache (bool): Whether to answer identical prompts from the completion cache.
+
+    Returns:
+    dict: The parsed reply, ValueError if it is not a JSON object.
+    """
+    model = "gpt-4o" if use_gpt4 else "gpt-4o-mini"
+    message = create_chat_completion(
+        'structured_completion', use_cache=use_cache,
+        model=model,
+        response_format={"type": "json_schema", "json_schema": {"name": name, "strict": True, "schema": schema}},
+        messages=[
+            {"role": "system", "content": "You are a helpful assistant."},
+            {"role": "user", "content": user_question}
+        ]
+    )
+    reply = json.loads(message.content or "")
+    if not isinstance(reply, dict):
+        raise ValueError(f"Expected a JSON object, got {type(reply).__name__}")
+    return reply
+
+def generate_chat_completion(user_question, use_gpt4=True, use_cache=True):
     """
     Generates a chat completion using OpenAI's GPT-3.5-turbo or GPT-4 model.
     If the context length exceeds the maximum for GPT-3.5-turbo, it retries with GPT-4.
@@ -619,24 +825,26 @@ def generate_chat_completion(user_question, use_gpt4=True):
     Args:
     user_question (str): The user's question.
     use_gpt4 (bool): Whether to use GPT-4 model or not (defaults to False).
+    use_cache (bool): Whether to answer identical prompts from the completion cache.
 
     Returns:
     str: The generated completion message.
     """
     model = "gpt-4o" if use_gpt4 else "gpt-4o-mini"
     try:
-        completion = client.chat.completions.create(
+        message = create_chat_completion(
+            'chat_completion', use_cache=use_cache,
             model=model,
             messages=[
                 {"role": "system", "content": "You are a helpful assistant."},
                 {"role": "user", "content": user_question}
             ]
         )
-        return completion.choices[0].message.content
+        return message.content
     except Exception as e:
         if 'context_length_exceeded' in str(e):
             if not use_gpt4:  # Only retry with GPT-4 if it wasn't already using it
-                return generate_chat_completion(user_question, use_gpt4=True)
+                return generate_chat_completion(user_question, use_gpt4=True, use_cache=use_cache)
             else:
                 # Handle case where GPT-4 also exceeds context length or throw the error if needed
                 raise ValueError("Error: The provided context is too long, even for GPT-4.")
@@ -644,9 +852,10 @@ def generate_chat_completion(user_question, use_gpt4=True):
             raise e
         
 
-def interact_with_gpt(text, prompt, use_gpt4=False):
+def interact_with_gpt(text, prompt, use_gpt4=False, use_cache=True):
     model = "gpt-4o" if use_gpt4 else "gpt-4o-mini"
-    completion = client.chat.completions.create(
+    message = create_chat_completion(
+        'json_completion', use_cache=use_cache,
         model=model,
         response_format={ "type": "json_object" },
         messages=[
@@ -654,7 +863,7 @@ def interact_with_gpt(text, prompt, use_gpt4=False):
             {"role": "user", "content": f"{prompt}\n\n{text}"},
         ]
     )
-    response = completion.choices[0].message.content
+    response = message.content
     return response
 
 def calculate_cosine_distance(embedding1, embedding2):
@@ -735,8 +944,8 @@ def create_concepts_from_lesson(lesson, use_gpt4=False):
             # Wrap the formula in \[...\] for displayed LaTeX rendering
             formula_wrapped = f"\\[{formula}\\]"
             # Create the concepts directly
-            concept = Concept.objects.create(title="Formula", description=formula_wrapped, related_lesson=lesson, related_class=lesson.related_class)
-            concept.save()
+            # Formulas repeated across lessons are merged into the existing concept instead of duplicated
+            Concept.create_deduplicated(title="Formula", description=formula_wrapped, related_lesson=lesson, related_class=lesson.related_class)
 
     # Prompt for extracting principles/definitions
     prompt_principles = f"""
@@ -769,7 +978,7 @@ def create_concepts_from_lesson(lesson, use_gpt4=False):
             # Wrap the principle in \[...\] for displayed LaTeX rendering
             principle_wrapped = f"\\[{principle}\\]"
             # Create the concepts directly
-            Concept.objects.create(title="Principle/Definition", description=principle_wrapped, related_lesson=lesson, related_class=lesson.related_class)
+            Concept.create_deduplicated(title="Principle/Definition", description=principle_wrapped, related_lesson=lesson, related_class=lesson.related_class)
 
     return 1
         
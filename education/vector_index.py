@@ -0,0 +1,623 @@
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError
+
+
+def normalize_rows(matrix):
+    """Returns a float32 copy of the matrix with every row scaled to unit length, zero rows are left as zeros."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def top_k_columns(scores, k):
+    """Returns, for each row of a score matrix, the column positions of its k highest scores in descending order."""
+    k = min(k, scores.shape[1])
+    if k < scores.shape[1]:
+        candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        candidates = np.tile(np.arange(scores.shape[1]), (scores.shape[0], 1))
+    candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+    return np.take_along_axis(candidates, np.argsort(-candidate_scores, axis=1, kind='stable'), axis=1)
+
+
+class EmbeddingCompression:
+    """
+    Compressed in-memory representation of embeddings.
+
+    Vectors are truncated to their first `dimensions` components and re-normalized, which text-embedding-3 models
+    support (Matryoshka training), then optionally quantized to int8 with one float32 scale per vector.
+    Indexes using it rescore the top `rescore_factor * top_k` candidates against the full precision vectors.
+    """
+
+    def __init__(self, dimensions=None, quantize=True, rescore_factor=4):
+        self.dimensions = dimensions
+        self.quantize = quantize
+        self.rescore_factor = rescore_factor
+
+    def __repr__(self):
+        return f"EmbeddingCompression(dimensions={self.dimensions}, quantize={self.quantize}, rescore_factor={self.rescore_factor})"
+
+    def prepare(self, vectors):
+        """Truncates vectors to the configured dimensions and normalizes them."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim == 1:
+            vectors = vectors.reshape(1, -1)
+        if self.dimensions and self.dimensions < vectors.shape[1]:
+            vectors = vectors[:, :self.dimensions]
+        return normalize_rows(vectors)
+
+    def encode(self, vectors):
+        """Returns the stored form of vectors as (matrix, scales), scales is None when not quantizing."""
+        prepared = self.prepare(vectors)
+        if not self.quantize:
+            return prepared, None
+        scales = np.abs(prepared).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.round(prepared / scales[:, None]).astype(np.int8)
+        return codes, scales.astype(np.float32)
+
+    def bytes_per_vector(self, full_dimensions):
+        dimensions = min(self.dimensions or full_dimensions, full_dimensions)
+        return dimensions + 4 if self.quantize else dimensions * 4
+
+
+def compression_from_settings():
+    """Returns the EmbeddingCompression configured in settings.EMBEDDING_COMPRESSION, or None when it is disabled."""
+    config = getattr(settings, 'EMBEDDING_COMPRESSION', {})
+    if not config.get('ENABLED'):
+        return None
+    return EmbeddingCompression(
+        dimensions=config.get('DIMENSIONS'),
+        quantize=config.get('QUANTIZE', True),
+        rescore_factor=config.get('RESCORE_FACTOR', 4),
+    )
+
+
+class VectorIndex:
+    """
+    A pre-normalized matrix of vectors keyed by integer ids.
+
+    Searching is a single matrix multiply followed by argpartition, so scores are cosine similarities.
+    Updates swap in new arrays instead of mutating them, which keeps concurrent searches consistent without locking reads.
+
+    With a compression the matrix holds truncated (and possibly int8) vectors, the first pass keeps
+    rescore_factor * top_k candidates and, if fetch_vectors is given, they are rescored exactly against the
+    full precision vectors it returns as a {id: vector} dict.
+    """
+
+    SCORE_BLOCK_ROWS = 4096
+
+    def __init__(self, ids=None, vectors=None, compression=None, fetch_vectors=None):
+        self._lock = threading.Lock()
+        self.compression = compression
+        self.fetch_vectors = fetch_vectors
+        ids = list(ids or [])
+        self._source_dimensions = None
+        if ids:
+            vectors = np.asarray(vectors, dtype=np.float32)
+            self._source_dimensions = vectors.shape[1]
+            matrix, scales = self._encode(vectors)
+        else:
+            matrix, scales = np.zeros((0, 0), dtype=np.float32), None
+        self._data = (np.asarray(ids, dtype=np.int64), matrix, scales)
+
+    def __len__(self):
+        return len(self._data[0])
+
+    @property
+    def dimensions(self):
+        return self._source_dimensions
+
+    @property
+    def nbytes(self):
+        """Memory held by the stored matrix and scales."""
+        ids, matrix, scales = self._data
+        return matrix.nbytes + (scales.nbytes if scales is not None else 0)
+
+    def _encode(self, vectors):
+        if self.compression is None:
+            return normalize_rows(vectors), None
+        return self.compression.encode(vectors)
+
+    def upsert(self, item_id, vector):
+        """Adds or replaces the vector stored for item_id."""
+        vector = np.asarray(vector, dtype=np.float32).reshape(1, -1)
+        row, row_scale = self._encode(vector)
+        with self._lock:
+            ids, matrix, scales = self._data
+            if len(ids) and vector.shape[1] != self._source_dimensions:
+                raise ValueError(f"Vector has {vector.shape[1]} dimensions, index expects {self._source_dimensions}.")
+            positions = np.flatnonzero(ids == item_id)
+            if positions.size:
+                matrix = matrix.copy()
+                matrix[positions[0]] = row[0]
+                if scales is not None:
+                    scales = scales.copy()
+                    scales[positions[0]] = row_scale[0]
+            elif len(ids):
+                ids = np.append(ids, item_id)
+                matrix = np.vstack([matrix, row])
+                scales = np.concatenate([scales, row_scale]) if scales is not None else None
+            else:
+                ids = np.asarray([item_id], dtype=np.int64)
+                matrix, scales = row, row_scale
+                self._source_dimensions = vector.shape[1]
+            self._data = (ids, matrix, scales)
+
+    def remove(self, item_id):
+        """Drops item_id from the index, returns True if it was present."""
+        with self._lock:
+            ids, matrix, scales = self._data
+            positions = np.flatnonzero(ids == item_id)
+            if not positions.size:
+                return False
+            self._data = (
+                np.delete(ids, positions),
+                np.delete(matrix, positions, axis=0),
+                np.delete(scales, positions) if scales is not None else None,
+            )
+            return True
+
+    def _scores(self, queries, matrix, scales):
+        if scales is None:
+            return queries @ matrix.T
+        # Dequantize block by block so only SCORE_BLOCK_ROWS rows are ever expanded to float32
+        scores = np.empty((len(queries), len(matrix)), dtype=np.float32)
+        for start in range(0, len(matrix), self.SCORE_BLOCK_ROWS):
+            block = slice(start, start + self.SCORE_BLOCK_ROWS)
+            scores[:, block] = (queries @ matrix[block].astype(np.float32).T) * scales[block]
+        return scores
+
+    def score_all(self, query_vector):
+        """Returns (ids, scores) arrays covering every stored vector, first pass scores when compressed."""
+        ids, matrix, scales = self._data
+        if not len(ids):
+            return ids, np.zeros(0, dtype=np.float32)
+        query = np.asarray(query_vector, dtype=np.float32).reshape(1, -1)
+        if query.shape[1] != self._source_dimensions:
+            raise ValueError(f"Query has {query.shape[1]} dimensions, index expects {self._source_dimensions}.")
+        prepared = normalize_rows(query) if self.compression is None else self.compression.prepare(query)
+        return ids, self._scores(prepared, matrix, scales)[0]
+
+    def search(self, query_vector, top_k=1):
+        """Returns up to top_k (id, score) pairs sorted from most to least similar."""
+        return self.search_many([query_vector], top_k=top_k)[0]
+
+    def search_many(self, query_vectors, top_k=1):
+        """Scores every query with a single matrix multiply, returns one top_k list of (id, score) pairs per query."""
+        ids, matrix, scales = self._data
+        if not len(query_vectors):
+            return []
+        queries = np.vstack([np.asarray(q, dtype=np.float32) for q in query_vectors])
+        if not len(ids) or top_k <= 0:
+            return [[] for _ in range(len(queries))]
+        if queries.shape[1] != self._source_dimensions:
+            raise ValueError(f"Queries have {queries.shape[1]} dimensions, index expects {self._source_dimensions}.")
+
+        if self.compression is None:
+            scores = self._scores(normalize_rows(queries), matrix, scales)
+            return [[(int(ids[j]), float(scores[row, j])) for j in columns] for row, columns in enumerate(top_k_columns(scores, top_k))]
+
+        scores = self._scores(self.compression.prepare(queries), matrix, scales)
+        candidates = top_k_columns(scores, top_k * self.compression.rescore_factor)
+        if self.fetch_vectors is None:
+            return [[(int(ids[j]), float(scores[row, j])) for j in columns[:top_k]] for row, columns in enumerate(candidates)]
+        return self._rescore(normalize_rows(queries), ids, candidates, top_k)
+
+    def _rescore(self, queries, ids, candidates, top_k):
+        candidate_ids = [int(i) for i in np.unique(ids[candidates])]
+        full_vectors = self.fetch_vectors(candidate_ids)
+        results = []
+        for query, columns in zip(queries, candidates):
+            found = [int(ids[j]) for j in columns if int(ids[j]) in full_vectors]
+            if not found:
+                results.append([])
+                continue
+            exact = normalize_rows(np.vstack([full_vectors[i] for i in found])) @ query
+            order = np.argsort(-exact, kind='stable')[:top_k]
+            results.append([(found[i], float(exact[i])) for i in order])
+        return results
+
+
+def index_sync_settings():
+    """Returns settings.VECTOR_INDEX_SYNC with defaults filled in."""
+    config = {
+        'ENABLED': True,
+        'CHECK_INTERVAL': 2.0,
+    }
+    config.update(getattr(settings, 'VECTOR_INDEX_SYNC', {}))
+    return config
+
+
+def scope_key(scope):
+    """The IndexVersion key of a scope: its repr, so None, class ids and answer cache tuples all fit."""
+    return repr(scope)
+
+
+EVERY_SCOPE = '*'
+
+
+def read_index_versions(name, keys):
+    """Returns {key: shared change counter} of some scopes of a registry (0 before their first change), or None if it cannot be read."""
+    from .models import IndexVersion
+
+    try:
+        versions = dict(IndexVersion.objects.filter(name=name, scope__in=keys).values_list('scope', 'version'))
+    except DatabaseError as e:
+        print(f"Could not read the versions of vector index {name}: {e}")
+        return None
+    return {key: versions.get(key, 0) for key in keys}
+
+
+def bump_index_version(name, key):
+    """Increments the shared change counter of one scope of a registry and returns its new value, or None if it cannot be written."""
+    from django.db.models import F
+    from .models import IndexVersion
+
+    try:
+        if not IndexVersion.objects.filter(name=name, scope=key).update(version=F('version') + 1):
+            try:
+                IndexVersion.objects.create(name=name, scope=key, version=1)
+            except IntegrityError:
+                IndexVersion.objects.filter(name=name, scope=key).update(version=F('version') + 1)
+        return IndexVersion.objects.filter(name=name, scope=key).values_list('version', flat=True).first()
+    except DatabaseError as e:
+        print(f"Could not bump the version of vector index {name}: {e}")
+        return None
+
+
+class IndexRegistry:
+    """
+    Lazily built VectorIndexes keyed by scope (for example a class id, or None for everything).
+
+    Saved rows are pushed into the scopes they belong to and removed from every other cached scope,
+    scopes that were never queried are simply built from the database on first use.
+
+    Named registries share their changes with other processes (the web server and run_workers) through
+    per-scope counters in the IndexVersion table: an update, removal or invalidation increments the counters of
+    the scopes it touched (a full invalidation the registry wide '*' counter), and get() compares a cached scope's
+    counters with the ones it was built at, at most every VECTOR_INDEX_SYNC['CHECK_INTERVAL'] seconds, rebuilding
+    only that scope when another process changed it.
+    """
+
+    def __init__(self, builder, name=None):
+        self._builder = builder
+        self.name = name
+        self._indexes = {}
+        self._lock = threading.Lock()
+        self._versions = {}
+        self._checked_at = {}
+
+    def _sync_enabled(self):
+        return self.name is not None and index_sync_settings()['ENABLED']
+
+    def _read_versions(self, scope):
+        versions = read_index_versions(self.name, [scope_key(scope), EVERY_SCOPE])
+        return None if versions is None else (versions[scope_key(scope)], versions[EVERY_SCOPE])
+
+    def sync(self, scope=None, force=False):
+        """Drops the cached index of a scope if another process changed it since it was built or last checked."""
+        if not self._sync_enabled() or scope not in self._indexes:
+            return
+        now = time.monotonic()
+        checked_at = self._checked_at.get(scope)
+        if not force and checked_at is not None and now - checked_at < index_sync_settings()['CHECK_INTERVAL']:
+            return
+        self._checked_at[scope] = now
+        versions = self._read_versions(scope)
+        if versions is None:
+            return
+        with self._lock:
+            if versions != self._versions.get(scope):
+                self._indexes.pop(scope, None)
+                self._versions.pop(scope, None)
+
+    def _changed(self, scopes):
+        """Records a change of some scopes made by this process, dropping those another process changed too."""
+        if not self._sync_enabled():
+            return
+        for scope in scopes:
+            version = bump_index_version(self.name, scope_key(scope))
+            if version is None:
+                continue
+            with self._lock:
+                seen = self._versions.get(scope)
+                if seen is None or version != seen[0] + 1:
+                    self._indexes.pop(scope, None)
+                    self._versions.pop(scope, None)
+                else:
+                    self._versions[scope] = (version, seen[1])
+
+    def get(self, scope=None):
+        """Returns the cached index of a scope, building it on first use."""
+        self.sync(scope)
+        index = self._indexes.get(scope)
+        if index is None:
+            # Read the counters before building, a change made meanwhile then only causes one extra rebuild
+            versions = self._read_versions(scope) if self._sync_enabled() else None
+            index = self._builder(scope)
+            with self._lock:
+                if scope not in self._indexes:
+                    self._indexes[scope] = index
+                    if versions is not None:
+                        self._versions[scope] = versions
+                        self._checked_at[scope] = time.monotonic()
+                index = self._indexes[scope]
+        return index
+
+    def update(self, item_id, scopes, vector):
+        """Stores vector under item_id in the given scopes and drops item_id everywhere else."""
+        changed = set(scopes)
+        with self._lock:
+            cached = list(self._indexes.items())
+        for scope, index in cached:
+            if scope not in scopes or vector is None or not len(vector):
+                if index.remove(item_id):
+                    changed.add(scope)
+                continue
+            try:
+                index.upsert(item_id, vector)
+            except ValueError as e:
+                print(f"Rebuilding vector index for scope {scope}: {e}")
+                with self._lock:
+                    self._indexes.pop(scope, None)
+        self._changed(changed)
+
+    def remove(self, item_id, scopes=None):
+        """Removes item_id from every cached scope. scopes names the scopes it belonged to, for other processes."""
+        changed = set(scopes or ())
+        with self._lock:
+            cached = list(self._indexes.items())
+        for scope, index in cached:
+            if index.remove(item_id):
+                changed.add(scope)
+        self._changed(changed)
+
+    def invalidate(self, scope=None, everything=False):
+        """Drops the cached index of one scope, or of every scope."""
+        with self._lock:
+            if everything:
+                self._indexes.clear()
+                self._versions.clear()
+            else:
+                self._indexes.pop(scope, None)
+                self._versions.pop(scope, None)
+        if self._sync_enabled():
+            bump_index_version(self.name, EVERY_SCOPE if everything else scope_key(scope))
+
+
+def matrix_from_rows(rows, label):
+    """Stacks (id, float32 bytes) rows into (ids, matrix), skipping rows whose dimension disagrees with the first."""
+    ids, vectors = [], []
+    for item_id, data in rows:
+        vector = np.frombuffer(data, dtype='<f4')
+        if not vector.size:
+            continue
+        if vectors and vector.size != vectors[0].size:
+            print(f"Skipping embedding for {label} {item_id}: expected {vectors[0].size} dimensions, got {vector.size}")
+            continue
+        ids.append(item_id)
+        vectors.append(vector)
+    return ids, (np.vstack(vectors) if vectors else None)
+
+
+def index_from_rows(rows, label, compression=None, fetch_vectors=None):
+    """Builds a VectorIndex from (id, float32 bytes) rows, skipping rows whose dimension disagrees with the first."""
+    ids, matrix = matrix_from_rows(rows, label)
+    return VectorIndex(ids, matrix, compression=compression, fetch_vectors=fetch_vectors)
+
+
+def vectors_by_id(rows):
+    """Turns (id, float32 bytes) rows into an {id: vector} dict, used to rescore compressed indexes."""
+    return {item_id: np.frombuffer(data, dtype='<f4') for item_id, data in rows if data}
+
+
+## Lesson indexes, scoped to a class id or None for every lesson
+
+def build_class_lesson_index(class_id=None):
+    """Loads every lesson embedding of a class, or of every class, into a new VectorIndex."""
+    from .models import LessonEmbedding
+
+    embeddings = LessonEmbedding.objects.filter(vector_data__isnull=False)
+    if class_id is not None:
+        embeddings = embeddings.filter(lesson__related_class_id=class_id)
+    return index_from_rows(embeddings.values_list('lesson_id', 'vector_data'), 'lesson', compression=compression_from_settings(), fetch_vectors=fetch_lesson_vectors)
+
+
+def fetch_lesson_vectors(lesson_ids):
+    """Loads the full precision embeddings of the given lessons."""
+    from .models import LessonEmbedding
+
+    return vectors_by_id(LessonEmbedding.objects.filter(lesson_id__in=lesson_ids).values_list('lesson_id', 'vector_data'))
+
+
+lesson_indexes = IndexRegistry(build_class_lesson_index, name='lessons')
+
+
+def get_class_lesson_index(class_id):
+    """Returns the cached lesson index for a class, building it on first use."""
+    return lesson_indexes.get(class_id)
+
+
+def update_lesson_vector(lesson_id, class_id, vector):
+    """Keeps the cached class and global lesson indexes in sync after a lesson embedding is saved."""
+    lesson_indexes.update(lesson_id, {None, class_id}, vector)
+
+
+def remove_lesson_vector(lesson_id, class_id=None):
+    """Removes a lesson from every cached lesson index."""
+    lesson_indexes.remove(lesson_id, {None, class_id})
+
+
+def invalidate_class_lesson_index(class_id=None):
+    """Drops the cached index of one class, or every cached lesson index when class_id is None."""
+    lesson_indexes.invalidate(class_id, everything=class_id is None)
+
+
+def best_lesson_per_class(query_vector):
+    """
+    Scores every lesson once against the global lesson index and keeps the best lesson of each class.
+    Returns (class_id, lesson_id, score) tuples sorted from most to least similar.
+    """
+    from .models import Lesson
+
+    ids, scores = lesson_indexes.get(None).score_all(query_vector)
+    if not len(ids):
+        return []
+    lesson_classes = dict(Lesson.objects.filter(id__in=ids.tolist()).values_list('id', 'related_class_id'))
+    class_ids = np.array([lesson_classes.get(int(i), -1) for i in ids], dtype=np.int64)
+    # Sort by class then descending score, the first row of each class run is its best lesson
+    order = np.lexsort((-scores, class_ids))
+    firsts = order[np.r_[True, class_ids[order][1:] != class_ids[order][:-1]]]
+    firsts = firsts[class_ids[firsts] >= 0]
+    firsts = firsts[np.argsort(-scores[firsts], kind='stable')]
+    return [(int(class_ids[j]), int(ids[j]), float(scores[j])) for j in firsts]
+
+
+## Concept indexes, scoped to a class id or None for every concept
+
+def build_concept_index(class_id=None):
+    """Loads the embedded concepts of a class, or of every class, into a new VectorIndex."""
+    from .models import Concept
+
+    concepts = Concept.objects.filter(embedding_data__isnull=False)
+    if class_id is not None:
+        concepts = concepts.filter(related_class_id=class_id)
+    return index_from_rows(concepts.values_list('id', 'embedding_data'), 'concept', compression=compression_from_settings(), fetch_vectors=fetch_concept_vectors)
+
+
+def fetch_concept_vectors(concept_ids):
+    """Loads the full precision embeddings of the given concepts."""
+    from .models import Concept
+
+    return vectors_by_id(Concept.objects.filter(id__in=concept_ids).values_list('id', 'embedding_data'))
+
+
+concept_indexes = IndexRegistry(build_concept_index, name='concepts')
+
+
+def update_concept_vector(concept_id, class_id, vector):
+    """Keeps the cached concept indexes in sync after a concept is saved."""
+    concept_indexes.update(concept_id, {None, class_id}, vector)
+
+
+def remove_concept_vector(concept_id, class_id=None):
+    """Removes a concept from every cached concept index."""
+    concept_indexes.remove(concept_id, {None, class_id})
+
+
+def match_concepts(query_vectors, class_id=None, top_k=5):
+    """Returns the top_k (concept id, score) pairs for each query vector, optionally limited to one class."""
+    return concept_indexes.get(class_id).search_many(query_vectors, top_k=top_k)
+
+
+## Transcript passage indexes, scoped to a lesson id
+
+def build_lesson_passage_index(lesson_id):
+    """Loads the embedded transcript passages of a lesson into a new VectorIndex."""
+    from .models import TranscriptPassage
+
+    rows = TranscriptPassage.objects.filter(lesson_id=lesson_id, vector_data__isnull=False).values_list('id', 'vector_data')
+    return index_from_rows(rows, 'passage')
+
+
+passage_indexes = IndexRegistry(build_lesson_passage_index, name='passages')
+
+
+def search_lesson_passages(lesson_id, query_vector, top_k=8):
+    """Returns the top_k (passage id, score) pairs of a lesson's transcripts."""
+    return passage_indexes.get(lesson_id).search(query_vector, top_k=top_k)
+
+
+def invalidate_lesson_passage_index(lesson_id):
+    """Drops the cached passage index of a lesson after its passages were rewritten in bulk."""
+    passage_indexes.invalidate(lesson_id)
+
+
+## Book table of contents indexes, scoped to a book id
+
+def build_book_section_index(book_id):
+    """Loads the embedded table of contents entries of a book into a new VectorIndex."""
+    from .models import BookSection
+
+    rows = BookSection.objects.filter(book_id=book_id, vector_data__isnull=False).values_list('id', 'vector_data')
+    return index_from_rows(rows, 'book section')
+
+
+section_indexes = IndexRegistry(build_book_section_index, name='book_sections')
+
+
+def search_book_sections(book_id, query_vector, top_k=2):
+    """Returns the top_k (section id, score) pairs of a book's table of contents."""
+    return section_indexes.get(book_id).search(query_vector, top_k=top_k)
+
+
+def invalidate_book_section_index(book_id):
+    """Drops the cached table of contents index of a book after its sections were rewritten in bulk."""
+    section_indexes.invalidate(book_id)
+
+
+## Chat answer cache indexes, scoped to (lesson id, class id, super search)
+
+def build_answer_index(scope):
+    """Loads the cached chat questions of one scope into a new VectorIndex."""
+    from .models import CachedAnswer
+
+    lesson_id, class_id, super_search = scope
+    rows = CachedAnswer.objects.filter(lesson_id=lesson_id, related_class_id=class_id, super_search=super_search, vector_data__isnull=False)
+    return index_from_rows(rows.values_list('id', 'vector_data'), 'cached answer')
+
+
+answer_indexes = IndexRegistry(build_answer_index, name='answers')
+
+
+## Lesson similarity graph
+
+def lesson_graph_settings():
+    """Returns settings.LESSON_GRAPH with defaults filled in."""
+    config = {
+        'NEIGHBORS': 10,
+        'BLOCK_ROWS': 1024,
+        'INCREMENTAL': True,
+    }
+    config.update(getattr(settings, 'LESSON_GRAPH', {}))
+    return config
+
+
+def knn_graph(ids, vectors, k=10, block_rows=1024):
+    """
+    Computes the k most similar other rows of every row by cosine similarity.
+
+    The vectors are normalized once and multiplied against themselves block_rows rows at a time, so memory stays
+    at block_rows * len(ids) scores whatever the number of lessons. Returns (neighbor ids, scores), both of shape
+    (len(ids), min(k, len(ids) - 1)) and ordered from most to least similar.
+    """
+    ids = np.asarray(ids, dtype=np.int64)
+    k = min(k, len(ids) - 1)
+    if k <= 0:
+        return np.zeros((len(ids), 0), dtype=np.int64), np.zeros((len(ids), 0), dtype=np.float32)
+    matrix = normalize_rows(vectors)
+    neighbors = np.empty((len(ids), k), dtype=np.int64)
+    neighbor_scores = np.empty((len(ids), k), dtype=np.float32)
+    for start in range(0, len(ids), block_rows):
+        block = matrix[start:start + block_rows] @ matrix.T
+        rows = np.arange(block.shape[0])
+        block[rows, rows + start] = -np.inf  # A lesson is not its own neighbor
+        columns = top_k_columns(block, k)
+        neighbors[start:start + block.shape[0]] = ids[columns]
+        neighbor_scores[start:start + block.shape[0]] = np.take_along_axis(block, columns, axis=1)
+    return neighbors, neighbor_scores
+
+
+def lesson_similarities(lesson_id, vector):
+    """Scores a lesson vector against every other lesson of the cached global lesson index, returns (ids, scores)."""
+    ids, scores = lesson_indexes.get(None).score_all(vector)
+    keep = ids != lesson_id
+    return ids[keep], scores[keep]
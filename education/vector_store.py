@@ -0,0 +1,350 @@
+import contextlib
+import json
+import os
+import shutil
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: builds are then only serialized within the process
+    fcntl = None
+
+import numpy as np
+from django.conf import settings
+
+from .vector_index import compression_from_settings, normalize_rows, top_k_columns
+
+
+def vector_store_settings():
+    """Returns settings.VECTOR_STORE with defaults filled in."""
+    config = {
+        'BACKEND': 'pinecone',
+        'PINECONE_INDEX': 'websiteindex',
+        'PINECONE_POOL_THREADS': 30,
+        'LOCAL_ROOT': os.path.join(settings.MEDIA_ROOT, 'vector_store'),
+        'LOCAL_NPROBE': 8,
+    }
+    config.update(getattr(settings, 'VECTOR_STORE', {}))
+    return config
+
+
+class PineconeVectorStore:
+    """Book chunk vectors kept in the remote Pinecone index, one namespace per book. The client is created on first use."""
+
+    def __init__(self, api_key=None, index_name='websiteindex', pool_threads=30):
+        self.api_key = api_key or os.getenv("PINECONE_API_KEY")
+        self.index_name = index_name
+        self.pool_threads = pool_threads
+        self._index = None
+        self._lock = threading.Lock()
+
+    @property
+    def index(self):
+        if self._index is None:
+            with self._lock:
+                if self._index is None:
+                    from pinecone import Pinecone
+                    self._index = Pinecone(api_key=self.api_key, pool_threads=self.pool_threads).Index(self.index_name)
+        return self._index
+
+    def upsert(self, namespace, vectors, batch_size=100):
+        """Upserts (id, values, metadata) tuples in parallel batches and waits for every batch to be acknowledged."""
+        vectors = list(vectors)
+        requests = [
+            self.index.upsert(vectors=vectors[start:start + batch_size], async_req=True, namespace=namespace)
+            for start in range(0, len(vectors), batch_size)
+        ]
+        return sum(request.get().upserted_count for request in requests)
+
+    def build(self, namespace):
+        """Pinecone indexes upserts itself, nothing to do."""
+
+    def query(self, namespace, vector, top_k=5, include_metadata=True):
+        """Returns the top_k matches of a namespace as dicts with id, score and metadata."""
+        results = self.index.query(vector=list(map(float, vector)), top_k=top_k, include_metadata=include_metadata, namespace=namespace)
+        return [{"id": match["id"], "score": float(match["score"]), "metadata": match.get("metadata") or {}} for match in results['matches']]
+
+    def delete(self, namespace, ids):
+        """Deletes vectors by id from a namespace."""
+        ids = list(ids)
+        for start in range(0, len(ids), 1000):
+            self.index.delete(ids=ids[start:start + 1000], namespace=namespace)
+
+    def delete_namespace(self, namespace):
+        self.index.delete(delete_all=True, namespace=namespace)
+
+    def namespaces(self):
+        """Returns the names of every namespace in the index."""
+        return list(self.index.describe_index_stats()['namespaces'].keys())
+
+
+class LocalVectorStore:
+    """
+    Book chunk vectors kept on disk under root, one IVF index per namespace.
+
+    Each namespace directory holds the normalized float32 vectors sorted by inverted list (vectors.npy), the list
+    centroids and offsets, and the ids and metadata in the same order. Arrays are memory-mapped the first time a
+    namespace is queried. Upserts are appended to a staging area and folded into the index by build(), which only
+    the book upload calls, so ingesting a book only keeps one batch in memory at a time and queries keep reading the
+    last built index meanwhile. Upserts and builds of a namespace hold a file lock, so processes never build
+    concurrently nor stage vectors a running build would drop.
+    When settings.EMBEDDING_COMPRESSION is enabled, the inverted lists are scanned over compressed codes and
+    the candidates are rescored against the memory-mapped full vectors.
+    """
+
+    BRUTE_FORCE_LIMIT = 2000  # Below this many vectors a single list is scanned exhaustively
+    KMEANS_ITERATIONS = 10
+    KMEANS_SAMPLE = 20000
+
+    def __init__(self, root, nprobe=8, compression=None):
+        self.root = root
+        self.nprobe = nprobe
+        self.compression = compression
+        self._loaded = {}
+        self._lock = threading.RLock()
+
+    def _path(self, namespace, *parts):
+        if not namespace or os.sep in namespace or namespace.startswith('.'):
+            raise ValueError(f"Invalid namespace: {namespace!r}")
+        return os.path.join(self.root, namespace, *parts)
+
+    ## Writing
+
+    @contextlib.contextmanager
+    def _namespace_lock(self, namespace):
+        """Holds the namespace's lock file under root/.locks, shared by every process using this store."""
+        self._path(namespace)  # Rejects invalid namespaces before they name a lock file
+        lock_dir = os.path.join(self.root, '.locks')
+        os.makedirs(lock_dir, exist_ok=True)
+        with self._lock, open(os.path.join(lock_dir, f"{namespace}.lock"), 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def upsert(self, namespace, vectors, batch_size=None):
+        """Stages (id, values, metadata) tuples for the next build, returns how many were staged."""
+        staged_dir = self._path(namespace, 'staged')
+        count = 0
+        with self._namespace_lock(namespace):
+            os.makedirs(staged_dir, exist_ok=True)
+            with open(os.path.join(staged_dir, 'vectors.f32'), 'ab') as vector_file, open(os.path.join(staged_dir, 'rows.jsonl'), 'a', encoding='utf-8') as row_file:
+                for item_id, values, metadata in vectors:
+                    vector_file.write(np.asarray(values, dtype='<f4').tobytes())
+                    row_file.write(json.dumps({"id": str(item_id), "metadata": metadata or {}}) + "\n")
+                    count += 1
+        return count
+
+    def delete(self, namespace, ids):
+        """Removes vectors by id and rebuilds the namespace."""
+        self.build(namespace, exclude=set(map(str, ids)))
+
+    def delete_namespace(self, namespace):
+        with self._namespace_lock(namespace):
+            self._delete_namespace(namespace)
+
+    def _delete_namespace(self, namespace):
+        self._loaded.pop(namespace, None)
+        shutil.rmtree(self._path(namespace), ignore_errors=True)
+
+    def _read_staged(self, namespace):
+        staged_dir = self._path(namespace, 'staged')
+        rows_path = os.path.join(staged_dir, 'rows.jsonl')
+        if not os.path.exists(rows_path):
+            return [], [], None
+        with open(rows_path, encoding='utf-8') as row_file:
+            rows = [json.loads(line) for line in row_file if line.strip()]
+        vectors = np.fromfile(os.path.join(staged_dir, 'vectors.f32'), dtype='<f4')
+        if not rows:
+            return [], [], None
+        vectors = vectors[:len(vectors) - len(vectors) % len(rows)].reshape(len(rows), -1)
+        return [row['id'] for row in rows], [row['metadata'] for row in rows], vectors
+
+    def build(self, namespace, exclude=None):
+        """Merges staged upserts into the namespace index and rewrites it, later upserts of an id win."""
+        with self._namespace_lock(namespace):
+            current = self._open(namespace)
+            staged_ids, staged_metadata, staged_vectors = self._read_staged(namespace)
+            if not staged_ids and not exclude:
+                return
+
+            merged = {}  # id -> (source, row)
+            if current is not None:
+                for row, item_id in enumerate(current['ids']):
+                    merged[item_id] = ('current', row)
+            for row, item_id in enumerate(staged_ids):
+                merged[item_id] = ('staged', row)
+            for item_id in exclude or ():
+                merged.pop(item_id, None)
+
+            ids = list(merged)
+            current_metadata = self._metadata(namespace, current) if current is not None else None
+            if ids:
+                vectors = np.vstack([
+                    current['vectors'][row] if source == 'current' else staged_vectors[row]
+                    for source, row in merged.values()
+                ])
+                metadata = [
+                    current_metadata[row] if source == 'current' else staged_metadata[row]
+                    for source, row in merged.values()
+                ]
+                self._write(namespace, ids, normalize_rows(vectors), metadata)
+            else:
+                self._delete_namespace(namespace)
+                return
+            self._loaded.pop(namespace, None)
+
+    def _train_centroids(self, vectors, nlist):
+        rng = np.random.default_rng(0)
+        sample = vectors[rng.choice(len(vectors), size=min(len(vectors), self.KMEANS_SAMPLE), replace=False)]
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+        for _ in range(self.KMEANS_ITERATIONS):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = sample[assignment == c]
+                if len(members):
+                    centroids[c] = members.mean(axis=0)
+            centroids = normalize_rows(centroids)
+        return centroids
+
+    def _write(self, namespace, ids, vectors, metadata):
+        nlist = 1 if len(ids) < self.BRUTE_FORCE_LIMIT else min(1024, int(np.sqrt(len(ids))))
+        if nlist > 1:
+            centroids = self._train_centroids(vectors, nlist)
+            assignment = np.concatenate([np.argmax(vectors[start:start + 4096] @ centroids.T, axis=1) for start in range(0, len(vectors), 4096)])
+        else:
+            centroids = normalize_rows(vectors.mean(axis=0))
+            assignment = np.zeros(len(ids), dtype=np.int64)
+        order = np.argsort(assignment, kind='stable')
+        offsets = np.searchsorted(assignment[order], np.arange(nlist + 1))
+
+        final_dir = self._path(namespace)
+        build_dir = final_dir + '.building'
+        shutil.rmtree(build_dir, ignore_errors=True)
+        os.makedirs(build_dir)
+        np.save(os.path.join(build_dir, 'vectors.npy'), vectors[order])
+        np.save(os.path.join(build_dir, 'centroids.npy'), centroids.astype(np.float32))
+        np.save(os.path.join(build_dir, 'list_offsets.npy'), offsets.astype(np.int64))
+        if self.compression is not None:
+            codes, scales = self.compression.encode(vectors[order])
+            np.save(os.path.join(build_dir, 'codes.npy'), codes)
+            if scales is not None:
+                np.save(os.path.join(build_dir, 'scales.npy'), scales)
+        with open(os.path.join(build_dir, 'ids.json'), 'w', encoding='utf-8') as f:
+            json.dump([ids[i] for i in order], f)
+        with open(os.path.join(build_dir, 'metadata.json'), 'w', encoding='utf-8') as f:
+            json.dump([metadata[i] for i in order], f)
+        with open(os.path.join(build_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+            json.dump({"count": len(ids), "dimensions": int(vectors.shape[1]), "nlist": nlist, "compressed": self.compression is not None}, f)
+
+        old_dir = final_dir + '.old'
+        shutil.rmtree(old_dir, ignore_errors=True)
+        if os.path.isdir(final_dir):
+            os.replace(final_dir, old_dir)
+        os.replace(build_dir, final_dir)
+        shutil.rmtree(old_dir, ignore_errors=True)
+
+    ## Reading
+
+    def _open(self, namespace):
+        """Memory-maps a namespace index, returns None if it was never built."""
+        manifest_path = self._path(namespace, 'manifest.json')
+        try:
+            modified = os.stat(manifest_path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        loaded = self._loaded.get(namespace)
+        # Another process may have rebuilt the namespace since it was mapped
+        if loaded is not None and loaded['modified'] == modified:
+            return loaded
+        with self._lock:
+            with open(manifest_path, encoding='utf-8') as f:
+                manifest = json.load(f)
+            with open(self._path(namespace, 'ids.json'), encoding='utf-8') as f:
+                ids = json.load(f)
+            loaded = {
+                'manifest': manifest,
+                'modified': modified,
+                'ids': ids,
+                'vectors': np.load(self._path(namespace, 'vectors.npy'), mmap_mode='r'),
+                'centroids': np.load(self._path(namespace, 'centroids.npy')),
+                'offsets': np.load(self._path(namespace, 'list_offsets.npy')),
+                'codes': None,
+                'scales': None,
+                '_metadata': None,
+            }
+            if manifest.get('compressed') and self.compression is not None:
+                loaded['codes'] = np.load(self._path(namespace, 'codes.npy'), mmap_mode='r')
+                scales_path = self._path(namespace, 'scales.npy')
+                loaded['scales'] = np.load(scales_path) if os.path.exists(scales_path) else None
+            self._loaded[namespace] = loaded
+            return loaded
+
+    def _metadata(self, namespace, loaded):
+        if loaded['_metadata'] is None:
+            with open(self._path(namespace, 'metadata.json'), encoding='utf-8') as f:
+                loaded['_metadata'] = json.load(f)
+        return loaded['_metadata']
+
+    def query(self, namespace, vector, top_k=5, include_metadata=True):
+        """Returns the top_k matches of the last build of a namespace as dicts with id, score and metadata."""
+        loaded = self._open(namespace)
+        if loaded is None or top_k <= 0:
+            return []
+
+        query = normalize_rows(vector)
+        centroid_scores = query @ loaded['centroids'].T
+        lists = top_k_columns(centroid_scores, self.nprobe)[0]
+        offsets = loaded['offsets']
+        rows = np.concatenate([np.arange(offsets[c], offsets[c + 1]) for c in lists])
+        if not len(rows):
+            return []
+
+        if loaded['codes'] is not None:
+            codes = np.asarray(loaded['codes'][rows], dtype=np.float32)
+            scores = self.compression.prepare(query) @ codes.T
+            if loaded['scales'] is not None:
+                scores = scores * loaded['scales'][rows]
+            rows = rows[top_k_columns(scores, top_k * self.compression.rescore_factor)[0]]
+        scores = (query @ np.asarray(loaded['vectors'][rows]).T)[0]
+        best = top_k_columns(scores.reshape(1, -1), top_k)[0]
+
+        metadata = self._metadata(namespace, loaded) if include_metadata else None
+        return [
+            {"id": loaded['ids'][rows[i]], "score": float(scores[i]), "metadata": metadata[rows[i]] if metadata else {}}
+            for i in best
+        ]
+
+    def namespaces(self):
+        """Returns the names of every namespace that has been built or has staged upserts."""
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(
+            name for name in os.listdir(self.root)
+            if not name.endswith(('.building', '.old'))
+            and (os.path.exists(os.path.join(self.root, name, 'manifest.json')) or os.path.isdir(os.path.join(self.root, name, 'staged')))
+        )
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_vector_store(backend=None):
+    """Returns the shared vector store for a backend, settings.VECTOR_STORE['BACKEND'] by default."""
+    config = vector_store_settings()
+    backend = backend or config['BACKEND']
+    with _stores_lock:
+        store = _stores.get(backend)
+        if store is None:
+            if backend == 'pinecone':
+                store = PineconeVectorStore(index_name=config['PINECONE_INDEX'], pool_threads=config['PINECONE_POOL_THREADS'])
+            elif backend == 'local':
+                store = LocalVectorStore(config['LOCAL_ROOT'], nprobe=config['LOCAL_NPROBE'], compression=compression_from_settings())
+            else:
+                raise ValueError(f"Unknown vector store backend: {backend}")
+            _stores[backend] = store
+    return store
@@ -13,9 +13,9 @@ from rest_framework import generics, status, viewsets
 from rest_framework.response import Response
 
 from education.forms import LessonForm, TranscriptionUploadForm
-from education.utils import extract_the_most_likely_title, generate_chat_completion, get_gpt_response_with_context, query_pinecone, transcribe_audio
+from education.utils import generate_chat_completion, get_gpt_response_with_context, query_pinecone, transcribe_audio
 # import openai
-from .models import ChatSession, Class, Concept, Schedule, Book, Lesson, Problem, StudySheet, Template, Tool, Transcript, Notes, Assignment, ProblemSet, Test, Message
+from .models import CachedAnswer, ChatSession, Class, Concept, Schedule, Book, Lesson, Problem, StudySheet, Template, Tool, Transcript, Notes, Assignment, ProblemSet, Test, Message, LessonJob, answer_cache_settings
 from rest_framework.decorators import api_view
 from django.db.models import Count
 from .serializers import (ClassSerializer, ScheduleSerializer, BookSerializer, 
@@ -31,11 +31,15 @@ from django.contrib.admin.views.decorators import staff_member_required
 
 
 from .forms import TemplateSelectionForm, UploadPDFForm
-from .utils import calculate_cosine_distance, cleanup_processed_files, cosine_similarity, detect_question_marker, extract_pages_as_images, create_pdf_from_pages, extract_text_from_pdf, generate_embedding, interact_with_gpt
+from .utils import calculate_cosine_distance, cleanup_processed_files, detect_question_marker, extract_pages_as_images, create_pdf_from_pages, extract_text_from_pdf, generate_embedding, generate_embeddings, interact_with_gpt
+from .jobs import job_queue_settings
+from .retrieval import retrieve_chat_context
+from .vector_index import match_concepts
 from .utils import generate_study_guide as generate_study_guide_content
 
-from openai import AuthenticationError, OpenAI  # Import the OpenAI class
-client = OpenAI()
+from openai import AuthenticationError
+from webPerson.llm_client import get_client
+client = get_client()
 
 
 @login_required
@@ -106,11 +110,20 @@ def lesson_dashboard(request, lesson_slug):
     lesson_transcripts = Transcript.objects.filter(related_lesson=selected_lesson)
     lesson_notes = Notes.objects.filter(related_lesson=selected_lesson)
     lesson_problems = Problem.objects.filter(related_lessons=selected_lesson).prefetch_related('tools')
-    lesson_concepts = Concept.objects.filter(related_lesson=selected_lesson)
-    lecture_summary = selected_lesson.get_lecture_summary() if selected_lesson.transcripts.filter(source='Lecture').exists() else "No summary available"
-    lecture_exists = selected_lesson.transcripts.filter(source='Lecture').exists()
+    lesson_concepts = Concept.for_lesson(selected_lesson)
+    lesson_job = selected_lesson.jobs.order_by('-created_at').first()
+    lecture_transcript = selected_lesson.transcripts.filter(source='Lecture').first()
+    if lecture_transcript is None:
+        lecture_summary = "No summary available"
+    elif lesson_job is not None and lesson_job.status in (LessonJob.PENDING, LessonJob.RUNNING):
+        # The queued job summarizes the lecture, don't pay for a second summary in this request
+        lecture_summary = lecture_transcript.summarized or "No summary available"
+    else:
+        lecture_summary = selected_lesson.get_lecture_summary()
+    lecture_exists = lecture_transcript is not None
     student_exists = selected_lesson.transcripts.filter(source='Student').exists()
     notes_exist = lesson_notes.exists()  # Check if there are any notes
+    related_lessons = selected_lesson.related_lessons()
 
     try:
         related_book = selected_lesson.related_class.book if selected_lesson.related_class.book else None
@@ -125,10 +138,13 @@ def lesson_dashboard(request, lesson_slug):
         page_number = selected_lesson.chapter_page_number
     elif related_book and related_book.index_contents and lecture_summary not in [None, "No summary available"]:
         try:
-            section_title, page_number = extract_the_most_likely_title(book_index=related_book.index_contents, lesson_summary=lecture_summary)
-            selected_lesson.chapter_title = section_title
-            selected_lesson.chapter_page_number = int(page_number)
-            selected_lesson.save()
+            # Matched against the book's embedded table of contents, the chat model is only asked when unsure
+            section_title, page_number = selected_lesson.match_chapter(related_book, lecture_summary=lecture_summary)
+            if section_title and page_number is not None:
+                selected_lesson.chapter_title = section_title
+                selected_lesson.chapter_page_number = page_number
+                # Only the chapter columns, a full save would overwrite fields the lesson job is writing
+                Lesson.objects.filter(pk=selected_lesson.pk).update(chapter_title=section_title, chapter_page_number=page_number)
         except Exception as e:
             print("Error extracting section title and page number", e)
             section_title = None
@@ -145,6 +161,8 @@ def lesson_dashboard(request, lesson_slug):
         'lecture_exists': lecture_exists,
         'student_exists': student_exists,
         'notes_exist': notes_exist,  # Add notes_exist to context
+        'related_lessons': related_lessons,
+        'lesson_job': lesson_job,
         'section_title': section_title,
         'page_number': page_number,
     }
@@ -234,13 +252,35 @@ def add_transcriptions_view(request, lesson_slug):
                     tt.content = transcript_text
                     tt.save()
 
-                lesson.save() # Save the lesson to update the last updated timestamp and begin the analysis process and embedding
+                process_lesson(lesson)
             return redirect('lesson_dashboard', lesson_slug=lesson.slug)
     else:
         form = TranscriptionUploadForm()
     
     return render(request, 'education/add_transcriptions.html', {'form': form, 'lesson': lesson})
 
+def process_lesson(lesson):
+    """Queues the summaries, analysis, embeddings and concepts of a lesson for the run_workers command and returns the job.
+    With settings.JOB_QUEUE['ENABLED'] off they run here instead, by saving the lesson and indexing its lecture
+    transcripts, and None is returned."""
+    if job_queue_settings()['ENABLED']:
+        return LessonJob.enqueue(lesson)
+    lesson.save() # Save the lesson to update the last updated timestamp and begin the analysis process and embedding
+    for transcript in lesson.transcripts.filter(source='Lecture'):
+        try:
+            transcript.index_passages()
+        except Exception as e:
+            print(f"Error indexing transcript passages: {e}")
+    return None
+
+@login_required
+@require_http_methods(["GET"])
+def lesson_job_status(request, lesson_slug):
+    """Status of the latest processing job of a lesson, polled by the lesson page while it is processed."""
+    lesson = get_object_or_404(Lesson, slug=lesson_slug)
+    job = lesson.jobs.order_by('-created_at').first()
+    return JsonResponse({'lesson': lesson.slug, 'analyzed': lesson.analyzed, 'job': job.as_dict() if job else None})
+
 @api_view(['POST'])
 def upload_and_transcribe(request):
     """
@@ -294,13 +334,14 @@ def upload_and_transcribe(request):
         transcription_text = transcribe_audio(audio_file)
 
         # Create a Transcript object
-        transcript = Transcript.objects.create(
+        transcript = Transcript(
             content=transcription_text,
             related_lesson=lesson,
             source=source
         )
-        lesson.save() # Save the lesson to update the last updated timestamp and begin the analysis process and embedding
-        return Response({'transcription': transcription_text, 'source': source, 'lesson':lesson.slug }, status=200)
+        transcript.save()
+        job = process_lesson(lesson)
+        return Response({'transcription': transcription_text, 'source': source, 'lesson':lesson.slug, 'job': job.as_dict() if job else None}, status=200)
     except AuthenticationError as e:
         return Response({'error': 'Authentication error.'}, status=401)
     except Exception as e:
@@ -341,6 +382,7 @@ def chat(request, class_slug=None, lesson_slug=None):
         new_session_created = False
         best_lessons_created = False
         best_lessons_final = []
+        retrieval_timings = {}
         if not message_text:
             return HttpResponseBadRequest("Message text is required.")
 
@@ -353,8 +395,26 @@ def chat(request, class_slug=None, lesson_slug=None):
         # Create a user message
         Message.objects.create(session=session, text=message_text, role='user')
 
+        # First questions about a lesson or class may be answered from the semantic answer cache
+        answer_cache_scope = None
+        cached_answer = None
+        question_vector = None
+        if new_session_created and (lesson_slug or class_slug) and answer_cache_settings()['ENABLED']:
+            scope_lesson = get_object_or_404(Lesson, slug=lesson_slug) if lesson_slug else None
+            scope_class = None if scope_lesson else get_object_or_404(Class, slug=class_slug)
+            try:
+                question_vector = generate_embedding(message_text)
+                answer_cache_scope = {'lesson': scope_lesson, 'related_class': scope_class, 'super_search': bool(super_search)}
+                cached_answer = CachedAnswer.lookup(question_vector, **answer_cache_scope)
+            except Exception as e:
+                print("Error looking up the answer cache", e)
+
         # Generate a response with context if any
-        if lesson_slug:
+        if cached_answer is not None:
+            response_text = cached_answer.answer
+            cached_lessons = Lesson.objects.in_bulk(cached_answer.sources.get('lessons', []))
+            best_lessons_final = [cached_lessons[lesson_id] for lesson_id in cached_answer.sources.get('lessons', []) if lesson_id in cached_lessons]
+        elif lesson_slug:
             lesson = get_object_or_404(Lesson, slug=lesson_slug)
             related_class = lesson.related_class
             
@@ -362,16 +422,20 @@ def chat(request, class_slug=None, lesson_slug=None):
                 enhanced_query = f"This chat is about the lesson '{lesson.title}' from the class '{related_class.name}', here is information related to this lesson and the student:\nSummary: {lesson.get_lecture_summary()}\n Gaps: {lesson.understanding_gaps}\n Strengths: {lesson.strengths_in_students_understanding}, Accuracy: {lesson.accuracy_of_information}\n Concepts: {lesson.comparison_of_key_concepts}.\nGiven this information, please answer the following question from the student:\n\"{message_text}\"\n"
                 if super_search:
                     try:
-                        book_slug = related_class.book.slug if related_class.book else None
-                        pinecone_result = query_pinecone(message_text, namespace=book_slug) if book_slug else query_pinecone(message_text)
-                        
+                        related_book = getattr(related_class, 'book', None)
+                        book_slug = related_book.slug if related_book else None
+                        retrieval = retrieve_chat_context(message_text, book_namespace=book_slug, search_all_books=not book_slug, lesson_class=related_class, query_vector=question_vector)
+                        retrieval_timings = retrieval.timings
+                        pinecone_result = retrieval.book_text
+
                         # print(f"DEBUG, related_class.book: {related_class.book}")
-                        enhanced_query += f"Most relevant paragraph from '{related_class.book.title+',the lessons book to the question' if book_slug else 'academic resources to the question'}': \"{pinecone_result}\"\n"
-                        
-                        b_lesson_2 = related_class.find_most_similar_lesson(message_text)
+                        if pinecone_result is not None:
+                            enhanced_query += f"Most relevant paragraph from '{related_book.title+',the lessons book to the question' if book_slug else 'academic resources to the question'}': \"{pinecone_result}\"\n"
+
+                        b_lesson_2 = retrieval.lesson
                         if b_lesson_2:
                             best_lessons_final.append(b_lesson_2)
-                            enhanced_query += f"Most relevant lesson from this class that could answer the question: {b_lesson_2.title}:\n{b_lesson_2.get_lecture_summary()}\n"
+                            enhanced_query += f"Most relevant lesson from this class that could answer the question: {b_lesson_2.title}, the most relevant parts of its lecture:\n{retrieval.lesson_context}\n"
                             print(f"DEBUG, best_lesson_2: {b_lesson_2.title}")
                     except Exception as e:
                         print("Error querying Pinecone", e)
@@ -382,15 +446,19 @@ def chat(request, class_slug=None, lesson_slug=None):
                 enhanced_query = ""
                 if super_search:
                     try:
-                        book_slug = related_class.book.slug if related_class.book else None
-                        pinecone_result = query_pinecone(message_text, namespace=book_slug) if book_slug else query_pinecone(message_text)
+                        related_book = getattr(related_class, 'book', None)
+                        book_slug = related_book.slug if related_book else None
+                        retrieval = retrieve_chat_context(message_text, book_namespace=book_slug, search_all_books=not book_slug, lesson_class=related_class, query_vector=question_vector)
+                        retrieval_timings = retrieval.timings
+                        pinecone_result = retrieval.book_text
                         # print(f"DEBUG, related_class.book: {related_class.book.title}")
-                        enhanced_query += f"Most relevant paragraph from '{related_class.book.title +',the lessons book to the question' if book_slug else 'academic resources to the question'}': \"{pinecone_result}\"\n"
-                        b_lesson_2 = related_class.find_most_similar_lesson(message_text)
+                        if pinecone_result is not None:
+                            enhanced_query += f"Most relevant paragraph from '{related_book.title +',the lessons book to the question' if book_slug else 'academic resources to the question'}': \"{pinecone_result}\"\n"
+                        b_lesson_2 = retrieval.lesson
                         if b_lesson_2:
                             best_lessons_final.append(b_lesson_2)
                         
-                            enhanced_query += f"Most relevant lesson from this class that could answer the last question: {b_lesson_2.title}:\n{b_lesson_2.get_lecture_summary()}\n"
+                            enhanced_query += f"Most relevant lesson from this class that could answer the last question: {b_lesson_2.title}, the most relevant parts of its lecture:\n{retrieval.lesson_context}\n"
                     except Exception as e:
                         print("Error querying Pinecone", e)
                     enhanced_query += f"Given all of the contextual information above, please answer the following question from the student:\n\"{message_text}\""
@@ -403,37 +471,26 @@ def chat(request, class_slug=None, lesson_slug=None):
             class_instance = get_object_or_404(Class, slug=class_slug)
             if new_session_created:
                 if super_search: ## if super search then we need to enhance the query with the most accurate material from both pinecone related to the book of this class and the most accurate lesson from this class, specifically the name of the lesson and its lecture transcript summary
-                    pinecone_result = None
-                    try:
-                        ##getting the book slug to query as a namespace
-                        related_book_slug = class_instance.book.slug
-                        if isinstance(related_book_slug, str):
-                            pinecone_result = query_pinecone(message_text, namespace=related_book_slug)
-                        else:
-                            pinecone_result = None
-                    except Exception as e:
-                        print("Error querying pinecone", e)
-                        pinecone_result = None
-                    ##now that we have pinecone, either none or a str lets get the lesson
-                    b_lesson = None
-                    try:
-                        b_lesson: Lesson = class_instance.find_most_similar_lesson(message_text)
-                        if b_lesson:
-                            best_lessons_final.append(b_lesson)
-                    except Exception as e:
-                        print("Error finding best lesson", e)
-                        b_lesson = None
+                    ##getting the book slug to query as a namespace, the book and lesson searches share one embedding and run concurrently
+                    related_book = getattr(class_instance, 'book', None)
+                    related_book_slug = related_book.slug if related_book else None
+                    retrieval = retrieve_chat_context(message_text, book_namespace=related_book_slug if isinstance(related_book_slug, str) else None, lesson_class=class_instance, query_vector=question_vector)
+                    retrieval_timings = retrieval.timings
+                    pinecone_result = retrieval.book_text
+                    b_lesson: Lesson = retrieval.lesson
+                    if b_lesson:
+                        best_lessons_final.append(b_lesson)
                     ##Now we have the pinecone result and the best lesson, we can now enhance the query with this information but if we miss any of them we just enhance with the ones we do have
                     enhanced_query = None
                     if pinecone_result is not None and b_lesson is not None:
-                        enhanced_query = f"The user is messaging you with regards to a university class, this is the name of the class {class_instance.name} and it comes from this book {class_instance.book.title}.\nFor context, here is the most relevant 500 word long paragraph from the book, likley related to the question,you may use it as a base to answer the question or support it if relevant:\nContext:\"{pinecone_result}\"\nThe most related lesson tittle to the question from this class is {b_lesson.title}, and its summary is:\n{b_lesson.get_lecture_summary()}\nPlease answer this user question given the information above and your knowledge:\n\"{message_text}\""
+                        enhanced_query = f"The user is messaging you with regards to a university class, this is the name of the class {class_instance.name} and it comes from this book {class_instance.book.title}.\nFor context, here is the most relevant 500 word long paragraph from the book, likley related to the question,you may use it as a base to answer the question or support it if relevant:\nContext:\"{pinecone_result}\"\nThe most related lesson tittle to the question from this class is {b_lesson.title}, and the most relevant parts of its lecture are:\n{retrieval.lesson_context}\nPlease answer this user question given the information above and your knowledge:\n\"{message_text}\""
                     elif pinecone_result is not None and b_lesson is None:
                         enhanced_query = f"The user is messaging you with regards to a university class, this is the name of the class {class_instance.name} and it comes from this book {class_instance.book.title}.\nFor context, here is the most relevant 500 word long paragraph from the book, likley related to the question,you may use it as a base to answer the question or support it if relevant:\nContext:\"{pinecone_result}\"\nPlease answer this user question given that:\n\"{message_text}\""
                     elif pinecone_result is None and b_lesson is not None:
-                        enhanced_query = f"The user is messaging you with regards to a university class, this is the name of the class {class_instance.name}.\nFor context, t he most related lesson tittle to the question from this class is {b_lesson.title}, and its summary is:\n{b_lesson.get_lecture_summary()}\nPlease answer this user question given the information above and your knowledge:\n\"{message_text}\""
+                        enhanced_query = f"The user is messaging you with regards to a university class, this is the name of the class {class_instance.name}.\nFor context, t he most related lesson tittle to the question from this class is {b_lesson.title}, and the most relevant parts of its lecture are:\n{retrieval.lesson_context}\nPlease answer this user question given the information above and your knowledge:\n\"{message_text}\""
                     else:## if all fails and we get two nones, lets try to do a easy super search of pinecone with no namespace within a try catch and if that fails then just a normal response text
                         try:
-                            pinecone_result = query_pinecone(message_text)
+                            pinecone_result = query_pinecone(message_text, query_vector=retrieval.query_vector)
                             enhanced_query = f"This is a system message from a RAG system, attached is the most relevant 500 word long paragraph from an academic book likely related to the question, use it as a base to answer the question or support it if relevant.\nContext:\"{pinecone_result}\"\nNow this is the original question from the user, please answer it accordingly now:\n\"{message_text}\""
                         except Exception as e:
                             print("Error enhancing query defaulting to normal search",e)
@@ -444,26 +501,15 @@ def chat(request, class_slug=None, lesson_slug=None):
                     response_text = get_gpt_response_with_context(session, enhanced_query, class_slug=class_slug)
             else:
                 if super_search:
-                    pinecone_result = None
-                    try:
-                        ##getting the book slug to query as a namespace
-                        related_book_slug = class_instance.book.slug
-                        if isinstance(related_book_slug, str):
-                            pinecone_result = query_pinecone(message_text, namespace=related_book_slug)
-                        else:
-                            pinecone_result = None
-                    except Exception as e:
-                        print("Error querying pinecone", e)
-                        pinecone_result = None
-                    ##now that we have pinecone, either none or a str lets get the lesson
-                    b_lesson = None
-                    try:
-                        b_lesson: Lesson = class_instance.find_most_similar_lesson(message_text)
-                        if b_lesson:
-                            best_lessons_final.append(b_lesson)
-                    except Exception as e:
-                        print("Error finding best lesson", e)
-                        b_lesson = None
+                    ##getting the book slug to query as a namespace, the book and lesson searches share one embedding and run concurrently
+                    related_book = getattr(class_instance, 'book', None)
+                    related_book_slug = related_book.slug if related_book else None
+                    retrieval = retrieve_chat_context(message_text, book_namespace=related_book_slug if isinstance(related_book_slug, str) else None, lesson_class=class_instance, query_vector=question_vector)
+                    retrieval_timings = retrieval.timings
+                    pinecone_result = retrieval.book_text
+                    b_lesson: Lesson = retrieval.lesson
+                    if b_lesson:
+                        best_lessons_final.append(b_lesson)
                     ##Now we have the pinecone result and the best lesson, we can now enhance the query with this information but if we miss any of them we just enhance with the ones we do have
                     enhanced_query = None
                     if pinecone_result is not None and b_lesson is not None:
@@ -474,7 +520,7 @@ def chat(request, class_slug=None, lesson_slug=None):
                         enhanced_query = f"The user is messaging you with regards to a university class, this is the name of the class {class_instance.name}.\nFor context, this is the name of the lesson and its lecture transcript summary:\n{b_lesson.title}:\n{b_lesson.interdisciplinary_connections}\n Strengths in student's understanding: {b_lesson.strengths_in_students_understanding}\n Understanding gaps: {b_lesson.understanding_gaps}\nPlease answer this user question given that:\n\"{message_text}\""
                     else:## if all fails and we get two nones, lets try to do a easy super search of pinecone with no namespace within a try catch and if that fails then just a normal response text
                         try:
-                            pinecone_result = query_pinecone(message_text)
+                            pinecone_result = query_pinecone(message_text, query_vector=retrieval.query_vector)
                             enhanced_query = f"This is a system message from a RAG system, attached is the most relevant 500 word long paragraph from an academic book likely related to the question, use it as a base to answer the question or support it if relevant.\nContext:\"{pinecone_result}\"\nNow this is the original question from the user, please answer it accordingly now:\n\"{message_text}\""
                         except Exception as e:
                             print("Error enhancing query defaulting to normal search",e)
@@ -491,15 +537,11 @@ def chat(request, class_slug=None, lesson_slug=None):
                     print("Enhanced query with pinecone result", enhanced_query)
                     ### Here as an extra we can find the most relevant lesson, from all classes and return the class and lesson to the user but only if first question. UPDATE: we look now at all classes and retrive the best lesson from each
                     if new_session_created: ##only run this if its the first question and it is a super search
-                        all_classes = Class.objects.all()
                         best_lessons = []
-                        for cclass in all_classes:
-                            try:
-                                b_lesson: Lesson = cclass.find_most_similar_lesson(message_text)
-                                if b_lesson:
-                                    best_lessons.append(b_lesson)
-                            except Exception as e:
-                                print("Error finding best lesson", e)
+                        try:
+                            best_lessons = Lesson.most_similar_per_class(message_text)
+                        except Exception as e:
+                            print("Error finding best lesson", e)
                         if best_lessons:
                             best_lessons_created = True
                             best_lessons_final = best_lessons ## we can then modify the return and front end to display this on the message as kind of like a suggestion that can be cliocked to take you to the lessons page
@@ -511,6 +553,12 @@ def chat(request, class_slug=None, lesson_slug=None):
             else:    
                 response_text = get_gpt_response_with_context(session, message_text)
 
+        if answer_cache_scope is not None and cached_answer is None and response_text:
+            try:
+                CachedAnswer.store(message_text, question_vector, response_text, sources={'lessons': [lesson.id for lesson in best_lessons_final]}, **answer_cache_scope)
+            except Exception as e:
+                print("Error storing the answer in the answer cache", e)
+
         # Create an assistant message
         Message.objects.create(session=session, text=response_text, role='assistant')
 
@@ -524,10 +572,22 @@ def chat(request, class_slug=None, lesson_slug=None):
         else:
             best_lessons_data = []
 
+        # Lessons of any class close to the matched lesson, read from the precomputed similarity graph
+        related_lessons_data = []
+        if best_lessons_final and not best_lessons_created:
+            related_lessons_data = [{
+                'title': lesson.title,
+                'class': lesson.related_class.name,
+                'url': reverse('lesson_dashboard', kwargs={'lesson_slug': lesson.slug})
+            } for lesson in best_lessons_final[0].related_lessons() if lesson not in best_lessons_final]
+
         return JsonResponse({
             'response': response_text,
             'session_id': session.id,
-            'best_lessons': best_lessons_data  # Add this line to include lesson details
+            'best_lessons': best_lessons_data,  # Add this line to include lesson details
+            'related_lessons': related_lessons_data,
+            'retrieval_timings': retrieval_timings,
+            'cached': cached_answer is not None,
         })
 
 @csrf_exempt
@@ -616,21 +676,17 @@ def process_assignment(request, assignment_id):
         question_text = json.loads(question_response).get('question', '')
         questions.append({'number': i, 'text': question_text, 'concepts': []})
 
-    # Get all concepts and their embeddings
-    all_concepts = Concept.objects.all()
-    for concept in all_concepts:
-        if not concept.embedding:
-            concept.embed()
-
-    # Calculate cosine similarity for each question
-    for question in questions:
-        question_embedding = generate_embedding(question['text'])
-        concept_similarities = []
-        for concept in all_concepts:
-            similarity = cosine_similarity(question_embedding, concept.embedding)
-            concept_similarities.append((concept.description, similarity))
-        concept_similarities.sort(key=lambda x: x[1], reverse=True)
-        question['concepts'] = [concept[0] for concept in concept_similarities[:5]]
+    # Match every question against the cached concept matrix at once, ?scope=class limits it to the assignment's class.
+    # Concepts without an embedding are skipped here, they are embedded on save or by the embed_concepts command.
+    class_id = assignment.related_class_id if request.GET.get('scope') == 'class' else None
+    answered = [question for question in questions if question['text']]
+    if answered:
+        question_embeddings = generate_embeddings([question['text'] for question in answered])
+        matches = match_concepts(question_embeddings, class_id=class_id, top_k=5)
+        matched_ids = {concept_id for question_matches in matches for concept_id, _ in question_matches}
+        descriptions = dict(Concept.objects.filter(id__in=matched_ids).values_list('id', 'description'))
+        for question, question_matches in zip(answered, matches):
+            question['concepts'] = [descriptions[concept_id] for concept_id, _ in question_matches if concept_id in descriptions]
 
     return JsonResponse({'questions': questions})
 
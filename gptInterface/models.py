@@ -1,9 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils.text import slugify
-from dotenv import load_dotenv
-import os
-import openai
+from webPerson.llm_client import get_client
 
 class ChatModel(models.Model):
     name = models.CharField(max_length=255, unique=True)
@@ -66,10 +64,7 @@ class ChatSession(models.Model):
     def set_title_from_messages(self):
         last_message = self.get_last_user_message()
         if last_message:
-            load_dotenv()
-            openai_key=os.getenv("OPENAI_API_KEY")
-            openai.api_key = openai_key
-            client = openai.OpenAI()
+            client = get_client()
 
             # Create chat completion using the OpenAI API Sample response ChatCompletionMessage(content='Hello! How can I assist you today?', role='assistant', function_call=None, tool_calls=None)
             try:
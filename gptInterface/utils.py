@@ -1,7 +1,6 @@
-from openai import OpenAI
+from webPerson.llm_client import get_client
 
-# Initialize your OpenAI client with your API key
-client = OpenAI()
+client = get_client()
 
 def transcribe_audio_with_whisper(filepath, language='en'):
     """
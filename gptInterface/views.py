@@ -10,12 +10,13 @@ import openai
 from .models import ChatModel, ChatSession, Message, Profile, Documenter
 from .utils import transcribe_audio_with_whisper, generate_chat_completion
 from django.conf import settings
+from webPerson.llm_client import get_client
 
 # Load environment variables from .env file
 load_dotenv()
 openai_key=os.getenv("OPENAI_API_KEY")
 openai.api_key = openai_key
-client = openai.OpenAI()
+client = get_client()
 
 from django.contrib.admin.views.decorators import staff_member_required
 
@@ -1,9 +1,7 @@
-import requests
-from tenacity import retry, stop_after_attempt, wait_random_exponential
+from webPerson import llm_client
 import json
 from openai import OpenAI
 import tiktoken, random
-import os
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -11,16 +9,10 @@ load_dotenv()
 
 
 
-@retry(wait=wait_random_exponential(multiplier=1, max=40), stop=stop_after_attempt(3))
 def gpt_chat(question, model="gpt-4o-mini"):
     """
     Sends a question to the GPT model
     """
-    api_key = os.getenv("OPENAI_API_KEY")
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": "Bearer " + api_key,
-    }
     
     messages = [{"role": "user", "content": question}]
     
@@ -28,7 +20,7 @@ def gpt_chat(question, model="gpt-4o-mini"):
     # print(df)
    
     try:
-        response = requests.post("https://api.openai.com/v1/chat/completions", headers=headers, json=json_data)
+        response = llm_client.post("chat/completions", json_data)
         assistant_message = response.json()["choices"][0]["message"]
         # print('ASSISTANT', assistant_message['content'])
         
@@ -42,16 +34,10 @@ def gpt_chat(question, model="gpt-4o-mini"):
 
 
 
-@retry(wait=wait_random_exponential(multiplier=1, max=40), stop=stop_after_attempt(3))
 def meal_recipe_creator(food_items, model="gpt-4o-mini"):
     """
     Sends a question to the GPT model
     """
-    api_key = os.getenv("OPENAI_API_KEY")
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": "Bearer " + api_key,
-    }
     prompt = f"Please provide a healthy and great recipes and meals given the following items avalible to you. YOU MUST INCLUDE FULL INSTRUCTIONS, and if followed the user would be able to recreate the meal, this is food for lunch. Here are the items, YOU MUST USE \"\\n\" WHEN YOU WANT TO ADD A LINE SPACE: \n {food_items}"
     # prompt = f"Please provide a healthy and great recipes and meals given the following items avalible to you. YOU MUST INCLUDE FULL INSTRUCTIONS, and if followed the user would be able to recreate the meal, this is food for lunch. Here are the items: \n {food_items}"
     messages = [{"role": "system", "content": "You are a recipe creator machine, you will always create accurate, tasty, and easy to follow, recepies given the avalible items."},
@@ -62,7 +48,7 @@ def meal_recipe_creator(food_items, model="gpt-4o-mini"):
     # print(df)
    
     try:
-        response = requests.post("https://api.openai.com/v1/chat/completions", headers=headers, json=json_data)
+        response = llm_client.post("chat/completions", json_data)
         assistant_message = response.json()["choices"][0]["message"]
         receipe = assistant_message['content']
         # print('ASSISTANT', assistant_message['content'])
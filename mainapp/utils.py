@@ -1,6 +1,5 @@
 from decimal import Decimal
-import requests
-from tenacity import retry, stop_after_attempt, wait_random_exponential
+from webPerson import llm_client
 import json
 from openai import OpenAI
 import tiktoken
@@ -98,13 +97,7 @@ def classify_transaction_simple(entry, set_misc=False):
         return None
 # gpt-3.5-turbo-0613
 # gpt-4-1106-preview
-@retry(wait=wait_random_exponential(multiplier=1, max=40), stop=stop_after_attempt(3))
 def classify_transaction_advanced(entry: FieldEntry, model="gpt-4o-mini", function_call='classify_entry'):
-    api_key = os.getenv("OPENAI_API_KEY")
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": "Bearer " + api_key,
-    }
     categories = """Transportation: This category encompasses all expenses related to transport. It includes fuel costs, public transportation fares, taxi fares, ride-sharing services like Uber, vehicle maintenance, and any other costs associated with getting from one place to another.
 Food: This category is for all food-related expenses. It includes solely grocery shopping or food non-takeout related purchases.
 Entertainment: This category covers expenses related to personal enjoyment and leisure activities. This can include movie tickets, recreational activities, hobbies, books, and any other expenses incurred for fun and relaxation.
@@ -150,7 +143,7 @@ Savings payments and transfers: This one is used for transactions that are just
             json_data.update({"function_call": {'name': function_call}})
     # print('FUNCTIONS:', functions)
     try:
-        response = requests.post("https://api.openai.com/v1/chat/completions", headers=headers, json=json_data)
+        response = llm_client.post("chat/completions", json_data)
         assistant_message = response.json()["choices"][0]["message"]
         # print('ASSISTANT', assistant_message['content'])
       
@@ -192,7 +185,6 @@ def update_budget_and_mark_entry(entry: FieldEntry):
             print('missed category!!')
             pass
 
-@retry(wait=wait_random_exponential(multiplier=1, max=40), stop=stop_after_attempt(3))
 def gpt_chat_and_execute_function_bank(question, context, model="gpt-4o-mini", function_call='auto'):
     """
     Sends a question to the GPT model and executes a function call based on the response.
@@ -207,11 +199,6 @@ def gpt_chat_and_execute_function_bank(question, context, model="gpt-4o-mini", f
     Returns:
     - str or None: The response from the GPT model or the output of the executed function, or None in case of an error.
     """
-    api_key = os.getenv("OPENAI_API_KEY")
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": "Bearer " + api_key,
-    }
     
     messages = [{"role": "user", "content": question}]
     if context:
@@ -229,7 +216,7 @@ def gpt_chat_and_execute_function_bank(question, context, model="gpt-4o-mini", f
         json_data.update({"function_call": function_call})
     # print('FUNCTIONS:', functions)
     try:
-        response = requests.post("https://api.openai.com/v1/chat/completions", headers=headers, json=json_data)
+        response = llm_client.post("chat/completions", json_data)
         assistant_message = response.json()["choices"][0]["message"]
         # print('ASSISTANT', assistant_message['content'])
         if assistant_message['content']:
@@ -263,7 +250,7 @@ def gpt_chat_and_execute_function_bank(question, context, model="gpt-4o-mini", f
             if function_responses:
                 
                 
-                follow_up_response = requests.post("https://api.openai.com/v1/chat/completions", headers=headers, json={"model": model, "messages": messages})
+                follow_up_response = llm_client.post("chat/completions", {"model": model, "messages": messages})
                 follow_up_message = follow_up_response.json()["choices"][0]["message"]
                 messages.append({"role": "assistant", "content": follow_up_message['content']})
                 context = messages
@@ -0,0 +1,164 @@
+import collections
+import os
+import threading
+import time
+
+import httpx
+import openai
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+def llm_client_settings():
+    """Returns settings.LLM_CLIENT with defaults filled in."""
+    config = {
+        'BASE_URL': 'https://api.openai.com/v1',
+        'MAX_CONNECTIONS': 20,
+        'MAX_KEEPALIVE_CONNECTIONS': 10,
+        'KEEPALIVE_EXPIRY': 30.0,
+        'CONNECT_TIMEOUT': 5.0,
+        'TIMEOUT': 600.0,
+        'MAX_RETRIES': 3,
+        'BACKOFF_FACTOR': 0.5,
+        'METRICS_WINDOW': 1000,
+    }
+    config.update(getattr(settings, 'LLM_CLIENT', {}))
+    return config
+
+
+RETRY_STATUSES = (408, 409, 429, 500, 502, 503, 504)
+
+
+class LLMMetrics:
+    """Request counters and a window of recent latencies per endpoint, shared by every OpenAI call of the process."""
+
+    def __init__(self, window=1000):
+        self._lock = threading.Lock()
+        self._window = window
+        self._endpoints = {}
+
+    def record(self, endpoint, status, seconds):
+        with self._lock:
+            stats = self._endpoints.setdefault(endpoint, {
+                'requests': 0, 'errors': 0, 'retryable': 0, 'latencies': collections.deque(maxlen=self._window),
+            })
+            stats['requests'] += 1
+            if status is None or status >= 400:
+                stats['errors'] += 1
+            if status is None or status in RETRY_STATUSES:
+                stats['retryable'] += 1
+            stats['latencies'].append(seconds)
+
+    def snapshot(self):
+        """Returns {endpoint: {requests, errors, retryable, p50, p95, max}}, latencies in seconds over the recent window."""
+        with self._lock:
+            endpoints = {endpoint: dict(stats, latencies=sorted(stats['latencies'])) for endpoint, stats in self._endpoints.items()}
+        result = {}
+        for endpoint, stats in endpoints.items():
+            latencies = stats.pop('latencies')
+            if latencies:
+                stats['p50'] = latencies[len(latencies) // 2]
+                stats['p95'] = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+                stats['max'] = latencies[-1]
+            result[endpoint] = stats
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+
+
+metrics = LLMMetrics(window=llm_client_settings()['METRICS_WINDOW'])
+
+_lock = threading.Lock()
+_client = None
+_session = None
+
+
+def _endpoint(url):
+    return str(url).split('/v1/', 1)[-1].split('?', 1)[0]
+
+
+def _on_request(request):
+    request.extensions['llm_started'] = time.perf_counter()
+
+
+def _on_response(response):
+    started = response.request.extensions.get('llm_started')
+    if started is not None:
+        metrics.record(_endpoint(response.request.url), response.status_code, time.perf_counter() - started)
+
+
+def get_client():
+    """
+    The process wide OpenAI client. Its httpx pool keeps connections alive between calls, every request has the
+    connect and read timeouts of settings.LLM_CLIENT and failed requests are retried by the SDK with exponential
+    backoff, MAX_RETRIES times. This is the only retry layer, callers should not wrap OpenAI calls in their own
+    retries. Use client.with_options(timeout=...) for calls that need another timeout.
+    """
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                config = llm_client_settings()
+                timeout = httpx.Timeout(config['TIMEOUT'], connect=config['CONNECT_TIMEOUT'])
+                http_client = httpx.Client(
+                    timeout=timeout,
+                    limits=httpx.Limits(
+                        max_connections=config['MAX_CONNECTIONS'],
+                        max_keepalive_connections=config['MAX_KEEPALIVE_CONNECTIONS'],
+                        keepalive_expiry=config['KEEPALIVE_EXPIRY'],
+                    ),
+                    event_hooks={'request': [_on_request], 'response': [_on_response]},
+                )
+                _client = openai.OpenAI(
+                    base_url=config['BASE_URL'],
+                    timeout=timeout,
+                    max_retries=config['MAX_RETRIES'],
+                    http_client=http_client,
+                )
+    return _client
+
+
+def _record_response(response, *args, **kwargs):
+    metrics.record(_endpoint(response.url), response.status_code, response.elapsed.total_seconds())
+
+
+def get_session():
+    """
+    The process wide requests session for raw calls to the OpenAI REST API, authenticated with OPENAI_API_KEY.
+    It pools connections like get_client and retries connection errors and RETRY_STATUSES the same way.
+    """
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                config = llm_client_settings()
+                retries = Retry(
+                    total=config['MAX_RETRIES'],
+                    backoff_factor=config['BACKOFF_FACTOR'],
+                    status_forcelist=RETRY_STATUSES,
+                    allowed_methods=None,
+                    respect_retry_after_header=True,
+                    raise_on_status=False,
+                )
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=config['MAX_CONNECTIONS'], max_retries=retries)
+                session = requests.Session()
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                session.headers.update({
+                    "Content-Type": "application/json",
+                    "Authorization": f"Bearer {os.getenv('OPENAI_API_KEY', '')}",
+                })
+                session.hooks['response'].append(_record_response)
+                _session = session
+    return _session
+
+
+def post(endpoint, json_data, timeout=None):
+    """POSTs json_data to an OpenAI endpoint (e.g. 'chat/completions') through the shared session, returns the response."""
+    config = llm_client_settings()
+    timeout = timeout or (config['CONNECT_TIMEOUT'], config['TIMEOUT'])
+    return get_session().post(f"{config['BASE_URL'].rstrip('/')}/{endpoint}", json=json_data, timeout=timeout)
@@ -167,3 +167,173 @@ INTERNAL_IPS = [
 EMAIL_HOST_USER = os.getenv("EMAIL_USER")
 EMAIL_HOST_PASSWORD = os.getenv("EMAIL_PASSWORD")
 
+# Embedding cache (education.embedding_cache): in-process LRU size and the row limit of the CachedEmbedding table
+EMBEDDING_CACHE = {
+    'ENABLED': True,
+    'MEMORY_ENTRIES': 1024,
+    'MAX_ENTRIES': 50000,
+}
+
+# Compressed in-memory embedding indexes (education.vector_index): keep only the first DIMENSIONS components of each
+# text-embedding-3 vector, quantized to int8 when QUANTIZE is set, and rescore the top RESCORE_FACTOR * k candidates
+# with the full vectors. Check recall with `python manage.py embedding_recall_report` before enabling.
+EMBEDDING_COMPRESSION = {
+    'ENABLED': False,
+    'DIMENSIONS': 256,
+    'QUANTIZE': True,
+    'RESCORE_FACTOR': 4,
+}
+
+# Cross-process sync of the in-memory vector indexes (education.vector_index.IndexRegistry): every change to the
+# lesson, concept, passage, book section or answer vectors bumps the IndexVersion counters of the scopes it touched,
+# and a process that finds a cached scope's counter moved, checking at most every CHECK_INTERVAL seconds, rebuilds
+# that scope from the database.
+# This is how the web server picks up what run_workers embedded.
+VECTOR_INDEX_SYNC = {
+    'ENABLED': True,
+    'CHECK_INTERVAL': 2.0,
+}
+
+# Book chunk vector store (education.vector_store): 'pinecone' for the hosted index or 'local' for the on-disk IVF
+# index under LOCAL_ROOT, which probes the LOCAL_NPROBE closest inverted lists per query. Local indexes are only
+# rebuilt by book uploads, under a per-book file lock, and queries read the last build.
+VECTOR_STORE = {
+    'BACKEND': os.getenv('VECTOR_STORE_BACKEND', 'pinecone'),
+    'PINECONE_INDEX': 'websiteindex',
+    'PINECONE_POOL_THREADS': 30,
+    'LOCAL_ROOT': os.path.join(MEDIA_ROOT, 'vector_store'),
+    'LOCAL_NPROBE': 8,
+}
+
+# Book chunk retrieval (education.lexical_index): MODE is 'vector', 'lexical' or 'hybrid'. Hybrid fuses the top
+# CANDIDATES vector and BM25 hits by reciprocal rank (RRF_K), and answers queries whose share of symbol/identifier
+# tokens reaches LEXICAL_ONLY_SYMBOL_RATIO from BM25 alone. BM25 indexes are stored per book under INDEX_ROOT.
+# Searches across every book (education.federated_search) cache the namespace list for NAMESPACE_CATALOG_TTL
+# seconds and run on a shared pool of SEARCH_WORKERS threads, never with more book searches in flight than workers.
+# A book search is dropped once it has run for NAMESPACE_TIMEOUT seconds, or waited that long for a free worker.
+# Hybrid and lexical results of different books are merged by their rank in each book, also with RRF_K.
+# CHUNK_BOUNDARIES 'content' cuts book chunks where the text itself says so, so re-indexing a corrected PDF only
+# re-embeds the chunks around the changes; 'count' keeps the word count boundaries of chunk_text_advanced.
+BOOK_RETRIEVAL = {
+    'MODE': 'hybrid',
+    'RRF_K': 60,
+    'CANDIDATES': 20,
+    'LEXICAL_ONLY_SYMBOL_RATIO': 0.5,
+    'INDEX_ROOT': os.path.join(MEDIA_ROOT, 'book_indexes'),
+    'NAMESPACE_CATALOG_TTL': 300,
+    'SEARCH_WORKERS': 10,
+    'NAMESPACE_TIMEOUT': 5.0,
+    'CHUNK_BOUNDARIES': 'content',
+}
+
+# Chat retrieval (education.retrieval): the question is embedded once, then the book and lesson searches run
+# concurrently on a pool of WORKERS threads, each dropped if it takes longer than its timeout in seconds.
+CHAT_RETRIEVAL = {
+    'WORKERS': 8,
+    'BOOK_TIMEOUT': 8.0,
+    'LESSON_TIMEOUT': 5.0,
+}
+
+# Lecture transcript passages (education.models.TranscriptPassage): transcripts are cut into WORDS-word passages
+# overlapping by OVERLAP words, and chat quotes the best of the TOP_K closest passages that fit in TOKEN_BUDGET tokens.
+# Passages are built by the lesson job's embed stage or `manage.py index_transcripts`, not when a transcript is saved.
+TRANSCRIPT_PASSAGES = {
+    'WORDS': 200,
+    'OVERLAP': 50,
+    'TOP_K': 8,
+    'TOKEN_BUDGET': 1200,
+}
+
+# Lesson similarity graph (education.models.RelatedLesson): the NEIGHBORS closest lessons of every lesson, across classes.
+# build_lesson_graph recomputes it BLOCK_ROWS lessons at a time, and with INCREMENTAL saved lesson embeddings update it in place.
+LESSON_GRAPH = {
+    'NEIGHBORS': 10,
+    'BLOCK_ROWS': 1024,
+    'INCREMENTAL': True,
+}
+
+# Concept deduplication (education.concept_dedupe): concepts with the same normalized LaTeX, or embeddings at least
+# THRESHOLD cosine similar, are duplicates. SCOPE is 'class' (only within a class) or 'global'. With ON_CREATE,
+# create_concepts_from_lesson merges a new concept into its duplicate; dedupe_concepts [--merge] cleans up existing ones.
+CONCEPT_DEDUPE = {
+    'THRESHOLD': 0.97,
+    'BLOCK_ROWS': 1024,
+    'SCOPE': 'class',
+    'ON_CREATE': True,
+}
+
+# Chapter matching (education.models.Lesson.match_chapter): a lesson is placed in the book section whose embedded
+# table of contents title is closest to the lesson embedding. Matches scoring below MIN_SCORE, or less than
+# MIN_MARGIN ahead of the runner-up, are asked to the chat model instead when LLM_FALLBACK is set.
+BOOK_SECTIONS = {
+    'MIN_SCORE': 0.3,
+    'MIN_MARGIN': 0.02,
+    'LLM_FALLBACK': True,
+}
+
+# Semantic answer cache for first chat questions about a lesson or class (education.models.CachedAnswer), opt-in.
+# A question at least THRESHOLD cosine similar to a cached one of the same scope gets its answer for TTL seconds,
+# each scope keeps its MAX_ENTRIES_PER_SCOPE most recently used answers, and transcript changes drop the lesson's answers.
+# Lookups try the LOOKUP_CANDIDATES closest questions, skipping entries deleted by another process or expired.
+ANSWER_CACHE = {
+    'ENABLED': os.getenv('ANSWER_CACHE_ENABLED', 'False') == 'True',
+    'THRESHOLD': 0.95,
+    'TTL': 7 * 24 * 3600,
+    'MAX_ENTRIES_PER_SCOPE': 500,
+    'LOOKUP_CANDIDATES': 5,
+}
+
+# Lesson analysis (education.models.Lesson.generate_analysis): MODE 'per_field' prompts every field on its own,
+# 'structured' asks for all of them in one JSON-schema completion and prompts only the fields it missed.
+# Individual prompts run on up to WORKERS threads, failed requests are retried by the shared client (LLM_CLIENT).
+LESSON_ANALYSIS = {
+    'MODE': os.getenv('LESSON_ANALYSIS_MODE', 'per_field'),
+    'WORKERS': 4,
+}
+
+# Lesson job queue (education.jobs): uploads queue a LessonJob and `manage.py run_workers` runs its stages.
+# A worker holds a job for LEASE_SECONDS per stage, failed stages are retried after RETRY_DELAY * attempts seconds
+# up to MAX_ATTEMPTS times. With ENABLED off uploads process the lesson in the request, as before, through Lesson.save;
+# with it on Lesson.save no longer analyzes or embeds and the lesson page does not summarize while a job is queued.
+JOB_QUEUE = {
+    'ENABLED': os.getenv('JOB_QUEUE_ENABLED', 'True') == 'True',
+    'LEASE_SECONDS': 900,
+    'MAX_ATTEMPTS': 3,
+    'RETRY_DELAY': 60,
+    'POLL_INTERVAL': 2.0,
+}
+
+# Exact prompt/response cache of education.utils completions (education.completion_cache), keyed by the model,
+# messages, response_format and tools of the request. Entries live for the TTL of their call site (DEFAULT_TTL
+# otherwise) and the CachedCompletion table is trimmed back to MAX_ENTRIES least recently used rows.
+# It is off for web requests, so regenerating gives a new answer; run_workers, create_concepts, update_lesson_titles
+# and generate_study_sheets turn it on for their process unless run with --no-cache. ENABLED turns it on everywhere.
+# Pass use_cache=False to a call to skip the cache.
+COMPLETION_CACHE = {
+    'ENABLED': os.getenv('COMPLETION_CACHE_ENABLED', 'False') == 'True',
+    'MAX_ENTRIES': 20000,
+    'DEFAULT_TTL': 30 * 24 * 3600,
+    'TTLS': {
+        'chat_completion': 30 * 24 * 3600,
+        'json_completion': 30 * 24 * 3600,
+        'structured_completion': 30 * 24 * 3600,
+        'tools': 24 * 3600,
+    },
+}
+
+# Shared OpenAI access (webPerson.llm_client): one SDK client and one requests session per process, keeping up to
+# MAX_KEEPALIVE_CONNECTIONS connections alive for KEEPALIVE_EXPIRY seconds. Requests time out after CONNECT_TIMEOUT
+# seconds connecting or TIMEOUT seconds waiting for data (the OpenAI SDK default, long completions need it), and
+# 429/5xx or connection errors are retried MAX_RETRIES times with exponential backoff. This is the only retry layer:
+# callers do not retry OpenAI requests themselves. Latency and error counters are kept for the last METRICS_WINDOW requests per endpoint.
+LLM_CLIENT = {
+    'BASE_URL': os.getenv('OPENAI_BASE_URL', 'https://api.openai.com/v1'),
+    'MAX_CONNECTIONS': 20,
+    'MAX_KEEPALIVE_CONNECTIONS': 10,
+    'KEEPALIVE_EXPIRY': 30.0,
+    'CONNECT_TIMEOUT': 5.0,
+    'TIMEOUT': 600.0,
+    'MAX_RETRIES': 3,
+    'BACKOFF_FACTOR': 0.5,
+    'METRICS_WINDOW': 1000,
+}